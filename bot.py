@@ -1,24 +1,481 @@
+import time
+# 啟動計時的起點（--profile-startup 用來計算到 on_ready 的時間）
+PROCESS_START = time.perf_counter()
 import os
 os.environ["DISCORD_INSTANCE_NO_VOICE"] = "true"
+import importlib.util
+import sys
+
+def lazy_import(name):
+    """延遲載入模組：第一次存取屬性時才真正匯入，縮短冷啟動時間"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
 import discord
+from discord import app_commands
 from discord.ext import commands, tasks
 from dotenv import load_dotenv
-import requests
-import json
 from datetime import datetime, timedelta
-import random
 import asyncio
-import schedule
-import time
+import atexit
+import base64
+import concurrent.futures
+import contextlib
+import contextvars
+import csv
+import functools
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import logging
+import logging.handlers
+import math
+import queue
 import threading
-from flask import Flask
+import gc
+import re
+import tracemalloc
+import signal
+import socket
+import sqlite3
+import subprocess
+import struct
+import tempfile
+import urllib.parse
+import zlib
+from collections import OrderedDict, deque
 from threading import Thread
 
+# HTTP 與排程模組只有在第一次使用時才載入
+requests = lazy_import("requests")
+schedule = lazy_import("schedule")
+
 # 環境變數載入邏輯（兼容本地和 Render）
 if os.path.exists('.env'):
     load_dotenv('.env')
-else:
-    print("ℹ️  在 Render 環境中運行，使用系統環境變數")
+
+# ===== 結構化日誌：呼叫端只把紀錄放進佇列，格式化與寫出在背景執行緒完成 =====
+
+# json：每行一筆 JSON（Render 日誌用）；text：方便本機閱讀
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# 各子系統的初始等級，例如 LOG_LEVELS=github=DEBUG,discord=WARNING
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# DEBUG 紀錄每個呼叫位置只保留每 N 筆中的 1 筆（1 = 全部保留）
+LOG_DEBUG_SAMPLE_EVERY = int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", "10"))
+LOG_QUEUE_SIZE = 10000
+
+# 可在執行中調整等級的子系統（discord 為 discord.py 本身的日誌）
+LOG_SUBSYSTEMS = ("panel", "scheduler", "github", "commands", "live_board", "leader", "events", "cluster", "discord")
+
+log = logging.getLogger("bot")
+panel_log = logging.getLogger("bot.panel")
+scheduler_log = logging.getLogger("bot.scheduler")
+github_log = logging.getLogger("bot.github")
+command_log = logging.getLogger("bot.commands")
+live_board_log = logging.getLogger("bot.live_board")
+leader_log = logging.getLogger("bot.leader")
+event_log = logging.getLogger("bot.events")
+cluster_log = logging.getLogger("bot.cluster")
+
+# 目前指令或互動的日誌欄位；asyncio 任務、to_thread 與 copy_context 都會帶著它
+log_context = contextvars.ContextVar("log_context", default=None)
+
+def bind_log_context(command, user=None, guild=None):
+    """為目前的指令或互動設定日誌欄位（指令名稱、使用者、伺服器、請求 ID）"""
+    log_context.set({
+        "command": command,
+        "user_id": user.id if user else None,
+        "guild_id": guild.id if guild else None,
+        "request_id": os.urandom(4).hex(),
+    })
+
+class LogContextFilter(logging.Filter):
+    """在呼叫端的執行緒上把日誌欄位附加到紀錄（背景執行緒看不到呼叫端的 contextvar）"""
+
+    def filter(self, record):
+        record.context = log_context.get()
+        return True
+
+class DebugSampler(logging.Filter):
+    """DEBUG 紀錄按呼叫位置抽樣，高頻率的除錯訊息不會塞滿日誌"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self._counters = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every <= 1:
+            return True
+        key = (record.name, record.lineno)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters.setdefault(key, itertools.count())
+        if next(counter) % self.every:
+            return False
+        record.sampled_every = self.every
+        return True
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """放進佇列前不做格式化；佇列滿時直接丟棄並計數，絕不阻塞事件迴圈"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """停止時等佇列中的紀錄寫完；重複停止不會出錯（atexit 也會呼叫）"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+class JsonLogFormatter(logging.Formatter):
+    """每筆紀錄輸出成一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        context = getattr(record, "context", None)
+        if context:
+            entry.update(context)
+        if getattr(record, "sampled_every", None):
+            entry["sampled_every"] = record.sampled_every
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextLogFormatter(logging.Formatter):
+    """本機閱讀用的單行格式，日誌欄位附在訊息後面"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s | %(message)s%(context_text)s")
+
+    def format(self, record):
+        context = getattr(record, "context", None)
+        record.context_text = (
+            " [" + " ".join(f"{key}={value}" for key, value in context.items()) + "]" if context else ""
+        )
+        return super().format(record)
+
+log_queue = queue.Queue(LOG_QUEUE_SIZE)
+log_queue_handler = NonBlockingQueueHandler(log_queue)
+log_listener = None
+
+def subsystem_logger(subsystem):
+    """子系統名稱對應的 logger；未知名稱拋出 ValueError"""
+    if subsystem in ("all", "bot"):
+        return log
+    if subsystem not in LOG_SUBSYSTEMS:
+        raise ValueError(f"未知的子系統 `{subsystem}`，可用: all, {', '.join(LOG_SUBSYSTEMS)}")
+    return logging.getLogger("discord" if subsystem == "discord" else f"bot.{subsystem}")
+
+def set_log_level(subsystem, level):
+    """在執行中調整子系統的日誌等級；level 為 DEBUG/INFO/WARNING/ERROR 或 reset（沿用上層）"""
+    logger = subsystem_logger(subsystem)
+    level = level.upper()
+    if level == "RESET":
+        logger.setLevel(logging.NOTSET)
+        return
+    if level not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+        raise ValueError(f"未知的日誌等級 `{level}`")
+    logger.setLevel(level)
+
+def format_log_levels():
+    """列出各子系統目前的有效等級"""
+    message = "📜 **日誌等級**\n"
+    message += f"• all: {logging.getLevelName(log.getEffectiveLevel())}\n"
+    for subsystem in LOG_SUBSYSTEMS:
+        logger = subsystem_logger(subsystem)
+        explicit = "" if logger.level else "（沿用上層）"
+        message += f"• {subsystem}: {logging.getLevelName(logger.getEffectiveLevel())}{explicit}\n"
+    message += f"• DEBUG 抽樣: 每 {LOG_DEBUG_SAMPLE_EVERY} 筆保留 1 筆\n"
+    message += f"• 佇列: {log_queue.qsize()} 筆待寫出，已丟棄 {log_queue_handler.dropped} 筆"
+    return message
+
+def configure_logging():
+    """把所有 logger（包含 discord.py 與 werkzeug）導向非阻塞佇列"""
+    log_queue_handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_EVERY))
+    log_queue_handler.addFilter(LogContextFilter())
+    root = logging.getLogger()
+    root.addHandler(log_queue_handler)
+    root.setLevel(logging.WARNING)
+    log.setLevel(LOG_LEVEL)
+    logging.getLogger("discord").setLevel(logging.INFO)
+    
+    for item in filter(None, (part.strip() for part in LOG_LEVELS.split(","))):
+        subsystem, _, level = item.partition("=")
+        try:
+            set_log_level(subsystem.strip(), level.strip())
+        except ValueError as e:
+            log.warning(f"⚠️ 忽略 LOG_LEVELS 設定 `{item}`: {e}")
+
+def start_log_listener():
+    """啟動寫出日誌的背景執行緒；之前的紀錄會先留在佇列中
+
+    圖表程序池以 fork 建立，必須在這之前完成，所以不在匯入時啟動
+    """
+    global log_listener
+    if log_listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextLogFormatter() if LOG_FORMAT == "text" else JsonLogFormatter())
+    log_listener = DrainingQueueListener(log_queue, output)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
+# ===== 追蹤：每個指令或按鈕一個 trace，GitHub 請求、格式化、Discord 送出是子 span =====
+
+# Chrome trace event 格式（chrome://tracing、Perfetto 可直接開啟），輪替保留 TRACE_FILE_BACKUPS 份
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() not in ("0", "false", "no")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.json")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(5 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = 3
+# 記憶體中保留最近幾個 trace 給 !slow_traces
+TRACE_KEEP_RECENT = 200
+
+# perf_counter 的讀數加上這個偏移就是 Unix 時間
+TRACE_EPOCH = time.time() - time.perf_counter()
+
+current_span = contextvars.ContextVar("current_span", default=None)
+recent_traces = deque(maxlen=TRACE_KEEP_RECENT)
+_trace_sequence = itertools.count(1)
+
+trace_log = logging.getLogger("bot.tracing")
+trace_log.propagate = False
+trace_log.setLevel(logging.INFO)
+trace_queue = queue.Queue(LOG_QUEUE_SIZE)
+trace_listener = None
+
+class Trace:
+    """一次指令或按鈕互動的所有 span"""
+    __slots__ = ('trace_id', 'seq', 'root', 'spans')
+
+    def __init__(self):
+        self.trace_id = os.urandom(8).hex()
+        self.seq = next(_trace_sequence)
+        self.root = None
+        # 完成的 span；子 span 可能在 to_thread 的執行緒中結束，list.append 是執行緒安全的
+        self.spans = []
+
+class Span:
+    """trace 中的一段計時"""
+    __slots__ = ('name', 'trace', 'parent', 'start', 'end', 'attrs')
+
+    def __init__(self, name, trace, parent, attrs):
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+def start_trace(name, **attrs):
+    """開始新的 trace 並設為目前的 span；同一個 asyncio 任務中的子 span 都會掛在底下"""
+    if not TRACING_ENABLED:
+        return None
+    context = log_context.get()
+    if context:
+        attrs.update(context)
+    trace = Trace()
+    trace.root = Span(name, trace, None, attrs)
+    current_span.set(trace.root)
+    return trace.root
+
+def finish_span(span, error=None):
+    """結束 span；根 span 結束時整個 trace 交給背景執行緒寫檔"""
+    if span is None or span.end is not None:
+        return
+    span.end = time.perf_counter()
+    if error:
+        span.attrs['error'] = error
+    span.trace.spans.append(span)
+    if span.parent is None:
+        recent_traces.append(span.trace)
+        if trace_listener is not None:
+            trace_log.info(span.trace)
+
+@contextlib.contextmanager
+def trace_span(name, **attrs):
+    """在目前的 trace 底下開一個子 span；沒有進行中的 trace 時幾乎沒有成本"""
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    span = Span(name, parent.trace, parent, attrs)
+    token = current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.attrs['error'] = type(e).__name__
+        raise
+    finally:
+        current_span.reset(token)
+        finish_span(span)
+
+def traced(name):
+    """把同步函式包成子 span（格式化、繪圖前處理等）"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def trace_events(trace):
+    """把 trace 轉成 Chrome trace event；每個 trace 佔一條獨立的 tid 軌道"""
+    pid = os.getpid()
+    events = [{
+        "ph": "M", "name": "thread_name", "pid": pid, "tid": trace.seq,
+        "args": {"name": f"{trace.root.name} #{trace.seq}"},
+    }]
+    for span in trace.spans:
+        events.append({
+            "name": span.name, "cat": "bot", "ph": "X", "pid": pid, "tid": trace.seq,
+            "ts": round((TRACE_EPOCH + span.start) * 1_000_000),
+            "dur": round((span.end - span.start) * 1_000_000),
+            "args": dict(span.attrs, trace_id=trace.trace_id),
+        })
+    return events
+
+class TraceEventFormatter(logging.Formatter):
+    """在背景執行緒中把 Trace 序列化成 JSON 陣列元素（每行一個事件，結尾帶逗號）"""
+
+    def format(self, record):
+        return "\n".join(
+            json.dumps(event, ensure_ascii=False, default=str) + "," for event in trace_events(record.msg)
+        )
+
+class TraceFileHandler(logging.handlers.RotatingFileHandler):
+    """每個新檔案開頭寫入 [；trace event 格式允許省略結尾的 ]"""
+
+    def _open(self):
+        stream = super()._open()
+        if stream.tell() == 0:
+            stream.write("[\n")
+        return stream
+
+def start_trace_writer():
+    """啟動寫出 trace 檔案的背景執行緒"""
+    global trace_listener
+    if trace_listener is not None or not TRACING_ENABLED or not TRACE_FILE:
+        return
+    handler = TraceFileHandler(
+        TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS, encoding="utf-8"
+    )
+    handler.setFormatter(TraceEventFormatter())
+    trace_log.addHandler(NonBlockingQueueHandler(trace_queue))
+    trace_listener = DrainingQueueListener(trace_queue, handler)
+    trace_listener.start()
+    atexit.register(trace_listener.stop)
+
+def format_slow_traces(limit=5, spans_per_trace=5):
+    """列出最近最慢的幾個 trace，以及各自最耗時的子 span"""
+    traces = sorted(recent_traces, key=lambda trace: trace.root.duration, reverse=True)[:limit]
+    if not traces:
+        return "📭 還沒有任何 trace"
+    
+    message = f"🐢 **最慢的 {len(traces)} 個 trace**（最近 {len(recent_traces)} 個中）\n"
+    for trace in traces:
+        root = trace.root
+        started = datetime.fromtimestamp(TRACE_EPOCH + root.start).strftime('%m/%d %H:%M:%S')
+        user = f" · 👤 {root.attrs['user_id']}" if root.attrs.get('user_id') else ""
+        message += f"\n**{root.name}** {root.duration * 1000:.0f} ms · {started}{user} · `{trace.trace_id}`\n"
+        children = sorted((span for span in trace.spans if span is not root), key=lambda span: span.duration, reverse=True)
+        for span in children[:spans_per_trace]:
+            error = f" ⚠️ {span.attrs['error']}" if span.attrs.get('error') else ""
+            message += f"  • {span.name}: {span.duration * 1000:.0f} ms{error}\n"
+        if len(children) > spans_per_trace:
+            message += f"  • …另外 {len(children) - spans_per_trace} 個 span\n"
+    return message
+
+def benchmark_tracing(iterations=20000):
+    """量測追蹤的額外成本：模擬一個指令（1 個根 span + 8 個子 span，不含實際 I/O）"""
+    global TRACING_ENABLED, TRACE_FILE
+    import tempfile
+    
+    def simulate_command():
+        root = start_trace("!bench")
+        with trace_span("build_detailed_changelog"):
+            for page in range(6):
+                with trace_span("GitHub search/issues", page=page) as span:
+                    if span is not None:
+                        span.attrs['status'] = 200
+            with trace_span("format changelog"):
+                pass
+        finish_span(root)
+    
+    def measure(count):
+        started = time.perf_counter()
+        for _ in range(count):
+            contextvars.copy_context().run(simulate_command)
+        return (time.perf_counter() - started) / count
+    
+    enabled = TRACING_ENABLED
+    try:
+        TRACING_ENABLED = False
+        disabled_cost = measure(iterations)
+        TRACING_ENABLED = True
+        memory_cost = measure(iterations)
+        
+        with tempfile.TemporaryDirectory() as directory:
+            TRACE_FILE = os.path.join(directory, "traces.json")
+            start_trace_writer()
+            # 不超過佇列容量，量到的是實際寫入而不是丟棄
+            file_iterations = min(iterations, LOG_QUEUE_SIZE // 2)
+            file_cost = measure(file_iterations)
+            drain_started = time.perf_counter()
+            trace_listener.stop()
+            drain_elapsed = time.perf_counter() - drain_started
+            file_size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    finally:
+        TRACING_ENABLED = enabled
+    
+    spans = 9
+    print(f"🧪 追蹤基準測試: {iterations} 次模擬指令，每次 {spans} 個 span")
+    print(f"  關閉追蹤: 每個指令 {disabled_cost * 1e6:.1f} µs")
+    print(f"  只保留在記憶體: 每個指令 {memory_cost * 1e6:.1f} µs"
+          f"（每個 span 約 {(memory_cost - disabled_cost) / spans * 1e6:.2f} µs）")
+    print(f"  寫入檔案（呼叫端成本）: 每個指令 {file_cost * 1e6:.1f} µs")
+    print(f"  背景執行緒寫出 {file_iterations} 個 trace 的剩餘部分: {drain_elapsed:.2f} 秒，"
+          f"檔案 {file_size / 1024:.0f} KB（含輪替）")
+    print(f"  以 300 ms 的指令計算，額外成本約 {(file_cost - disabled_cost) / 0.3 * 100:.3f}%")
+
+configure_logging()
+
+if not os.path.exists('.env'):
+    log.info("ℹ️  在 Render 環境中運行，使用系統環境變數")
 
 # 從環境變數讀取 Token
 TOKEN = os.getenv("DISCORD_TOKEN")
@@ -31,99 +488,406 @@ CONTROL_PANEL_CHANNEL_ID = os.getenv("CONTROL_PANEL_CHANNEL_ID")  # 新增：控
 # 可調整的檢查頻率（單位：天）
 CHECK_INTERVAL_DAYS = 7
 
+# 分片設定：SHARD_MODE=auto 啟用單一程序內自動分片；
+# 叢集模式下由啟動器為每個 worker 設定 SHARD_IDS / SHARD_COUNT
+SHARD_MODE = os.getenv("SHARD_MODE", "").lower()
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+SHARD_IDS = [int(x) for x in os.getenv("SHARD_IDS").split(",")] if os.getenv("SHARD_IDS") else None
+CLUSTER_ID = os.getenv("CLUSTER_ID")
+# 排程任務只在負責這個分片的程序上執行，避免重複發送
+SCHEDULER_SHARD_ID = int(os.getenv("SCHEDULER_SHARD_ID", "0"))
+SHARDED = SHARD_MODE == "auto" or SHARD_IDS is not None
+
+# 低記憶體模式（Render 免費方案只有 512 MB）：關閉訊息快取、成員快取與啟動時的成員分塊
+LOW_MEMORY_MODE = os.getenv("LOW_MEMORY_MODE", "").lower() in ("1", "true", "yes")
+
+# 斜線指令可以完全取代 ! 前綴指令；關閉後 Bot 不再接收每則訊息的內容
+MESSAGE_CONTENT_INTENT = os.getenv("MESSAGE_CONTENT_INTENT", "true").lower() not in ("0", "false", "no")
+# 設定後斜線指令只同步到這個伺服器（立即生效，適合測試）
+SLASH_GUILD_ID = os.getenv("SLASH_GUILD_ID")
+
 # 設定意圖
 intents = discord.Intents.default()
-intents.message_content = True
+intents.message_content = MESSAGE_CONTENT_INTENT
+# 沒有訊息內容時，前綴指令只能透過 @Bot 提及觸發
+command_prefix = "!" if MESSAGE_CONTENT_INTENT else commands.when_mentioned_or("!")
+
+bot_options = {}
+if LOW_MEMORY_MODE:
+    # 指令不需要打字狀態事件，少收一類閘道事件
+    intents.typing = False
+    bot_options.update(
+        max_messages=None,
+        member_cache_flags=discord.MemberCacheFlags.none(),
+        chunk_guilds_at_startup=False,
+    )
+
+class LoggingCommandTree(app_commands.CommandTree):
+    """斜線指令執行前檢查額度、設定日誌上下文並開始 trace（與指令本身在同一個任務中執行）；
+    之後指令自己的權限檢查沒通過時，on_app_command_error 會退還額度"""
+
+    async def interaction_check(self, interaction):
+        name = interaction.command.qualified_name if interaction.command else "unknown"
+        rejection = admit(name, interaction.user, interaction.guild)
+        if rejection:
+            await interaction.response.send_message(rejection, ephemeral=True)
+            return False
+        interaction.extras['admitted'] = name
+        bind_log_context(f"/{name}", interaction.user, interaction.guild)
+        interaction.extras['trace'] = start_trace(f"/{name}")
+        command_log.info(f"📨 收到斜線指令 /{name}")
+        return True
+
+bot_options['tree_cls'] = LoggingCommandTree
 
 # 建立 Bot 物件，設定前綴詞
-bot = commands.Bot(command_prefix="!", intents=intents)
+if SHARDED:
+    bot = commands.AutoShardedBot(
+        command_prefix=command_prefix,
+        intents=intents,
+        shard_count=SHARD_COUNT,
+        shard_ids=SHARD_IDS,
+        **bot_options,
+    )
+else:
+    bot = commands.Bot(command_prefix=command_prefix, intents=intents, **bot_options)
 
 # 全局變數用於排程觸發
 weekly_check_event = asyncio.Event()
+# 第一次嘗試取得領導者租約後設定
+leader_elected = asyncio.Event()
+
+async def wait_for_leader_election():
+    """只由領導者執行的工作迴圈在第一次選舉完成前不執行，避免啟動時被當成非領導者略過"""
+    await leader_elected.wait()
 
 # 記錄最後檢查時間（用於手動檢查功能）
 last_check_time = datetime.now() - timedelta(days=CHECK_INTERVAL_DAYS)
 
+# 啟動各階段距離程序開始的秒數
+startup_timings = {}
+# --profile-startup 的子程序：on_ready 後輸出計時並結束
+STARTUP_PROBE = False
+
+
+
+# ===== 健康檢查：/health 與 /ready 只讀取事件迴圈定期更新的快照 =====
+
+HEALTH_SNAPSHOT_INTERVAL = float(os.getenv("HEALTH_SNAPSHOT_INTERVAL", "5"))
+# 快照超過這個秒數沒有更新，代表事件迴圈卡住，/health 回 503
+HEALTH_STALE_AFTER = float(os.getenv("HEALTH_STALE_AFTER", "60"))
+# 閘道斷線超過這個秒數，/health 回 503 讓平台重啟程序
+HEALTH_MAX_DISCONNECTED = float(os.getenv("HEALTH_MAX_DISCONNECTED", "300"))
+# /ready 的門檻：閘道延遲（秒）、GitHub 故障時最後一次成功距今（秒）、排程器心跳距今（秒）、日誌佇列長度
+READY_MAX_LATENCY = float(os.getenv("READY_MAX_LATENCY", "2"))
+READY_MAX_GITHUB_AGE = float(os.getenv("READY_MAX_GITHUB_AGE", "1800"))
+READY_MAX_SCHEDULER_AGE = float(os.getenv("READY_MAX_SCHEDULER_AGE", "180"))
+READY_MAX_LOG_QUEUE = int(os.getenv("READY_MAX_LOG_QUEUE", str(LOG_QUEUE_SIZE // 2)))
 
+gateway_state = {'connected': False, 'changed_at': time.time()}
+# 排程執行緒每輪更新；None 代表本程序沒有啟動排程器
+scheduler_heartbeat = None
+# 事件迴圈定期整份替換；flask 執行緒只讀取參照，不取鎖、也不等待事件迴圈
+health_snapshot = None
+_last_health_tick = None
 
-app = Flask(__name__)
+def set_gateway_state(connected):
+    if gateway_state['connected'] != connected:
+        gateway_state.update(connected=connected, changed_at=time.time())
 
-@app.route("/health")
-def health():
-    return "OK", 200
+@bot.listen()
+async def on_connect():
+    set_gateway_state(True)
 
-@app.route("/")
-def home():
-    return "機器人運行中"
+@bot.listen()
+async def on_resumed():
+    set_gateway_state(True)
+
+@bot.listen()
+async def on_disconnect():
+    set_gateway_state(False)
+
+def last_github_success():
+    """所有端點中最近一次成功的 GitHub 請求（epoch 秒）"""
+    times = [breaker.last_success for breaker in list(_circuit_breakers.values()) if breaker.last_success]
+    return max(times).timestamp() if times else None
+
+def build_health_snapshot(loop_lag):
+    """在事件迴圈中收集健康狀態；只讀記憶體中的狀態，不發出任何請求"""
+    now = time.time()
+    latency = bot.latency
+    github_success = last_github_success()
+    return {
+        'updated_at': now,
+        'gateway': {
+            'connected': gateway_state['connected'],
+            'since': gateway_state['changed_at'],
+            'ready': bot.is_ready(),
+            'latency_ms': round(latency * 1000, 1) if math.isfinite(latency) else None,
+        },
+        'loop_lag_ms': round(loop_lag * 1000, 1),
+        'github': {
+            'last_success_age': round(now - github_success, 1) if github_success else None,
+            'open_circuits': sorted(name for name, breaker in list(_circuit_breakers.items())
+                                    if breaker.state != CircuitBreaker.CLOSED),
+        },
+        'scheduler': {
+            'heartbeat_age': round(now - scheduler_heartbeat, 1) if scheduler_heartbeat else None,
+            'leader': coordinator.is_leader,
+        },
+        'startup': {
+            **{stage: round(seconds, 3) for stage, seconds in startup_timings.items()},
+            'warm_start': dict(warm_start_stats),
+        },
+        'queues': {
+            'log': log_queue.qsize(),
+            'log_dropped': log_queue_handler.dropped,
+            'trace': trace_queue.qsize(),
+            'charts_inflight': len(_chart_inflight),
+        },
+    }
+
+@tasks.loop(seconds=HEALTH_SNAPSHOT_INTERVAL)
+async def refresh_health_snapshot():
+    """定期更新快照；實際間隔超出設定的部分就是事件迴圈的延遲"""
+    global health_snapshot, _last_health_tick
+    tick = time.monotonic()
+    lag = max(0.0, tick - _last_health_tick - HEALTH_SNAPSHOT_INTERVAL) if _last_health_tick else 0.0
+    _last_health_tick = tick
+    health_snapshot = build_health_snapshot(lag)
+
+def liveness_problems(snapshot, now):
+    """程序需要重啟的原因；啟動中（還沒有快照）視為存活"""
+    if snapshot is None:
+        return []
+    problems = []
+    age = now - snapshot['updated_at']
+    if age > HEALTH_STALE_AFTER:
+        problems.append(f"事件迴圈 {age:.0f} 秒沒有更新快照")
+    gateway = snapshot['gateway']
+    if not gateway['connected'] and now - gateway['since'] > HEALTH_MAX_DISCONNECTED:
+        problems.append(f"閘道已斷線 {now - gateway['since']:.0f} 秒")
+    return problems
+
+def readiness_problems(snapshot, now):
+    """暫時不該接收流量的原因"""
+    if snapshot is None:
+        return ["啟動中"]
+    problems = liveness_problems(snapshot, now)
+    gateway = snapshot['gateway']
+    if not gateway['connected']:
+        problems.append("閘道未連線")
+    elif not gateway['ready']:
+        problems.append("閘道尚未就緒")
+    if gateway['latency_ms'] is not None and gateway['latency_ms'] > READY_MAX_LATENCY * 1000:
+        problems.append(f"閘道延遲 {gateway['latency_ms']} ms 超過 {READY_MAX_LATENCY * 1000:.0f} ms")
+    github = snapshot['github']
+    if github['open_circuits'] and (github['last_success_age'] is None
+                                    or github['last_success_age'] > READY_MAX_GITHUB_AGE):
+        problems.append(f"GitHub 斷路器開啟且 {READY_MAX_GITHUB_AGE:.0f} 秒內沒有成功的請求")
+    heartbeat_age = snapshot['scheduler']['heartbeat_age']
+    if heartbeat_age is not None and heartbeat_age > READY_MAX_SCHEDULER_AGE:
+        problems.append(f"排程器 {heartbeat_age:.0f} 秒沒有心跳")
+    if snapshot['queues']['log'] > READY_MAX_LOG_QUEUE:
+        problems.append(f"日誌佇列積壓 {snapshot['queues']['log']} 筆")
+    return problems
+
+def create_app():
+    """建立健康檢查用的 Flask app（在背景執行緒中才載入 flask）"""
+    from flask import Flask
+    
+    app = Flask(__name__)
+    
+    def probe_response(check):
+        snapshot = health_snapshot
+        problems = check(snapshot, time.time())
+        body = {'status': 'fail' if problems else 'ok', 'problems': problems, 'snapshot': snapshot}
+        return body, 503 if problems else 200
+    
+    @app.route("/health")
+    def health():
+        return probe_response(liveness_problems)
+    
+    @app.route("/ready")
+    def ready():
+        return probe_response(readiness_problems)
+    
+    @app.route("/")
+    def home():
+        return "機器人運行中"
+    
+    return app
 
 def run_flask():
     port = int(os.environ.get("PORT", 8080))  # 先抓環境變數，沒有就用 8080
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 
 def keep_alive():
-    t = Thread(target=run_flask)
+    t = Thread(target=run_flask, name="flask")
     t.daemon = True
     t.start()
 
+# ===== 互動中介層：每個按鈕回呼都記錄首次回應時間，逾時未回應就自動 defer =====
+
+# 每個按鈕保留最近幾次的延遲樣本，用來計算百分位
+BUTTON_LATENCY_SAMPLES = int(os.getenv("BUTTON_LATENCY_SAMPLES", "200"))
+SUBPANEL_TIMEOUT = 120
+
+button_latencies = {}
+
+def note_response(interaction):
+    """記錄互動第一次回應完成的時間；respond、auto_defer 與直接回應的按鈕都會呼叫"""
+    interaction.extras.setdefault('responded_at', time.perf_counter())
+
+async def _defer_interaction(interaction):
+    try:
+        with trace_span("Discord defer"):
+            await interaction.response.defer(ephemeral=True, thinking=True)
+        note_response(interaction)
+    except (discord.InteractionResponded, discord.HTTPException) as e:
+        # 回呼剛好在同時回應了，之後改用 followup 即可
+        command_log.debug(f"⚠️ 自動 defer 未送出: {e}")
+
+async def auto_defer(interaction):
+    """先 defer 互動（僅自己可見、顯示思考中）；同一個互動只送出一次，其他呼叫端等待同一個 defer"""
+    task = interaction.extras.get('auto_defer')
+    if task is None:
+        # responding：respond() 已經開始送出回應，這時再 defer 會被 Discord 拒絕
+        if interaction.response.is_done() or interaction.extras.get('responding'):
+            return
+        count_request_stat('auto_deferred')
+        task = interaction.extras['auto_defer'] = asyncio.ensure_future(_defer_interaction(interaction))
+    await asyncio.shield(task)
+
+async def respond(interaction, content=None, **kwargs):
+    """回覆互動（預設僅自己可見）：已經 defer 過的互動改用 followup"""
+    task = interaction.extras.get('auto_defer')
+    if task is not None:
+        await asyncio.shield(task)
+    kwargs.setdefault('ephemeral', True)
+    if interaction.response.is_done():
+        with trace_span("Discord followup"):
+            message = await interaction.followup.send(content, **kwargs)
+    else:
+        interaction.extras['responding'] = True
+        with trace_span("Discord respond"):
+            message = await interaction.response.send_message(content, **kwargs)
+    note_response(interaction)
+    return message
+
+def percentile(values, pct):
+    """最近排名法的百分位數；沒有樣本時回傳 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def record_button_latency(label, first_response, total, auto_deferred):
+    stats = button_latencies.get(label)
+    if stats is None:
+        stats = button_latencies[label] = {
+            'first': deque(maxlen=BUTTON_LATENCY_SAMPLES),
+            'total': deque(maxlen=BUTTON_LATENCY_SAMPLES),
+            'count': 0,
+            'auto_deferred': 0,
+        }
+    stats['count'] += 1
+    stats['auto_deferred'] += auto_deferred
+    stats['total'].append(total)
+    if first_response is not None:
+        stats['first'].append(first_response)
+
+def format_button_latency(limit=None):
+    """各按鈕首次回應與完成時間的 p50 / p95 / p99（毫秒），首次回應最慢的排前面"""
+    if not button_latencies:
+        return "尚無按鈕互動紀錄"
+
+    def quantiles(samples):
+        values = [percentile(samples, pct) for pct in (50, 95, 99)]
+        return " / ".join("-" if value is None else f"{value * 1000:.0f}" for value in values)
+
+    rows = sorted(button_latencies.items(), key=lambda item: percentile(item[1]['first'], 95) or 0, reverse=True)
+    return "\n".join(
+        f"{label}：首次回應 {quantiles(stats['first'])}｜完成 {quantiles(stats['total'])} ms"
+        f"（{stats['count']} 次，自動 defer {stats['auto_deferred']}）"
+        for label, stats in rows[:limit]
+    )
+
+def build_button_latency_message():
+    return (
+        "**🖱️ 按鈕延遲（p50 / p95 / p99，毫秒）**\n"
+        f"{format_button_latency()}\n\n"
+        f"超過 {AUTO_DEFER_AFTER:.1f} 秒仍未回應的按鈕會自動 defer，每個按鈕保留最近 {BUTTON_LATENCY_SAMPLES} 次樣本"
+    )
+
 # 記錄控制面板訊息 ID（用於重啟時更新）
 control_panel_message_id = None
 
-class ControlPanelView(discord.ui.View):
+class InstrumentedView(discord.ui.View):
+    """每個按鈕回呼都先檢查額度、設定日誌上下文，並以一個 trace 包住整個回呼"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for item in self.children:
+            item.callback = self._instrument(item, item.callback)
+
+    @staticmethod
+    def _instrument(item, callback):
+        name = f"button:{item.label}"
+        # 與指令共用成本表：按鈕回呼的函式名稱大多和對應的指令相同
+        cost_key = getattr(getattr(callback, 'callback', None), '__name__', item.label)
+
+        async def instrumented(interaction):
+            rejection = admit(cost_key, interaction.user, interaction.guild)
+            if rejection:
+                await interaction.response.send_message(rejection, ephemeral=True)
+                return
+            bind_log_context(name, interaction.user, interaction.guild)
+            command_log.debug(f"🖱️ 按鈕互動 {item.label}")
+            started = time.perf_counter()
+            root = start_trace(name)
+            error = None
+            # 回呼在自己的 task 中執行（會複製 context），超過門檻仍未回應就由這裡先 defer
+            task = asyncio.ensure_future(callback(interaction))
+            try:
+                done, _ = await asyncio.wait({task}, timeout=AUTO_DEFER_AFTER)
+                if not done:
+                    await auto_defer(interaction)
+                await task
+                mark_first_response(name)
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                # 包裝被取消時，回呼也一起取消，不留下沒人等待的 task
+                if not task.done():
+                    task.cancel()
+                finish_span(root, error)
+                responded_at = interaction.extras.get('responded_at')
+                record_button_latency(
+                    item.label,
+                    responded_at - started if responded_at is not None else None,
+                    time.perf_counter() - started,
+                    'auto_defer' in interaction.extras,
+                )
+
+        return instrumented
+
+class ControlPanelView(InstrumentedView):
     def __init__(self):
         super().__init__(timeout=None)
     
     @discord.ui.button(label="📊 狀態監控", style=discord.ButtonStyle.primary, custom_id="status_monitor")
     async def status_monitor(self, interaction: discord.Interaction, button: discord.ui.Button):
         """狀態監控面板"""
-        embed = discord.Embed(
-            title="📊 DevOps 狀態監控",
-            description="即時系統狀態與健康度檢查",
-            color=0x3498DB
-        )
-        
-        # 獲取即時狀態
-        build_status = get_latest_build_status()
-        commit_info = get_latest_commit()
-        
-        # 簡化狀態顯示
-        embed.add_field(
-            name="🔄 CI/CD 狀態",
-            value="點擊下方按鈕查看詳細狀態",
-            inline=False
-        )
-        
-        embed.add_field(
-            name="📝 最新提交",
-            value="查看最近程式碼變更",
-            inline=False
-        )
-        
-        view = StatusMonitorView()
-        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        embed = create_status_monitor_embed()
+        await respond(interaction, embed=embed, view=StatusMonitorView())
     
     @discord.ui.button(label="📝 變更管理", style=discord.ButtonStyle.success, custom_id="change_management")
     async def change_management(self, interaction: discord.Interaction, button: discord.ui.Button):
         """變更管理面板"""
-        embed = discord.Embed(
-            title="📝 變更管理控制台",
-            description="追蹤程式碼變更與版本發布",
-            color=0x27AE60
-        )
-        
-        embed.add_field(
-            name="🔄 更新檢查",
-            value="立即檢查最新合併的 PR",
-            inline=True
-        )
-        
-        embed.add_field(
-            name="📈 近期活動", 
-            value="查看最近開發進度",
-            inline=True
-        )
-        
-        view = ChangeManagementView()
-        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        embed = create_change_management_embed()
+        await respond(interaction, embed=embed, view=ChangeManagementView())
     
     @discord.ui.button(label="⚙️ 排程管理", style=discord.ButtonStyle.secondary, custom_id="schedule_management")
     async def schedule_management(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -148,8 +912,7 @@ class ControlPanelView(discord.ui.View):
             inline=True
         )
         
-        view = ScheduleManagementView()
-        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        await respond(interaction, embed=embed, view=ScheduleManagementView())
     
     @discord.ui.button(label="🔧 系統資訊", style=discord.ButtonStyle.gray, custom_id="system_info")
     async def system_info(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -172,163 +935,111 @@ class ControlPanelView(discord.ui.View):
             inline=True
         )
         
-        view = SystemInfoView()
-        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        embed.add_field(
+            name="🛡️ GitHub 斷路器",
+            value=format_circuit_status(),
+            inline=False
+        )
+        
+        embed.add_field(
+            name="⏱️ 請求統計",
+            value=format_request_stats(),
+            inline=False
+        )
+        
+        embed.add_field(
+            name="🚦 准入控制",
+            value=format_admission_stats(),
+            inline=False
+        )
+        
+        embed.add_field(
+            name="🖱️ 按鈕延遲（p50 / p95 / p99 ms）",
+            value=format_button_latency(limit=3),
+            inline=False
+        )
+        
+        if SHARDED:
+            shard_lines = [
+                f"#{shard_id}: {latency * 1000:.0f} ms / {guild_count} 伺服器"
+                for shard_id, latency, guild_count in get_shard_stats()
+            ]
+            embed.add_field(
+                name="🧩 分片",
+                value="\n".join(shard_lines[:10]),
+                inline=False
+            )
+        
+        await respond(interaction, embed=embed, view=SystemInfoView())
+
+class SubPanelView(InstrumentedView):
+    """子面板的共同基底：返回主選單按鈕只定義一次，固定排在最後一列"""
 
-# 狀態監控子面板
-class StatusMonitorView(discord.ui.View):
     def __init__(self):
-        super().__init__(timeout=120)
-    
+        super().__init__(timeout=SUBPANEL_TIMEOUT)
+
+    @discord.ui.button(label="🔙 返回主選單", style=discord.ButtonStyle.gray, row=4)
+    async def back_to_main(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.edit_message(embed=create_main_embed(), view=get_control_panel_view())
+        note_response(interaction)
+
+# 狀態監控子面板
+class StatusMonitorView(SubPanelView):
     @discord.ui.button(label="🚀 Pipeline 狀態", style=discord.ButtonStyle.primary)
     async def pipeline_status(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer(ephemeral=True)
-        status_message = get_workflow_status()
-        await interaction.followup.send(status_message, ephemeral=True)
+        await respond_with_deadline(interaction, get_workflow_status)
     
     @discord.ui.button(label="📦 建置狀態", style=discord.ButtonStyle.primary)
     async def build_status(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer(ephemeral=True)
-        status_message = get_latest_build_status()
-        await interaction.followup.send(status_message, ephemeral=True)
+        await respond_with_deadline(interaction, get_latest_build_status)
     
     @discord.ui.button(label="📝 最新提交", style=discord.ButtonStyle.primary)
     async def last_commit(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer(ephemeral=True)
-        commit_info = get_latest_commit()
-        await interaction.followup.send(commit_info, ephemeral=True)
+        await respond_with_deadline(interaction, get_latest_commit)
     
     @discord.ui.button(label="📋 Workflow 列表", style=discord.ButtonStyle.secondary)
     async def workflow_list(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer(ephemeral=True)
-        workflow_list = get_workflow_list()
-        await interaction.followup.send(workflow_list, ephemeral=True)
+        await respond_with_deadline(interaction, get_workflow_list)
     
-    @discord.ui.button(label="🔙 返回主選單", style=discord.ButtonStyle.gray)
-    async def back_to_main(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embed = create_main_embed()
-        view = ControlPanelView()
-        await interaction.response.edit_message(embed=embed, view=view)
+    @discord.ui.button(label="📈 圖表", style=discord.ButtonStyle.secondary)
+    async def pipeline_chart(self, interaction: discord.Interaction, button: discord.ui.Button):
+        png, summary = await get_pipeline_chart(None, 7)
+        if png is None:
+            await respond(interaction, summary)
+            return
+        file = discord.File(io.BytesIO(png), filename="pipeline_chart.png")
+        await respond(interaction, summary, file=file)
 
 # 變更管理子面板
-class ChangeManagementView(discord.ui.View):
-    def __init__(self):
-        super().__init__(timeout=120)
-    
+class ChangeManagementView(SubPanelView):
     @discord.ui.button(label="🔄 立即檢查", style=discord.ButtonStyle.success)
     async def force_check(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer(ephemeral=True)
-        global last_check_time
-        
-        since_date = last_check_time.strftime("%Y-%m-%d")
-        prs, error = get_merged_prs_since(since_date)
-        
-        if error:
-            await interaction.followup.send(error, ephemeral=True)
-            return
-        
-        if prs:
-            changelog_content = generate_changelog(prs)
-            await interaction.followup.send(changelog_content, ephemeral=True)
-        else:
-            await interaction.followup.send("📭 沒有找到新的 PR", ephemeral=True)
-        
-        last_check_time = datetime.now()
+        await respond_with_deadline(interaction, preview_new_prs)
     
     @discord.ui.button(label="📊 近期更新", style=discord.ButtonStyle.primary)
     async def recent_changelog(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer(ephemeral=True)
-        
-        since_date = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
-        prs, error = get_merged_prs_since(since_date)
-        
-        if error:
-            await interaction.followup.send(error, ephemeral=True)
-            return
-        
-        if not prs:
-            await interaction.followup.send("📭 最近 7 天沒有合併的 PR", ephemeral=True)
-            return
-        
-        detailed_changelog = f"🚀 **最近 7 天更新日誌**\n\n"
-        for pr in prs:
-            pr_number = pr['number']
-            pr_title = pr['title']
-            pr_url = pr['html_url']
-            merged_at = pr['pull_request']['merged_at']
-            author = pr['user']['login']
-            
-            merged_time = datetime.fromisoformat(merged_at.replace('Z', '+00:00'))
-            formatted_time = merged_time.strftime("%m/%d %H:%M")
-            
-            detailed_changelog += f"**#{pr_number}** - {pr_title}\n"
-            detailed_changelog += f"⏰ {formatted_time} | 👤 {author}\n"
-            detailed_changelog += f"🔗 [查看PR]({pr_url})\n\n"
-        
-        await interaction.followup.send(detailed_changelog, ephemeral=True)
-    
-    @discord.ui.button(label="🔙 返回主選單", style=discord.ButtonStyle.gray)
-    async def back_to_main(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embed = create_main_embed()
-        view = ControlPanelView()
-        await interaction.response.edit_message(embed=embed, view=view)
+        await respond_with_deadline(interaction, build_detailed_changelog, 7)
 
 # 排程管理子面板
-class ScheduleManagementView(discord.ui.View):
-    def __init__(self):
-        super().__init__(timeout=120)
-    
+class ScheduleManagementView(SubPanelView):
     @discord.ui.button(label="⏰ 排程資訊", style=discord.ButtonStyle.primary)
     async def schedule_info(self, interaction: discord.Interaction, button: discord.ui.Button):
-        next_check = get_next_monday()
-        
-        message = (
-            f"⏰ **排程設定**\n"
-            f"• 檢查時間: 每週一 09:00 (台灣時間)\n"
-            f"• 下次檢查: {next_check.strftime('%Y-%m-%d %H:%M UTC')}\n"
-            f"• 台灣時間: {(next_check + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M')}\n"
-            f"• 排程狀態: {'✅ 運行中' if CHANGELOG_CHANNEL_ID else '❌ 未啟用'}\n"
-            f"• 通知頻道: {f'<#{CHANGELOG_CHANNEL_ID}>' if CHANGELOG_CHANNEL_ID else '未設定'}"
-        )
-        
-        await interaction.response.send_message(message, ephemeral=True)
+        await respond(interaction, build_schedule_info_message())
     
     @discord.ui.button(label="🧪 測試排程", style=discord.ButtonStyle.success)
     async def test_schedule(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer(ephemeral=True)
-        await execute_scheduled_check()
-        await interaction.followup.send("✅ 排程檢查完成", ephemeral=True)
-    
-    @discord.ui.button(label="🔙 返回主選單", style=discord.ButtonStyle.gray)
-    async def back_to_main(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embed = create_main_embed()
-        view = ControlPanelView()
-        await interaction.response.edit_message(embed=embed, view=view)
+        try:
+            await execute_scheduled_check()
+        except ScheduledCheckFailed as e:
+            await respond(interaction, f"❌ 排程檢查失敗: {e}")
+            return
+        await respond(interaction, "✅ 排程檢查完成")
 
 # 系統資訊子面板
-class SystemInfoView(discord.ui.View):
-    def __init__(self):
-        super().__init__(timeout=120)
-    
+class SystemInfoView(SubPanelView):
     @discord.ui.button(label="⚙️ 系統設定", style=discord.ButtonStyle.primary)
     async def system_settings(self, interaction: discord.Interaction, button: discord.ui.Button):
-        next_manual_check = last_check_time + timedelta(days=CHECK_INTERVAL_DAYS)
-        next_schedule_check = get_next_monday()
-        
-        message = (
-            f"⚙️ **當前設定**\n"
-            f"**手動檢查系統**\n"
-            f"• 檢查頻率: 每 {CHECK_INTERVAL_DAYS} 天\n"
-            f"• 最後檢查: {last_check_time.strftime('%Y-%m-%d %H:%M')}\n"
-            f"• 下次檢查: {next_manual_check.strftime('%Y-%m-%d %H:%M')}\n\n"
-            f"**排程檢查系統**\n"
-            f"• 檢查時間: 每週一 09:00 (台灣時間)\n"
-            f"• 下次檢查: {next_schedule_check.strftime('%Y-%m-%d %H:%M UTC')}\n"
-            f"• 台灣時間: {(next_schedule_check + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M')}\n\n"
-            f"• 自動發送: {'✅ 已啟用' if CHANGELOG_CHANNEL_ID else '❌ 未啟用'}"
-        )
-        
-        await interaction.response.send_message(message, ephemeral=True)
+        await respond(interaction, build_check_settings_message())
     
     @discord.ui.button(label="🔧 技術支援", style=discord.ButtonStyle.secondary)
     async def tech_support(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -340,21 +1051,16 @@ class SystemInfoView(discord.ui.View):
             "💻 [原始碼](https://github.com/alpachen/discord-bot-devops)\n\n"
             "💡 需要協助？請聯繫管理員或查看文檔。"
         )
-        await interaction.response.send_message(support_message, ephemeral=True)
-    
-    @discord.ui.button(label="🔙 返回主選單", style=discord.ButtonStyle.gray)
-    async def back_to_main(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embed = create_main_embed()
-        view = ControlPanelView()
-        await interaction.response.edit_message(embed=embed, view=view)
+        await respond(interaction, support_message)
 
+# 內容固定的 embed 與常駐的主面板 view 只建立一次，所有訊息共用（不可再修改）
+@functools.cache
 def create_main_embed():
     """創建主控制面板的 Embed"""
     embed = discord.Embed(
         title="🤖 DevOps 監控控制台",
         description="專案狀態監控與自動化管理",
-        color=0x2C3E50,
-        timestamp=datetime.utcnow()
+        color=0x2C3E50
     )
     
     # 添加狀態概覽
@@ -385,45 +1091,112 @@ def create_main_embed():
     
     return embed
 
-async def send_control_panel():
-    """發送控制面板到指定頻道"""
-    global control_panel_message_id
+@functools.cache
+def create_status_monitor_embed():
+    embed = discord.Embed(
+        title="📊 DevOps 狀態監控",
+        description="即時系統狀態與健康度檢查",
+        color=0x3498DB
+    )
     
-    if not CONTROL_PANEL_CHANNEL_ID:
-        print("❌ CONTROL_PANEL_CHANNEL_ID 未設定，無法自動發送控制面板")
-        return
+    # 簡化狀態顯示（詳細狀態由子面板按鈕查詢，避免阻塞 3 秒回應期限）
+    embed.add_field(
+        name="🔄 CI/CD 狀態",
+        value="點擊下方按鈕查看詳細狀態",
+        inline=False
+    )
     
-    try:
-        channel = bot.get_channel(int(CONTROL_PANEL_CHANNEL_ID))
+    embed.add_field(
+        name="📝 最新提交",
+        value="查看最近程式碼變更",
+        inline=False
+    )
+    
+    return embed
+
+@functools.cache
+def create_change_management_embed():
+    embed = discord.Embed(
+        title="📝 變更管理控制台",
+        description="追蹤程式碼變更與版本發布",
+        color=0x27AE60
+    )
+    
+    embed.add_field(
+        name="🔄 更新檢查",
+        value="立即檢查最新合併的 PR",
+        inline=True
+    )
+    
+    embed.add_field(
+        name="📈 近期活動", 
+        value="查看最近開發進度",
+        inline=True
+    )
+    
+    return embed
+
+@functools.cache
+def get_control_panel_view():
+    """主面板沒有逾時且 custom_id 固定，啟動時以 add_view 註冊一次，重啟後舊訊息的按鈕也能使用"""
+    return ControlPanelView()
+
+async def resolve_channel(channel_id):
+    """取得頻道物件；分片模式下頻道可能不在本程序的快取中，改用 REST 查詢"""
+    channel = bot.get_channel(int(channel_id))
+    if channel is None and SHARDED:
+        try:
+            channel = await bot.fetch_channel(int(channel_id))
+        except (discord.NotFound, discord.Forbidden):
+            return None
+    return channel
+
+async def upsert_message(channel, message_id, **kwargs):
+    """有既有訊息就直接編輯，不存在時發送新訊息；回傳 (訊息, 是否為新發送)"""
+    if message_id:
+        try:
+            # 用 partial message 編輯，不必先 fetch 一次
+            with trace_span("Discord edit"):
+                message = await channel.get_partial_message(message_id).edit(**kwargs)
+            return message, False
+        except discord.NotFound:
+            panel_log.info("📝 現有訊息不存在，將發送新的")
+        except discord.Forbidden as e:
+            # 無法再編輯這則訊息（例如權限被移除）時改發新訊息；
+            # 其他 HTTP 錯誤（5xx、429）是暫時的，交給呼叫端記錄並在下一輪重試，避免重複發送
+            panel_log.warning(f"⚠️ 沒有權限編輯現有訊息，將發送新的: {e}")
+    
+    with trace_span("Discord send"):
+        message = await channel.send(**kwargs)
+    return message, True
+
+async def send_control_panel():
+    """發送控制面板到指定頻道"""
+    global control_panel_message_id
+    
+    if not CONTROL_PANEL_CHANNEL_ID:
+        panel_log.error("❌ CONTROL_PANEL_CHANNEL_ID 未設定，無法自動發送控制面板")
+        return
+    
+    try:
+        channel = await resolve_channel(CONTROL_PANEL_CHANNEL_ID)
         if not channel:
-            print(f"❌ 找不到頻道: {CONTROL_PANEL_CHANNEL_ID}")
+            panel_log.error(f"❌ 找不到頻道: {CONTROL_PANEL_CHANNEL_ID}")
             return
         
-        # 檢查是否已經有控制面板訊息
-        if control_panel_message_id:
-            try:
-                existing_message = await channel.fetch_message(control_panel_message_id)
-                embed = create_main_embed()
-                view = ControlPanelView()
-                await existing_message.edit(embed=embed, view=view)
-                print("✅ 已更新現有控制面板")
-                return
-            except discord.NotFound:
-                print("📝 現有控制面板訊息不存在，將發送新的")
-            except Exception as e:
-                print(f"❌ 更新控制面板時出錯: {e}")
-        
-        # 發送新的控制面板
+        # 已經有控制面板訊息就直接編輯，否則發送新的
         embed = create_main_embed()
-        view = ControlPanelView()
-        
-        message = await channel.send(embed=embed, view=view)
+        view = get_control_panel_view()
+        message, created = await upsert_message(channel, control_panel_message_id, embed=embed, view=view)
         control_panel_message_id = message.id
         
-        print(f"✅ 已發送控制面板到頻道 {CONTROL_PANEL_CHANNEL_ID}")
+        if created:
+            panel_log.info(f"✅ 已發送控制面板到頻道 {CONTROL_PANEL_CHANNEL_ID}")
+        else:
+            panel_log.info("✅ 已更新現有控制面板")
         
     except Exception as e:
-        print(f"❌ 發送控制面板時出錯: {e}")
+        panel_log.exception(f"❌ 發送控制面板時出錯: {e}")
 
 
 def run_scheduler():
@@ -438,40 +1211,46 @@ def run_scheduler():
     # 也可以添加測試排程（每小時執行一次，用於測試）
     schedule.every().hour.do(trigger_test_check)
     
-    print("⏰ 排程器設定完成：每週一 01:00 UTC (09:00 UTC+8) 自動檢查")
+    scheduler_log.info("⏰ 排程器設定完成：每週一 01:00 UTC (09:00 UTC+8) 自動檢查")
     
+    global scheduler_heartbeat
     while True:
+        scheduler_heartbeat = time.time()
         schedule.run_pending()
         time.sleep(60)  # 每分鐘檢查一次排程
 
 def trigger_weekly_check():
     """觸發每周檢查（由排程器調用）"""
-    print("🔔 排程器觸發每周檢查")
+    scheduler_log.info("🔔 排程器觸發每周檢查")
     weekly_check_event.set()
 
 def trigger_test_check():
     """測試用排程（每小時執行）"""
-    print("🧪 每小時測試排程執行中...")
+    scheduler_log.debug("🧪 每小時測試排程執行中...")
+
+class ScheduledCheckFailed(Exception):
+    """每周檢查抓取或發送失敗；工作紀錄會被釋放，同一週之後可以重試"""
 
 async def execute_scheduled_check():
-    """執行排程的每周檢查"""
-    print(f"🔍 執行排程每周檢查...")
+    """執行排程的每周檢查；抓取或發送失敗時拋出 ScheduledCheckFailed"""
+    scheduler_log.info(f"🔍 執行排程每周檢查...")
     
     # 檢查上週的 PR（上週一到現在）
     last_monday = datetime.utcnow() - timedelta(days=7)  # 使用 UTC 時間
     since_date = last_monday.strftime("%Y-%m-%d")
     
-    prs, error = get_merged_prs_since(since_date)
+    info = {}
+    prs, error = await asyncio.to_thread(get_merged_prs_since, since_date, None, info)
     
     if error:
         error_msg = f"❌ 自動檢查失敗: {error}"
-        print(error_msg)
+        scheduler_log.error(error_msg)
         if CHANGELOG_CHANNEL_ID:
             await send_changelog_to_channel(error_msg)
-        return
+        raise ScheduledCheckFailed(error)
     
     if prs:
-        print(f"📝 發現 {len(prs)} 個上週合併的 PR")
+        scheduler_log.info(f"📝 發現 {len(prs)} 個上週合併的 PR")
         
         # 計算時間範圍
         start_date = last_monday.strftime("%Y-%m-%d")
@@ -479,87 +1258,258 @@ async def execute_scheduled_check():
         
         changelog_content = f"📊 **每周更新報告 ({start_date} ~ {end_date})**\n\n"
         changelog_content += f"本周共合併了 **{len(prs)}** 個 PR\n\n"
+        changelog_content += format_search_split_note(info)
         
         for pr in prs:
-            pr_number = pr['number']
-            pr_title = pr['title']
-            pr_url = pr['html_url']
-            author = pr['user']['login']
-            merged_at = pr['pull_request']['merged_at']
+            pr_number = pr.number
+            pr_title = pr.title
+            pr_url = pr.html_url
+            author = pr.author
             
             # 格式化時間
-            merged_time = datetime.fromisoformat(merged_at.replace('Z', '+00:00'))
-            formatted_time = merged_time.strftime("%m/%d")
+            formatted_time = pr.merged_at.strftime("%m/%d")
             
             changelog_content += f"• [#{pr_number}]({pr_url}) {pr_title}\n"
             changelog_content += f"  👤 {author} | 📅 {formatted_time}\n\n"
         
         if CHANGELOG_CHANNEL_ID:
             success = await send_changelog_to_channel(changelog_content)
-            if success:
-                print("✅ 排程每周報告發送成功")
-            else:
-                print("❌ 排程每周報告發送失敗")
+            if not success:
+                raise ScheduledCheckFailed("排程每周報告發送失敗")
+            scheduler_log.info("✅ 排程每周報告發送成功")
     else:
-        print("📭 上週沒有新合併的 PR")
-        if CHANGELOG_CHANNEL_ID:
-            await send_changelog_to_channel("📭 上週沒有新合併的 PR")
+        scheduler_log.info("📭 上週沒有新合併的 PR")
+        if CHANGELOG_CHANNEL_ID and not await send_changelog_to_channel("📭 上週沒有新合併的 PR"):
+            raise ScheduledCheckFailed("排程每周報告發送失敗")
 
 @tasks.loop(seconds=30)
 async def check_scheduled_events():
     """檢查排程事件"""
     if weekly_check_event.is_set():
         weekly_check_event.clear()
-        await execute_scheduled_check()
+        # 每個實例的排程器都會觸發；只有領導者、且本週尚未發送時才真的執行
+        try:
+            await run_job_once(WEEKLY_REPORT_JOB, current_report_window(), execute_scheduled_check)
+        except ScheduledCheckFailed as e:
+            # 工作紀錄已釋放，每日的間隔檢查會在本週內重試
+            scheduler_log.error(f"❌ 排程每周檢查失敗，稍後重試: {e}")
+
+check_scheduled_events.before_loop(wait_for_leader_election)
 
 async def send_changelog_to_channel(content):
     """發送 changelog 到指定頻道"""
     try:
         if not CHANGELOG_CHANNEL_ID:
-            print("❌ CHANGELOG_CHANNEL_ID 未設定")
+            scheduler_log.error("❌ CHANGELOG_CHANNEL_ID 未設定")
             return False
         
-        channel = bot.get_channel(int(CHANGELOG_CHANNEL_ID))
+        channel = await resolve_channel(CHANGELOG_CHANNEL_ID)
         if channel:
             # 如果內容太長，分割訊息
-            if len(content) > 2000:
-                parts = [content[i:i+2000] for i in range(0, len(content), 2000)]
-                for part in parts:
-                    await channel.send(part)
-            else:
-                await channel.send(content)
-            print(f"✅ 已發送訊息到頻道 {CHANGELOG_CHANNEL_ID}")
+            with trace_span("Discord send"):
+                if len(content) > 2000:
+                    parts = [content[i:i+2000] for i in range(0, len(content), 2000)]
+                    for part in parts:
+                        await channel.send(part)
+                else:
+                    await channel.send(content)
+            scheduler_log.info(f"✅ 已發送訊息到頻道 {CHANGELOG_CHANNEL_ID}")
             return True
         else:
-            print(f"❌ 找不到頻道: {CHANGELOG_CHANNEL_ID}")
+            scheduler_log.error(f"❌ 找不到頻道: {CHANGELOG_CHANNEL_ID}")
             return False
     except Exception as e:
-        print(f"❌ 發送訊息失敗: {e}")
+        scheduler_log.exception(f"❌ 發送訊息失敗: {e}")
         return False
 
 @bot.event
 async def on_ready():
-    print(f"✅ 已登入為 {bot.user}")
-    print(f"🤖 Bot 已準備好接收指令！")
-    print(f"🌐 運行環境: {'Render' if not os.path.exists('.env') else '本地'}")
+    log.info(f"✅ 已登入為 {bot.user}")
+    log.info(f"🤖 Bot 已準備好接收指令！")
+    log.info(f"🌐 運行環境: {'Render' if not os.path.exists('.env') else '本地'}")
     
     # 計算下次排程檢查時間
     next_check = get_next_monday()
-    print(f"⏰ 下次排程檢查時間: {next_check.strftime('%Y-%m-%d %H:%M UTC')}")
+    log.info(f"⏰ 下次排程檢查時間: {next_check.strftime('%Y-%m-%d %H:%M UTC')}")
     
     if CHANGELOG_CHANNEL_ID:
-        print(f"📊 排程檢查已啟用，頻道: {CHANGELOG_CHANNEL_ID}")
+        log.info(f"📊 排程檢查已啟用，頻道: {CHANGELOG_CHANNEL_ID}")
         
         # 啟動排程器線程
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
+        scheduler_thread = threading.Thread(target=run_scheduler, name="scheduler", daemon=True)
         scheduler_thread.start()
         
         # 啟動事件檢查任務
         check_scheduled_events.start()
         
-        print("✅ 排程系統已啟動")
+        log.info("✅ 排程系統已啟動")
     else:
-        print("ℹ️  排程檢查未啟用（未設定 CHANGELOG_CHANNEL_ID）")
+        log.info("ℹ️  排程檢查未啟用（未設定 CHANGELOG_CHANNEL_ID）")
+
+def is_scheduler_shard():
+    """本程序是否負責執行排程任務（未分片時永遠是）"""
+    if not SHARDED:
+        return True
+    return SCHEDULER_SHARD_ID in bot.shards
+
+def get_shard_stats():
+    """回傳本程序各分片的延遲與伺服器數量"""
+    guild_counts = {}
+    for guild in bot.guilds:
+        guild_counts[guild.shard_id] = guild_counts.get(guild.shard_id, 0) + 1
+    
+    if not SHARDED:
+        return [(0, bot.latency, len(bot.guilds))]
+    
+    return [
+        (shard_id, latency, guild_counts.get(shard_id, 0))
+        for shard_id, latency in sorted(bot.latencies)
+    ]
+
+def read_rss_breakdown():
+    """讀取 /proc 的記憶體統計（單位 KB）；非 Linux 環境只回傳峰值 RSS"""
+    fields = ("VmRSS", "RssAnon", "RssFile", "RssShmem", "VmHWM", "VmSwap")
+    breakdown = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    breakdown[key] = int(value.split()[0])
+    except OSError:
+        import resource
+        breakdown["VmHWM"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return breakdown
+
+def get_memory_report(top_n=10):
+    """產生記憶體報告：RSS 分解、discord 快取大小與 tracemalloc 前 N 名"""
+    rss = read_rss_breakdown()
+    
+    message = f"🧠 **記憶體使用狀況**（低記憶體模式: {'✅ 開啟' if LOW_MEMORY_MODE else '❌ 關閉'}）\n"
+    for key in ("VmRSS", "RssAnon", "RssFile", "RssShmem", "VmHWM", "VmSwap"):
+        if key in rss:
+            message += f"• {key}: {rss[key] / 1024:.1f} MB\n"
+    
+    message += (
+        f"\n**Discord 快取**\n"
+        f"• 伺服器: {len(bot.guilds)} | 使用者: {len(bot.users)}\n"
+        f"• 訊息快取: {len(bot.cached_messages)} 則\n"
+        f"• GC 物件數: {len(gc.get_objects())}\n"
+    )
+    
+    if not tracemalloc.is_tracing():
+        message += "\n💡 tracemalloc 尚未啟用，使用 `!memory start` 開始追蹤"
+        return message
+    
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    message += f"\n**tracemalloc**（目前 {current / 1024 / 1024:.1f} MB / 峰值 {peak / 1024 / 1024:.1f} MB）\n"
+    for stat in snapshot.statistics("lineno")[:top_n]:
+        frame = stat.traceback[0]
+        file_name = os.path.basename(frame.filename)
+        message += f"`{stat.size / 1024:8.1f} KB` {file_name}:{frame.lineno} ({stat.count} 個)\n"
+    
+    return message[:2000]
+
+# ===== 取樣分析器：!profile 秒數，定期擷取所有執行緒的堆疊，輸出 collapsed stack =====
+
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
+# 預設每 10 ms 取樣一次；單次取樣太慢時自動拉長間隔，取樣成本不超過 PROFILE_MAX_OVERHEAD
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+PROFILE_MAX_OVERHEAD = 0.05
+
+_profile_running = threading.Lock()
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def sample_stacks(seconds, interval=PROFILE_INTERVAL):
+    """在目前的執行緒中取樣其他所有執行緒的堆疊，回傳 (collapsed 計數, 統計)
+
+    collapsed 的鍵為「執行緒;最外層;...;最內層」，可直接交給 flamegraph.pl 或 speedscope
+    """
+    own_ident = threading.get_ident()
+    main_ident = threading.main_thread().ident
+    counts = {}
+    samples = 0
+    sampling_time = 0.0
+    started = time.perf_counter()
+    deadline = started + seconds
+    
+    while time.perf_counter() < deadline:
+        sample_started = time.perf_counter()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            thread_name = names.get(ident, f"thread-{ident}")
+            if ident == main_ident:
+                thread_name += " (event loop)"
+            stack.append(thread_name)
+            key = ";".join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+        samples += 1
+        
+        cost = time.perf_counter() - sample_started
+        sampling_time += cost
+        time.sleep(max(interval, cost / PROFILE_MAX_OVERHEAD - cost))
+    
+    elapsed = time.perf_counter() - started
+    stats = {
+        'samples': samples,
+        'elapsed': elapsed,
+        'overhead': sampling_time / elapsed if elapsed else 0.0,
+        'threads': len({key.split(";", 1)[0] for key in counts}),
+    }
+    return counts, stats
+
+def format_collapsed_stacks(counts):
+    """collapsed stack 文字：每行「堆疊 次數」"""
+    return "\n".join(f"{stack} {count}" for stack, count in sorted(counts.items())) + "\n"
+
+def summarize_profile(counts, stats, top_n=8):
+    """取樣結果摘要：各執行緒的樣本數，以及事件迴圈上最常出現在最內層的函式"""
+    thread_samples = {}
+    loop_leaves = {}
+    for stack, count in counts.items():
+        frames = stack.split(";")
+        thread_samples[frames[0]] = thread_samples.get(frames[0], 0) + count
+        if frames[0].endswith("(event loop)") and len(frames) > 1:
+            loop_leaves[frames[-1]] = loop_leaves.get(frames[-1], 0) + count
+    
+    message = f"🔬 **取樣分析完成**（{stats['elapsed']:.1f} 秒、{stats['samples']} 次取樣、"
+    message += f"{stats['threads']} 個執行緒，取樣成本 {stats['overhead'] * 100:.1f}%）\n"
+    for thread_name, count in sorted(thread_samples.items(), key=lambda item: item[1], reverse=True)[:top_n]:
+        message += f"• {thread_name}: {count}\n"
+    
+    if loop_leaves:
+        loop_total = thread_samples.get(next(name for name in thread_samples if name.endswith("(event loop)")), 1)
+        message += "\n**事件迴圈最內層函式**\n"
+        for label, count in sorted(loop_leaves.items(), key=lambda item: item[1], reverse=True)[:top_n]:
+            message += f"`{count / loop_total * 100:5.1f}%` {label}\n"
+    message += "\n附件為 collapsed stack 格式，可用 speedscope.app 或 flamegraph.pl 產生火焰圖"
+    return message[:2000]
+
+async def run_profile(seconds):
+    """在背景執行緒取樣指定秒數；同時只允許一個分析，回傳 (摘要, discord.File) 或 (錯誤訊息, None)"""
+    if not _profile_running.acquire(blocking=False):
+        return "⏳ 已有一個分析正在進行，請稍後再試", None
+    try:
+        counts, stats = await asyncio.to_thread(sample_stacks, seconds)
+    finally:
+        _profile_running.release()
+    
+    filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed.txt"
+    attachment = discord.File(io.BytesIO(format_collapsed_stacks(counts).encode("utf-8")), filename=filename)
+    return summarize_profile(counts, stats), attachment
 
 def get_next_monday():
     """獲取下週一的日期（UTC 時間）"""
@@ -572,12 +1522,11 @@ def get_next_monday():
     return next_monday.replace(hour=1, minute=0, second=0, microsecond=0)
 
 # 添加排程管理指令
-@bot.command()
-async def schedule_info(ctx):
-    """查看當前排程設定"""
+def build_schedule_info_message():
+    """產生排程設定訊息"""
     next_check = get_next_monday()
     
-    message = (
+    return (
         f"⏰ **排程設定**\n"
         f"• 檢查時間: 每週一 09:00 (台灣時間)\n"
         f"• 下次檢查: {next_check.strftime('%Y-%m-%d %H:%M UTC')}\n"
@@ -585,231 +1534,1574 @@ async def schedule_info(ctx):
         f"• 排程狀態: {'✅ 運行中' if CHANGELOG_CHANNEL_ID else '❌ 未啟用'}\n"
         f"• 通知頻道: {f'<#{CHANGELOG_CHANNEL_ID}>' if CHANGELOG_CHANNEL_ID else '未設定'}"
     )
-    
-    await ctx.send(message)
+
+@bot.command()
+async def schedule_info(ctx):
+    """查看當前排程設定"""
+    await ctx.send(build_schedule_info_message())
 
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def test_schedule(ctx):
     """測試排程系統（立即觸發檢查）"""
     await ctx.send("🔔 手動觸發排程檢查...")
-    await execute_scheduled_check()
+    try:
+        await execute_scheduled_check()
+    except ScheduledCheckFailed as e:
+        await ctx.send(f"❌ 排程檢查失敗: {e}")
+        return
     await ctx.send("✅ 排程檢查完成")
 
-# 保留您現有的所有函數（從這裡開始都是您原有的程式碼）
+# ===== GitHub API 客戶端（第一次呼叫時才建立連線池） =====
 
-def get_latest_build_status():
-    """獲取最近一次的建置狀態"""
-    try:
-        if not GH_TOKEN:
-            return "❌ GitHub Token 未設定，請檢查 .env 檔案"
-        
-        # 設定 API 請求
-        headers = {
-            'Authorization': f'token {GH_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        
-        url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/runs'
-        
-        print(f"正在請求 GitHub API: {url}")
-        
-        # 發送請求
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()  # 如果失敗會拋出異常
-        
-        data = response.json()
-        
-        if not data['workflow_runs']:
-            return "📭 尚未有任何建置記錄"
-        
-        # 解析最新一筆執行
-        latest_run = data['workflow_runs'][0]
-        
-        status = latest_run['conclusion']  # success, failure, cancelled
-        created_at = latest_run['created_at']
-        html_url = latest_run['html_url']
-        workflow_name = latest_run['name']
-        
-        # 轉換為中文狀態
-        status_map = {
-            'success': '✅ 成功',
-            'failure': '❌ 失敗', 
-            'cancelled': '⏹️ 已取消',
-            None: '🔄 執行中'
-        }
-        
-        status_text = status_map.get(status, '❓ 未知狀態')
-        
-        # 格式化時間
-        from datetime import datetime
-        dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-        formatted_time = dt.strftime("%Y-%m-%d %H:%M:%S")
-        
-        return (f"📊 **最近一次建置狀態**\n"
-                f"**工作流程**: {workflow_name}\n"
-                f"**狀態**: {status_text}\n"
-                f"**時間**: {formatted_time}\n"
-                f"**詳細資訊**: [查看詳情]({html_url})")
-                
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 404:
-            return "❌ 找不到倉庫，請檢查 GITHUB_OWNER 和 GITHUB_REPO 設定"
-        elif e.response.status_code == 403:
-            return "❌ 權限不足，請檢查 GitHub Token 權限"
-        else:
-            return f"❌ HTTP 錯誤: {e.response.status_code}"
-    except Exception as e:
-        return f"❌ 獲取狀態時出錯: {str(e)}"
-        
-def get_latest_commit():
-    """獲取最近一次的 commit 資訊"""
-    try:
-        if not GH_TOKEN:
-            return "❌ GitHub Token 未設定"
-        
-        headers = {
-            'Authorization': f'token {GH_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        
-        url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/commits'
-        params = {'per_page': 1}
-        
-        print(f"🌐 正在請求 GitHub Commits API: {url}")
-        
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        
-        commits = response.json()
-        
-        if not commits:
-            return "📭 尚未有任何 commit 記錄"
-        
-        commit_data = commits[0]
-        return format_commit_message(commit_data)
-        
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 404:
-            return "❌ 找不到倉庫"
-        elif e.response.status_code == 403:
-            return "❌ 權限不足"
-        else:
-            return f"❌ HTTP 錯誤: {e.response.status_code}"
-    except Exception as e:
-        return f"❌ 獲取 commit 資訊時出錯: {str(e)}"
+GITHUB_API_URL = "https://api.github.com"
+GITHUB_TIMEOUT = 15
+_github_session = None
+_github_session_lock = threading.Lock()
 
-def format_commit_message(commit_data):
-    """格式化 commit 訊息"""
-    # 取得基本資訊
-    sha_short = commit_data['sha'][:7]
-    message = commit_data['commit']['message']
-    author_name = commit_data['commit']['author']['name']
-    commit_date = commit_data['commit']['author']['date']
-    
-    # 取得 GitHub 使用者名稱（安全處理）
-    github_username = commit_data['author']['login'] if commit_data.get('author') else author_name
-    
-    # 處理 commit 訊息
-    first_line = message.split('\n')[0]
-    if len(first_line) > 100:
-        first_line = first_line[:97] + "..."
+def get_github_session():
+    """取得共用的 GitHub Session（重複使用 TCP/TLS 連線）"""
+    global _github_session
+    if _github_session is None:
+        with _github_session_lock:
+            if _github_session is None:
+                session = requests.Session()
+                session.headers.update({
+                    'Authorization': f'token {GH_TOKEN}',
+                    'Accept': 'application/vnd.github.v3+json'
+                })
+                _github_session = session
+    return _github_session
+
+def github_get(url, params=None, **kwargs):
+    """對 GitHub API 發出 GET 請求；url 可以是完整網址或 /repos/... 路徑
+
+    CACHE_TTLS 中的端點先查快取（後端可由多個程序共用），沒有命中才真的發出請求。
+    每個端點有獨立的斷路器：連續失敗後直接拋出 CircuitOpenError，不再打到 GitHub。
+    """
+    if url.startswith('/'):
+        url = GITHUB_API_URL + url
+    endpoint = github_endpoint_key(url)
     
-    # 格式化時間
-    dt = datetime.fromisoformat(commit_date.replace('Z', '+00:00'))
-    formatted_time = dt.strftime("%m/%d %H:%M")
+    ttl = github_cache_ttl(endpoint, params, kwargs)
+    if ttl:
+        return cached_github_get(url, params, endpoint, ttl, kwargs)
+    return _github_request(url, params, endpoint, **kwargs)
+
+def _github_request(url, params, endpoint, **kwargs):
+    kwargs.setdefault('timeout', GITHUB_TIMEOUT)
+    breaker = get_circuit_breaker(endpoint)
+    if not breaker.allow_request():
+        _mark_upstream_failure()
+        raise CircuitOpenError(breaker)
     
-    # 建立 GitHub 連結
-    commit_url = f"https://github.com/{GITHUB_OWNER}/{GITHUB_REPO}/commit/{commit_data['sha']}"
+    # 互動的剩餘預算會截短請求逾時；預算用完就不再送出請求
+    budget = remaining_budget()
+    limited_by_deadline = False
+    if budget is not None:
+        if budget <= 0.05:
+            count_request_stat('deadline_exceeded')
+            _mark_upstream_failure()
+            raise DeadlineExceeded("互動時間預算已用完")
+        current = kwargs['timeout']
+        longest = max(current) if isinstance(current, tuple) else current
+        if budget < longest:
+            kwargs['timeout'] = budget
+            limited_by_deadline = True
     
-    return (f"📝 **最近一次 Commit**\n"
-            f"**訊息**: {first_line}\n"
-            f"**作者**: {author_name} (@{github_username})\n"
-            f"**時間**: {formatted_time}\n"
-            f"**Commit ID**: `{sha_short}`\n"
-            f"**詳細資訊**: [查看 commit]({commit_url})")
-
-def get_workflow_status(workflow_file=None):
-    """獲取 GitHub Actions workflow 狀態"""
+    if endpoint == 'search/issues':
+        # 只有真的送出的搜尋才扣 Search API 配額，快取命中不扣
+        search_quota.acquire()
+    count_request_stat('requests')
+    started = time.monotonic()
     try:
-        if not GH_TOKEN:
-            return "❌ GitHub Token 未設定，請檢查 .env 檔案"
-        
-        headers = {
-            'Authorization': f'token {GH_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        
-        # 構建 API URL
-        if workflow_file:
-            # 先獲取 workflow ID
-            workflow_id = get_workflow_id_by_name(workflow_file)
-            if workflow_id:
-                url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/workflows/{workflow_id}/runs'
+        with trace_span(f"GitHub {endpoint}") as span:
+            if kwargs.get('stream'):
+                response = get_github_session().get(url, params=params, **kwargs)
             else:
-                # 直接使用檔案名稱嘗試
-                url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/workflows/{workflow_file}/runs'
+                timeout = kwargs.pop('timeout')
+                response = hedged_get(get_github_session(), endpoint, url, params, timeout, **kwargs)
+            if span is not None:
+                span.attrs['status'] = response.status_code
+    except requests.exceptions.Timeout as e:
+        count_request_stat('timeouts')
+        _mark_upstream_failure()
+        if limited_by_deadline:
+            # 是我們自己的期限太短，不算上游故障
+            count_request_stat('deadline_exceeded')
         else:
-            # 獲取所有 workflow 的運行記錄
-            url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/runs'
-        
-        params = {'per_page': 5}
-        
-        print(f"🌐 請求 GitHub Actions API: {url}")
-        
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if not data.get('workflow_runs'):
-            return "📭 尚未有任何 workflow 運行記錄"
-        
-        return format_workflow_runs(data['workflow_runs'], workflow_file)
-        
-    except requests.exceptions.HTTPError as e:
-        error_msg = f"❌ GitHub API 錯誤: {e.response.status_code}"
-        if e.response.status_code == 404:
-            error_msg += " - 找不到倉庫或 workflow"
-            error_msg += f"\n💡 請使用 `!workflow_list` 查看正確的 workflow 檔案名稱"
-        elif e.response.status_code == 403:
-            error_msg += " - 權限不足，請檢查 token 權限"
-        return error_msg
-    except Exception as e:
-        return f"❌ 獲取 workflow 狀態時出錯: {str(e)}"
+            breaker.record_failure(e, url, params)
+        raise
+    except requests.exceptions.RequestException as e:
+        breaker.record_failure(e, url, params)
+        _mark_upstream_failure()
+        raise
+    
+    record_endpoint_latency(endpoint, time.monotonic() - started)
+    if endpoint == 'search/issues':
+        search_quota.update(response)
+    if response.status_code >= 500 or response.status_code == 429:
+        breaker.record_failure(f"HTTP {response.status_code}", url, params)
+        _mark_upstream_failure()
+    else:
+        breaker.record_success()
+    return response
 
-def get_workflow_id_by_name(workflow_name):
-    """根據顯示名稱獲取 workflow ID"""
+# ===== GitHub 回應快取：可替換的後端，同一台主機上的多個程序共用抓過的資料 =====
+
+# memory（程序內）、sqlite（同主機的程序共用，WAL 模式）、redis（跨主機，需要安裝 redis 套件）
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_PATH = os.getenv("CACHE_PATH", "github_cache.db")
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "64" if LOW_MEMORY_MODE else "256"))
+# 程序內快取的總位元組上限；單一回應超過上限的四分之一就不快取（一頁 100 筆 run 約 1 MB）
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str((1 if LOW_MEMORY_MODE else 4) * 1024 * 1024)))
+# 等待其他呼叫端計算同一個鍵的上限（秒）；計算權的租約在持有者當機後自動過期
+CACHE_LOCK_TIMEOUT = float(os.getenv("CACHE_LOCK_TIMEOUT", "10"))
+CACHE_LOCK_TTL = GITHUB_TIMEOUT * 2
+CACHE_POLL_INTERVAL = 0.05
+# 各端點的快取秒數，未列出的不快取；可用 CACHE_TTLS=actions/runs=60,commits=0 覆寫
+CACHE_TTLS = {
+    'actions/workflows': 300,
+    'actions/runs': 30, 'actions/workflows/{workflow}/runs': 30,
+    'actions/runs/{id}': 30, 'actions/runs/{id}/jobs': 30,
+    'commits': 30, 'pulls': 30,
+    'search/issues': 60,
+}
+for _item in filter(None, os.getenv("CACHE_TTLS", "").split(",")):
+    _name, _, _ttl = _item.partition("=")
     try:
-        headers = {
-            'Authorization': f'token {GH_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        
-        url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/workflows'
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        for workflow in data.get('workflows', []):
-            if workflow['name'].lower() == workflow_name.lower():
-                return workflow['id']
+        CACHE_TTLS[_name.strip()] = float(_ttl)
+    except ValueError:
+        log.warning(f"⚠️ 忽略格式錯誤的 CACHE_TTLS 項目 `{_item}`")
+# 分頁、時間區間或 SHA 起點的請求幾乎不會重複，快取只會佔記憶體
+CACHE_SKIP_PARAMS = ('created', 'sha')
+
+# 匯出等一次性的大量讀取設為 True，期間的請求都不經過快取
+github_cache_bypass = contextvars.ContextVar("github_cache_bypass", default=False)
+
+# 不同 token 看得到的資料可能不同，鍵裡帶上 token 的雜湊
+_cache_namespace = "gh:" + hashlib.sha256((GH_TOKEN or "").encode('utf-8')).hexdigest()[:12]
+
+class CacheBackend:
+    """快取後端介面：鍵是字串、值是 bytes，每筆各有 TTL（秒）
+
+    子類別實作 get / set / _acquire / _release；get_or_compute 讓同一個鍵同時只有一個呼叫端計算，
+    其他呼叫端輪詢等待結果。儲存層出錯時直接計算，快取故障不會讓查詢失敗
+    """
+    name = "none"
+
+    def __init__(self):
+        self.holder = f"{socket.gethostname()}-{os.getpid()}"
+        self.stats = {'hits': 0, 'misses': 0, 'waits': 0, 'errors': 0}
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def _acquire(self, key):
+        """取得計算權；其他呼叫端正在計算時回傳 False"""
+        raise NotImplementedError
+
+    def _release(self, key):
+        raise NotImplementedError
+
+    def _storage_error(self, error):
+        self.stats['errors'] += 1
+        github_log.warning(f"⚠️ 快取後端 {self.name} 錯誤，改為直接查詢: {error}")
+
+    def get_or_compute(self, key, ttl, compute):
+        """回傳 (值, 是否命中)；compute 回傳 None 時不寫入快取"""
+        budget = remaining_budget()
+        deadline = time.monotonic() + (CACHE_LOCK_TIMEOUT if budget is None else min(CACHE_LOCK_TIMEOUT, budget))
+        acquired = False
+        waited = False
+        while True:
+            try:
+                value = self.get(key)
+                if value is not None:
+                    self.stats['hits'] += 1
+                    return value, True
+                acquired = self._acquire(key)
+                # 取得計算權前，上一個持有者可能剛寫入並釋放，再確認一次
+                if acquired:
+                    value = self.get(key)
+                    if value is not None:
+                        self._release(key)
+                        self.stats['hits'] += 1
+                        return value, True
+            except Exception as e:
+                self._storage_error(e)
+                return compute(), False
+            if acquired or time.monotonic() >= deadline:
+                break
+            if not waited:
+                waited = True
+                self.stats['waits'] += 1
+            time.sleep(CACHE_POLL_INTERVAL)
         
-        return None
-    except:
-        return None
+        self.stats['misses'] += 1
+        try:
+            value = compute()
+            if value is not None:
+                try:
+                    self.set(key, value, ttl)
+                except Exception as e:
+                    self._storage_error(e)
+            return value, False
+        finally:
+            if acquired:
+                try:
+                    self._release(key)
+                except Exception as e:
+                    self._storage_error(e)
 
-def format_workflow_runs(workflow_runs, workflow_filter=None):
-    """格式化 workflow 運行資訊"""
-    if not workflow_runs:
-        return "📭 沒有找到 workflow 運行記錄"
-    
+    def describe(self):
+        return self.name
+
+class MemoryCacheBackend(CacheBackend):
+    """程序內的 LRU 快取，同時限制筆數與總位元組；寫入時先清掉過期的項目"""
+    name = "memory"
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (到期時間, 值)
+        self._inflight = set()
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        self.size -= len(self._entries.pop(key)[1])
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            for expired in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                self._pop(expired)
+            if key in self._entries:
+                self._pop(key)
+            if len(value) > self.max_bytes // 4:
+                return
+            self._entries[key] = (now + ttl, value)
+            self.size += len(value)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _acquire(self, key):
+        with self._lock:
+            if key in self._inflight:
+                return False
+            self._inflight.add(key)
+            return True
+
+    def _release(self, key):
+        with self._lock:
+            self._inflight.discard(key)
+
+    def describe(self):
+        return (
+            f"memory（{len(self._entries)}/{self.max_entries} 筆，"
+            f"{self.size / 1024:.0f}/{self.max_bytes / 1024:.0f} KB）"
+        )
+
+class SQLiteCacheBackend(CacheBackend):
+    """同一台主機上多個程序共用的 SQLite 快取（WAL：讀取不會被寫入擋住）
+
+    計算權是 cache_locks 裡的一列租約，和 JobCoordinator 的租約一樣以單一條 SQL 語句取得
+    """
+    name = "sqlite"
+    PURGE_EVERY = 100
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_locks ("
+                "key TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._connect().execute(sql, params)
+
+    def get(self, key):
+        row = self._execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, now + ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+
+    def _acquire(self, key):
+        now = time.time()
+        cursor = self._execute(
+            "INSERT INTO cache_locks (key, holder, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+            "WHERE cache_locks.expires_at <= ?",
+            (key, self.holder, now + CACHE_LOCK_TTL, now),
+        )
+        return cursor.rowcount == 1
+
+    def _release(self, key):
+        self._execute("DELETE FROM cache_locks WHERE key = ? AND holder = ?", (key, self.holder))
+
+    def describe(self):
+        return f"sqlite（`{self.path}`）"
+
+class RedisCacheBackend(CacheBackend):
+    """跨主機共用的 Redis 快取；只用到 GET、SET（EX / NX PX）與釋放鎖的 EVAL
+
+    client 可以傳入任何相容 redis-py 的物件，方便指向本機的 redis-server 或替身測試（tests/conftest.py 的 FakeRedis）
+    """
+    name = "redis"
+    # 比較持有者後刪除必須是同一個原子操作：分開 GET 與 DEL 時，鎖可能在兩者之間過期並被別人取得，
+    # 結果刪掉別人的鎖
+    RELEASE_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+    )
+
+    def __init__(self, url, client=None):
+        super().__init__()
+        self.url = url
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self._client = client
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, value, ex=max(1, math.ceil(ttl)))
+
+    def _acquire(self, key):
+        return bool(self._client.set(f"{key}:lock", self.holder, nx=True, px=int(CACHE_LOCK_TTL * 1000)))
+
+    def _release(self, key):
+        self._client.eval(self.RELEASE_SCRIPT, 1, f"{key}:lock", self.holder)
+
+    def describe(self):
+        return f"redis（{self.url.rsplit('@', 1)[-1]}）"
+
+def create_cache_backend(kind=CACHE_BACKEND):
+    """依設定建立快取後端；設定無效或缺少套件時退回程序內快取"""
+    if kind == "sqlite":
+        return SQLiteCacheBackend(CACHE_PATH)
+    if kind == "redis":
+        if importlib.util.find_spec("redis") is not None:
+            return RedisCacheBackend(CACHE_URL)
+        log.warning("⚠️ CACHE_BACKEND=redis 但未安裝 redis 套件，改用程序內快取")
+    elif kind != "memory":
+        log.warning(f"⚠️ 未知的 CACHE_BACKEND `{kind}`，改用程序內快取")
+    return MemoryCacheBackend()
+
+github_cache = create_cache_backend()
+
+class CachedResponse:
+    """從快取還原的回應，提供呼叫端用到的 status_code、headers、content 與 raise_for_status"""
+    __slots__ = ('status_code', 'headers', 'content', 'url')
+
+    def __init__(self, status_code, headers, content, url):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        # 只有成功的回應會被快取
+        pass
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def encode(response):
+        """一行 JSON 標頭（狀態碼與 ETag）加上原始內容"""
+        header = {'status': response.status_code, 'etag': response.headers.get('ETag')}
+        return json.dumps(header).encode('utf-8') + b"\n" + response.content
+
+    @classmethod
+    def decode(cls, value, url):
+        header, _, content = bytes(value).partition(b"\n")
+        header = json.loads(header)
+        headers = {'ETag': header['etag']} if header.get('etag') else {}
+        return cls(header['status'], headers, content, url)
+
+def github_cache_ttl(endpoint, params, kwargs):
+    """這個請求可以快取幾秒
+
+    串流下載、自訂標頭（例如只要 SHA）、第 2 頁以後、時間區間或 SHA 起點的請求，
+    以及匯出期間的請求都不快取
+    """
+    if kwargs.get('stream') or kwargs.get('headers') or github_cache_bypass.get():
+        return 0
+    params = params or {}
+    if any(name in params for name in CACHE_SKIP_PARAMS) or int(params.get('page', 1)) > 1:
+        return 0
+    return CACHE_TTLS.get(endpoint, 0)
+
+def github_cache_key(url, params):
+    query = "&".join(f"{key}={value}" for key, value in sorted((params or {}).items()))
+    return f"{_cache_namespace}:{url}?{query}"
+
+def cached_github_get(url, params, endpoint, ttl, kwargs):
+    """先查快取；沒有命中時由一個呼叫端發出請求並寫入，其他程序或執行緒等待同一份結果"""
+    live = []
+    
+    def fetch():
+        response = _github_request(url, params, endpoint, **kwargs)
+        live.append(response)
+        return CachedResponse.encode(response) if response.status_code == 200 else None
+    
+    with trace_span(f"cache {endpoint}") as span:
+        value, hit = github_cache.get_or_compute(github_cache_key(url, params), ttl, fetch)
+        if span is not None:
+            span.attrs['hit'] = hit
+    count_request_stat('cache_hits' if hit else 'cache_misses')
+    if value is not None:
+        # 命中時沿用原本的取得時間，只有真的向 GitHub 取得時才算新的
+        remember_warm_request(url, params, ttl, value, None if hit else time.time())
+    if live:
+        return live[0]
+    return CachedResponse.decode(value, url)
+
+# ===== 暖啟動快照：定期把快取的回應與最近的結果存成壓縮檔，冷啟動時先載入再背景重新驗證 =====
+
+WARM_SNAPSHOT_PATH = os.getenv("WARM_SNAPSHOT_PATH", f"warm_state{'-' + CLUSTER_ID if CLUSTER_ID else ''}.json.gz")
+WARM_SNAPSHOT_INTERVAL = int(os.getenv("WARM_SNAPSHOT_INTERVAL", "300"))
+# 回應或結果取得超過這個秒數就不存也不載入：太舊的回應即使只用到重新驗證完成前，也可能誤導使用者
+WARM_SNAPSHOT_MAX_AGE = int(os.getenv("WARM_SNAPSHOT_MAX_AGE", str(6 * 3600)))
+# 載入的回應在重新驗證完成前可以使用的秒數
+WARM_RESTORE_TTL = int(os.getenv("WARM_RESTORE_TTL", "120"))
+WARM_REFRESH_CONCURRENCY = int(os.getenv("WARM_REFRESH_CONCURRENCY", "4"))
+WARM_MAX_REQUESTS = 64
+# 保留的回應內容總位元組上限
+WARM_MAX_BYTES = int(os.getenv("WARM_MAX_BYTES", str((512 if LOW_MEMORY_MODE else 2048) * 1024)))
+
+# 最近查詢過的可快取請求：快取鍵 -> (網址, 參數, TTL, 最後一次的回應內容, 向 GitHub 取得的時間)
+# 內容與快取的 TTL 無關，閒置到快取過期後的關閉快照仍然有回應可存
+warm_requests = OrderedDict()
+_warm_lock = threading.Lock()
+_warm_bytes = 0
+warm_start_stats = {'restored_responses': 0, 'restored_results': 0, 'not_modified': 0,
+                    'updated': 0, 'failed': 0, 'revalidated_in': None}
+
+def remember_warm_request(url, params, ttl, value, fetched_at=None):
+    """fetched_at 為 None 表示內容來自快取：沿用已記錄的取得時間，沒有記錄時以現在計算"""
+    global _warm_bytes
+    key = github_cache_key(url, params)
+    value = bytes(value)
+    if len(value) > WARM_MAX_BYTES // 4:
+        return
+    with _warm_lock:
+        previous = warm_requests.pop(key, None)
+        if previous is not None:
+            _warm_bytes -= len(previous[3])
+            if fetched_at is None and previous[3] == value:
+                fetched_at = previous[4]
+        warm_requests[key] = (url, dict(params or {}), ttl, value, fetched_at or time.time())
+        _warm_bytes += len(value)
+        while len(warm_requests) > WARM_MAX_REQUESTS or _warm_bytes > WARM_MAX_BYTES:
+            _warm_bytes -= len(warm_requests.popitem(last=False)[1][3])
+
+def build_warm_snapshot():
+    """收集最近的回應與每個查詢最後一次成功的結果，略過取得超過 WARM_SNAPSHOT_MAX_AGE 的項目"""
+    now = time.time()
+    with _warm_lock:
+        responses = [
+            [url, params, ttl, base64.b64encode(value).decode('ascii'), fetched_at]
+            for url, params, ttl, value, fetched_at in warm_requests.values()
+            if now - fetched_at <= WARM_SNAPSHOT_MAX_AGE
+        ]
+    oldest_result = datetime.now() - timedelta(seconds=WARM_SNAPSHOT_MAX_AGE)
+    with _last_good_lock:
+        results = [
+            [list(key), value, fetched_at.isoformat()]
+            for key, (value, fetched_at) in _last_good_results.items()
+            if fetched_at >= oldest_result
+        ]
+    return {'saved_at': now, 'namespace': _cache_namespace, 'responses': responses, 'results': results}
+
+def save_warm_snapshot():
+    """寫到暫存檔再替換，程序中途被終止也不會留下壞掉的快照；沒有內容時保留原本的快照"""
+    snapshot = build_warm_snapshot()
+    if not snapshot['responses'] and not snapshot['results']:
+        return
+    temp_path = f"{WARM_SNAPSHOT_PATH}.tmp"
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, WARM_SNAPSHOT_PATH)
+
+def restore_warm_snapshot():
+    """連線閘道前載入快照，回傳需要重新驗證的請求列表"""
+    try:
+        with gzip.open(WARM_SNAPSHOT_PATH, 'rt', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        log.warning(f"⚠️ 無法讀取暖啟動快照 {WARM_SNAPSHOT_PATH}: {e}")
+        return []
+    
+    age = time.time() - snapshot.get('saved_at', 0)
+    if age > WARM_SNAPSHOT_MAX_AGE or snapshot.get('namespace') != _cache_namespace:
+        log.info("ℹ️ 暖啟動快照已過期或屬於其他 GitHub Token，略過")
+        return []
+    
+    pending = []
+    now = time.time()
+    for url, params, ttl, value, *rest in snapshot.get('responses', []):
+        # 舊格式的快照沒有個別的取得時間，以快照時間計算
+        fetched_at = rest[0] if rest else snapshot.get('saved_at', 0)
+        if now - fetched_at > WARM_SNAPSHOT_MAX_AGE:
+            continue
+        key = github_cache_key(url, params)
+        value = base64.b64decode(value)
+        try:
+            github_cache.set(key, value, WARM_RESTORE_TTL)
+        except Exception as e:
+            log.warning(f"⚠️ 無法寫入快取: {e}")
+            break
+        remember_warm_request(url, params, ttl, value, fetched_at)
+        pending.append((key, url, params, ttl))
+    
+    restored_results = 0
+    oldest_result = datetime.now() - timedelta(seconds=WARM_SNAPSHOT_MAX_AGE)
+    with _last_good_lock:
+        for key, value, fetched_at in snapshot.get('results', []):
+            fetched_at = datetime.fromisoformat(fetched_at)
+            if fetched_at >= oldest_result:
+                _last_good_results[tuple(key)] = (value, fetched_at)
+                restored_results += 1
+        while len(_last_good_results) > STALE_RESULT_LIMIT:
+            _last_good_results.popitem(last=False)
+    
+    warm_start_stats.update(restored_responses=len(pending), restored_results=restored_results)
+    log.info(f"♨️ 已載入 {age / 60:.0f} 分鐘前的暖啟動快照: {len(pending)} 個回應、"
+             f"{warm_start_stats['restored_results']} 個查詢結果")
+    return pending
+
+def revalidate_cached_request(key, url, params, ttl):
+    """以 ETag 發出條件請求：304 不消耗 GitHub 額度，只把快取時間延長為正常的 TTL"""
+    value = github_cache.get(key)
+    if value is None:
+        # 快取中的暫時項目已過期時，改用保留的最後一次回應
+        with _warm_lock:
+            entry = warm_requests.get(key)
+        value = entry[3] if entry else None
+    etag = CachedResponse.decode(value, url).headers.get('ETag') if value is not None else None
+    headers = {'If-None-Match': etag} if etag else None
+    response = _github_request(url, params, github_endpoint_key(url), headers=headers)
+    if response.status_code == 304 and value is not None:
+        github_cache.set(key, value, ttl)
+        # 304 代表內容仍是最新的，取得時間重新計算
+        remember_warm_request(url, params, ttl, value, time.time())
+        return 'not_modified'
+    if response.status_code == 200:
+        value = CachedResponse.encode(response)
+        github_cache.set(key, value, ttl)
+        remember_warm_request(url, params, ttl, value, time.time())
+        return 'updated'
+    return 'failed'
+
+async def revalidate_warm_state(pending):
+    """背景重新驗證載入的回應，同時最多 WARM_REFRESH_CONCURRENCY 個請求"""
+    semaphore = asyncio.Semaphore(WARM_REFRESH_CONCURRENCY)
+    started = time.perf_counter()
+    
+    async def revalidate(entry):
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(revalidate_cached_request, *entry)
+            except Exception as e:
+                github_log.warning(f"⚠️ 重新驗證 {entry[1]} 失敗: {e}")
+                return 'failed'
+    
+    for outcome in await asyncio.gather(*(revalidate(entry) for entry in pending)):
+        warm_start_stats[outcome] += 1
+    warm_start_stats['revalidated_in'] = round(time.perf_counter() - started, 3)
+    github_log.info(
+        f"♨️ 暖啟動快照重新驗證完成（{warm_start_stats['revalidated_in']:.2f} 秒）: "
+        f"未變更 {warm_start_stats['not_modified']}、已更新 {warm_start_stats['updated']}、失敗 {warm_start_stats['failed']}"
+    )
+
+@tasks.loop(seconds=WARM_SNAPSHOT_INTERVAL)
+async def save_warm_snapshot_task():
+    try:
+        await asyncio.to_thread(save_warm_snapshot)
+    except OSError as e:
+        log.warning(f"⚠️ 無法寫入暖啟動快照: {e}")
+
+def mark_first_response(kind):
+    """記錄啟動後第一個完成的指令或按鈕，量測冷啟動後使用者實際等待的時間"""
+    if 'first_response' in startup_timings:
+        return
+    startup_timings['first_response'] = time.perf_counter() - PROCESS_START
+    log.info(
+        f"⏱️ 啟動到第一個回應（{kind}）: {startup_timings['first_response']:.2f} 秒，"
+        f"快取命中 {request_stats['cache_hits']} / 未命中 {request_stats['cache_misses']}，"
+        f"暖啟動載入 {warm_start_stats['restored_responses']} 個回應"
+    )
+
+def _bench_cache_worker(kind, path, keys, compute_seconds):
+    """基準測試的 worker 程序：依序查詢所有鍵，回傳自己實際計算的次數與耗時"""
+    backend = SQLiteCacheBackend(path) if kind == "sqlite" else create_cache_backend(kind)
+    computed = 0
+    
+    def compute():
+        nonlocal computed
+        computed += 1
+        time.sleep(compute_seconds)
+        return b"x" * 4096
+    
+    started = time.perf_counter()
+    for key in keys:
+        backend.get_or_compute(key, 60, compute)
+    return computed, time.perf_counter() - started
+
+def benchmark_cache(processes=4, key_count=20, compute_seconds=0.05):
+    """多個程序同時查詢同一組鍵：程序內快取每個程序各算一次，共用後端每個鍵只算一次"""
+    import multiprocessing
+    kinds = ["memory", "sqlite"]
+    if CACHE_BACKEND == "redis" and importlib.util.find_spec("redis") is not None:
+        kinds.append("redis")
+    
+    print(f"🧪 快取基準測試: {processes} 個程序 × {key_count} 個鍵，每次計算 {compute_seconds * 1000:.0f} ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in kinds:
+            path = os.path.join(tmp, "bench_cache.db")
+            run_id = os.urandom(4).hex()
+            keys = [f"bench:{run_id}:{i}" for i in range(key_count)]
+            started = time.perf_counter()
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context("fork")
+            ) as pool:
+                results = list(pool.map(_bench_cache_worker, [kind] * processes, [path] * processes,
+                                        [keys] * processes, [compute_seconds] * processes))
+            elapsed = time.perf_counter() - started
+            computed = sum(count for count, _ in results)
+            print(f"  {kind:<7} 實際計算 {computed:>3} 次（理想 {key_count}）| 總耗時 {elapsed:.2f} 秒")
+
+# ===== 准入控制：依指令成本，從使用者、伺服器、全域三層 token bucket 扣除 =====
+
+# 格式為「容量/秒數」：最多累積「容量」個 token，每「秒數」秒補滿
+RATE_LIMIT_USER = os.getenv("RATE_LIMIT_USER", "10/60")
+RATE_LIMIT_GUILD = os.getenv("RATE_LIMIT_GUILD", "30/60")
+RATE_LIMIT_GLOBAL = os.getenv("RATE_LIMIT_GLOBAL", "60/60")
+# 同時追蹤的使用者與伺服器 bucket 數量上限，超過時淘汰最久沒用的（等同補滿）
+RATE_LIMIT_MAX_BUCKETS = 10000
+
+# 指令與按鈕的成本（大約等於會打到 GitHub 的請求數），以函式名稱為鍵；
+# 0 表示不受限制，未列出的為 DEFAULT_COMMAND_COST。可用 COMMAND_COSTS=changelog=8,why_failed=6 覆寫
+DEFAULT_COMMAND_COST = 1
+COMMAND_COSTS = {
+    # Search API 或整包日誌下載
+    'changelog': 5, 'recent_changelog': 5, 'force_check': 5, 'test_schedule': 5, 'export': 5,
+    'why_failed': 4, 'pipeline_chart': 4,
+    'pipeline_status': 2, 'live_board': 2,
+    'build_status': 1, 'last_commit': 1, 'workflow_list': 1, 'commits': 1,
+    # 只讀本機狀態
+    'hi': 0, 'panel': 0, 'update_panel': 0, 'check_settings': 0, 'schedule_info': 0,
+    'shard_info': 0, 'leader_info': 0, 'memory': 0, 'profile': 0, 'slow_traces': 0,
+    'log_level': 0, 'rate_limits': 0, 'button_latency': 0, 'help': 0,
+    'subscribe': 0, 'unsubscribe': 0, 'subscriptions': 0,
+    'status_monitor': 0, 'change_management': 0, 'schedule_management': 0, 'system_info': 0,
+    'system_settings': 0, 'tech_support': 0, 'back_to_main': 0,
+}
+for _item in filter(None, os.getenv("COMMAND_COSTS", "").split(",")):
+    _name, _, _cost = _item.partition("=")
+    try:
+        COMMAND_COSTS[_name.strip()] = int(_cost)
+    except ValueError:
+        log.warning(f"⚠️ 忽略格式錯誤的 COMMAND_COSTS 項目 `{_item}`")
+
+ADMISSION_SCOPE_LABELS = {'user': '個人', 'guild': '伺服器', 'global': '全域'}
+
+class TokenBucket:
+    """容量 capacity、每秒補充 rate 個 token 的 bucket"""
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost):
+        """還要等幾秒才夠扣 cost（成本超過容量時以容量計算）"""
+        missing = min(cost, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+def parse_rate_limit(value):
+    capacity, _, period = value.partition("/")
+    return float(capacity), float(capacity) / float(period or 60)
+
+_admission_limits = {
+    'user': parse_rate_limit(RATE_LIMIT_USER),
+    'guild': parse_rate_limit(RATE_LIMIT_GUILD),
+    'global': parse_rate_limit(RATE_LIMIT_GLOBAL),
+}
+# (scope, id) -> TokenBucket；只在事件迴圈上存取，不需要鎖
+_admission_buckets = OrderedDict()
+admission_stats = {'admitted': 0, 'rejected': 0, 'by_scope': {}, 'by_command': {}}
+
+def _get_bucket(scope, key):
+    bucket = _admission_buckets.get((scope, key))
+    if bucket is None:
+        bucket = _admission_buckets[(scope, key)] = TokenBucket(*_admission_limits[scope])
+        if len(_admission_buckets) > RATE_LIMIT_MAX_BUCKETS:
+            _admission_buckets.popitem(last=False)
+    else:
+        _admission_buckets.move_to_end((scope, key))
+    return bucket
+
+def command_cost(name):
+    return COMMAND_COSTS.get(name, DEFAULT_COMMAND_COST)
+
+def admit(name, user, guild):
+    """三層 bucket 都夠才一起扣除；回傳 None 表示放行，否則回傳給使用者的拒絕訊息"""
+    cost = command_cost(name)
+    if cost <= 0:
+        return None
+    
+    now = time.monotonic()
+    buckets = [('user', _get_bucket('user', user.id)), ('global', _get_bucket('global', None))]
+    if guild is not None:
+        buckets.insert(1, ('guild', _get_bucket('guild', guild.id)))
+    
+    for scope, bucket in buckets:
+        bucket.refill(now)
+        wait = bucket.wait_time(cost)
+        if wait > 0:
+            admission_stats['rejected'] += 1
+            admission_stats['by_scope'][scope] = admission_stats['by_scope'].get(scope, 0) + 1
+            admission_stats['by_command'][name] = admission_stats['by_command'].get(name, 0) + 1
+            command_log.info(f"🚦 拒絕 {name}（{scope} 額度不足，成本 {cost}，使用者 {user.id}）")
+            return f"🚦 {ADMISSION_SCOPE_LABELS[scope]}請求太頻繁，請 {math.ceil(wait)} 秒後再試"
+    
+    for _, bucket in buckets:
+        bucket.tokens -= min(cost, bucket.capacity)
+    admission_stats['admitted'] += 1
+    return None
+
+def refund(name, user, guild):
+    """退還 admit 扣除的額度（指令本身的權限檢查沒通過時使用）"""
+    cost = command_cost(name)
+    if cost <= 0:
+        return
+    
+    now = time.monotonic()
+    scopes = [('user', user.id)] + ([('guild', guild.id)] if guild is not None else []) + [('global', None)]
+    for scope, key in scopes:
+        bucket = _get_bucket(scope, key)
+        bucket.refill(now)
+        bucket.tokens = min(bucket.capacity, bucket.tokens + min(cost, bucket.capacity))
+    admission_stats['admitted'] -= 1
+
+def format_admission_stats():
+    """系統資訊面板用的准入統計"""
+    rejected_scopes = ", ".join(
+        f"{ADMISSION_SCOPE_LABELS[scope]} {count}" for scope, count in admission_stats['by_scope'].items()
+    ) or "無"
+    top_commands = sorted(admission_stats['by_command'].items(), key=lambda item: item[1], reverse=True)[:3]
+    return (
+        f"放行 {admission_stats['admitted']} | 拒絕 {admission_stats['rejected']}（{rejected_scopes}）\n"
+        f"最常被拒: {', '.join(f'{name} {count}' for name, count in top_commands) or '無'}"
+    )
+
+def build_rate_limits_message(user, guild):
+    """使用者目前剩餘的額度與整體准入統計"""
+    now = time.monotonic()
+    message = "🚦 **請求額度**\n"
+    scopes = [('user', user.id)] + ([('guild', guild.id)] if guild else []) + [('global', None)]
+    for scope, key in scopes:
+        capacity, rate = _admission_limits[scope]
+        bucket = _admission_buckets.get((scope, key))
+        if bucket is not None:
+            bucket.refill(now)
+        tokens = bucket.tokens if bucket is not None else capacity
+        message += f"• {ADMISSION_SCOPE_LABELS[scope]}: {tokens:.1f} / {capacity:.0f}（每分鐘補 {rate * 60:.0f}）\n"
+    
+    costly = sorted(((name, cost) for name, cost in COMMAND_COSTS.items() if cost > 1), key=lambda item: -item[1])
+    message += "\n**高成本指令**: " + ", ".join(f"{name} {cost}" for name, cost in costly) + "\n"
+    message += f"\n📊 {format_admission_stats()}"
+    return message
+
+class RateLimited(commands.CheckFailure):
+    """前綴指令超過額度"""
+
+def admission_check(ctx):
+    """前綴指令扣除額度；由 before_invoke 呼叫，在指令自己的權限檢查與參數解析之後才扣"""
+    rejection = admit(ctx.command.qualified_name, ctx.author, ctx.guild)
+    if rejection:
+        raise RateLimited(rejection)
+
+@bot.event
+async def on_command_error(ctx, error):
+    """額度不足時快速回覆；其他錯誤維持原本只記錄日誌的行為"""
+    if isinstance(error, RateLimited):
+        await ctx.send(str(error))
+        return
+    if isinstance(error, commands.CommandNotFound):
+        return
+    command_log.error(f"❌ 指令 {ctx.command} 錯誤: {error}", exc_info=error)
+
+# ===== 期限傳遞與對沖請求：每個互動都有時間預算，一路傳到 GitHub 請求 =====
+
+# 互動從點擊到回覆結果的總預算（秒）；超過 3 秒未回應的互動會先自動 defer
+INTERACTION_BUDGET = float(os.getenv("INTERACTION_BUDGET", "8"))
+AUTO_DEFER_AFTER = float(os.getenv("AUTO_DEFER_AFTER", "2.0"))
+# 慢請求在超過此百分位延遲後送出第二個相同請求，取先回來的結果
+GITHUB_HEDGE_PERCENTILE = float(os.getenv("GITHUB_HEDGE_PERCENTILE", "95"))
+GITHUB_HEDGE_DEFAULT_DELAY = 1.0
+GITHUB_HEDGE_MIN_DELAY = 0.2
+GITHUB_HEDGE_MIN_SAMPLES = 20
+# 不對沖的端點：Search API 每分鐘只有 30 次，多送一次就多用一次配額（SearchQuota 只扣一次）
+GITHUB_UNHEDGED_ENDPOINTS = {'search/issues'}
+
+request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+request_stats = {
+    'requests': 0,
+    'hedged': 0,
+    'hedge_wins': 0,
+    'timeouts': 0,
+    'deadline_exceeded': 0,
+    'auto_deferred': 0,
+    'degraded': 0,
+    'cache_hits': 0,
+    'cache_misses': 0,
+}
+_request_stats_lock = threading.Lock()
+_endpoint_latencies = {}
+_hedge_executor = None
+
+class DeadlineExceeded(Exception):
+    """互動的時間預算已用完"""
+
+def count_request_stat(name, amount=1):
+    with _request_stats_lock:
+        request_stats[name] += amount
+
+def remaining_budget():
+    """目前互動剩餘的秒數；沒有設定期限時回傳 None"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def record_endpoint_latency(endpoint, seconds):
+    latencies = _endpoint_latencies.get(endpoint)
+    if latencies is None:
+        latencies = _endpoint_latencies.setdefault(endpoint, deque(maxlen=200))
+    latencies.append(seconds)
+
+def get_hedge_delay(endpoint):
+    """依端點的歷史延遲百分位決定何時送出對沖請求"""
+    latencies = _endpoint_latencies.get(endpoint)
+    if not latencies or len(latencies) < GITHUB_HEDGE_MIN_SAMPLES:
+        return GITHUB_HEDGE_DEFAULT_DELAY
+    return max(GITHUB_HEDGE_MIN_DELAY, percentile(latencies, GITHUB_HEDGE_PERCENTILE))
+
+def _get_hedge_executor():
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _github_session_lock:
+            if _hedge_executor is None:
+                _hedge_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=8, thread_name_prefix="github-hedge"
+                )
+    return _hedge_executor
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+def hedged_get(session, endpoint, url, params, timeout, **kwargs):
+    """送出 GET；超過對沖延遲仍未回應時再送一次，採用先完成的回應"""
+    hedge_delay = get_hedge_delay(endpoint)
+    if endpoint in GITHUB_UNHEDGED_ENDPOINTS or isinstance(timeout, tuple) or timeout <= hedge_delay:
+        return session.get(url, params=params, timeout=timeout, **kwargs)
+
+    executor = _get_hedge_executor()
+    primary = executor.submit(session.get, url, params=params, timeout=timeout, **kwargs)
+    done, _ = concurrent.futures.wait([primary], timeout=hedge_delay)
+    if done:
+        return primary.result()
+
+    count_request_stat('hedged')
+    hedge = executor.submit(session.get, url, params=params, timeout=timeout - hedge_delay, **kwargs)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+                continue
+            if future is hedge:
+                count_request_stat('hedge_wins')
+            # 另一個請求回來後直接關閉，歸還連線
+            for other in pending:
+                other.add_done_callback(_close_response)
+            return future.result()
+    raise error
+
+def format_request_stats():
+    """系統資訊面板用的逾時與對沖統計"""
+    with _request_stats_lock:
+        stats = dict(request_stats)
+    return (
+        f"請求 {stats['requests']} | 對沖 {stats['hedged']}（勝出 {stats['hedge_wins']}）\n"
+        f"逾時 {stats['timeouts']} | 超過期限 {stats['deadline_exceeded']}\n"
+        f"自動 defer {stats['auto_deferred']} | 降級回覆 {stats['degraded']}\n"
+        f"快取 {github_cache.describe()} | 命中 {stats['cache_hits']} | 未命中 {stats['cache_misses']}"
+    )
+
+async def call_with_deadline(func, *args, budget=INTERACTION_BUDGET):
+    """在背景執行緒執行查詢，期限會透過 contextvar 傳到每個 GitHub 請求"""
+    token = request_deadline.set(time.monotonic() + budget)
+    try:
+        # to_thread 會複製目前的 context，期限與 trace 都跟著進入執行緒
+        with trace_span(func.__name__):
+            return await asyncio.to_thread(func, *args)
+    finally:
+        request_deadline.reset(token)
+
+async def respond_with_deadline(interaction, func, *args, budget=INTERACTION_BUDGET):
+    """在預算內回覆互動：快的查詢直接回覆，慢的先自動 defer，逾時則降級回覆"""
+    started = time.monotonic()
+    task = asyncio.create_task(call_with_deadline(func, *args, budget=budget))
+
+    if not interaction.response.is_done():
+        try:
+            content = await asyncio.wait_for(asyncio.shield(task), timeout=AUTO_DEFER_AFTER)
+        except asyncio.TimeoutError:
+            await auto_defer(interaction)
+        else:
+            parts = split_message(content)
+            with trace_span("Discord send", parts=len(parts)):
+                await respond(interaction, parts[0])
+                for part in parts[1:]:
+                    await interaction.followup.send(part, ephemeral=True)
+            return
+
+    # GitHub 請求的逾時已被期限截短，這裡只多留一點格式化的時間
+    grace = budget - (time.monotonic() - started) + 2
+    try:
+        content = await asyncio.wait_for(asyncio.shield(task), timeout=max(grace, 0.1))
+    except asyncio.TimeoutError:
+        count_request_stat('degraded')
+        content = f"⏳ 查詢超過 {budget:.0f} 秒仍未完成，GitHub 可能較慢，請稍後再試"
+    await send_followup_chunks(interaction, content)
+
+# ===== 斷路器：GitHub 故障時快速失敗，並提供最後一次成功的結果 =====
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+CIRCUIT_MAX_RESET_TIMEOUT = 300
+STALE_RESULT_LIMIT = 64
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，請求被直接拒絕"""
+    def __init__(self, breaker):
+        self.breaker = breaker
+        super().__init__(
+            f"GitHub {breaker.name} 暫時無法使用（斷路器開啟），約 {breaker.retry_in():.0f} 秒後自動重試"
+        )
+
+class CircuitBreaker:
+    """單一 GitHub 端點的斷路器：closed → open → half_open → closed"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name):
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.reset_timeout = CIRCUIT_RESET_TIMEOUT
+        self.last_error = None
+        self.last_success = None
+        self._last_request = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """closed 時放行；open / half_open 時一律快速失敗，由背景探測負責恢復"""
+        return self.state == self.CLOSED
+
+    def retry_in(self):
+        if self.opened_at is None:
+            return 0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self.opened_at = None
+            self.reset_timeout = CIRCUIT_RESET_TIMEOUT
+            self.last_success = datetime.now()
+
+    def record_failure(self, error, url, params):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            self._last_request = (url, params)
+            if self.state == self.CLOSED and self.failures >= CIRCUIT_FAILURE_THRESHOLD:
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        github_log.warning(f"⛔ GitHub 斷路器開啟: {self.name}（{self.last_error}），{self.reset_timeout:.0f} 秒後探測")
+        timer = threading.Timer(self.reset_timeout, self._probe)
+        timer.daemon = True
+        timer.start()
+
+    def _probe(self):
+        """背景探測：每個端點同時只有一個探測請求"""
+        with self._lock:
+            if self.state != self.OPEN:
+                return
+            self.state = self.HALF_OPEN
+            url, params = self._last_request
+
+        try:
+            # 只看狀態碼：串流模式不讀取內容，日誌壓縮檔之類的大回應不會被整個下載
+            with get_github_session().get(url, params=params, timeout=GITHUB_TIMEOUT, stream=True) as response:
+                healthy = response.status_code < 500 and response.status_code != 429
+                error = f"HTTP {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            healthy = False
+            error = str(e)
+
+        if healthy:
+            github_log.info(f"✅ GitHub 斷路器恢復: {self.name}")
+            self.record_success()
+            return
+
+        with self._lock:
+            self.last_error = error
+            self.reset_timeout = min(self.reset_timeout * 2, CIRCUIT_MAX_RESET_TIMEOUT)
+            self._open()
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+def github_endpoint_key(url):
+    """把網址正規化成端點名稱，例如 actions/runs/{id}/jobs"""
+    path = url.split('?', 1)[0]
+    path = path.replace(f"{GITHUB_API_URL}/repos/{GITHUB_OWNER}/{GITHUB_REPO}/", "")
+    path = path.replace(f"{GITHUB_API_URL}/", "")
+    path = re.sub(r'(?<=workflows/)[^/]+', '{workflow}', path)
+    path = re.sub(r'(?<=commits/)[^/]+', '{ref}', path)
+    return re.sub(r'/\d+(?=/|$)', '/{id}', path)
+
+def get_circuit_breaker(endpoint):
+    breaker = _circuit_breakers.get(endpoint)
+    if breaker is None:
+        with _circuit_breakers_lock:
+            breaker = _circuit_breakers.setdefault(endpoint, CircuitBreaker(endpoint))
+    return breaker
+
+def format_circuit_status():
+    """系統資訊面板用的斷路器狀態摘要"""
+    if not _circuit_breakers:
+        return "尚無 GitHub 請求紀錄"
+
+    state_emoji = {
+        CircuitBreaker.CLOSED: "🟢",
+        CircuitBreaker.OPEN: "🔴",
+        CircuitBreaker.HALF_OPEN: "🟡",
+    }
+    lines = []
+    for name, breaker in sorted(_circuit_breakers.items()):
+        line = f"{state_emoji[breaker.state]} `{name}`"
+        if breaker.state == CircuitBreaker.OPEN:
+            line += f" {breaker.retry_in():.0f} 秒後探測"
+        elif breaker.state == CircuitBreaker.HALF_OPEN:
+            line += " 探測中"
+        lines.append(line)
+    return "\n".join(lines)[:1024]
+
+# 記錄目前執行緒的查詢是否遇到上游故障（查詢函式會把例外轉成錯誤字串）
+_upstream_state = threading.local()
+# 每個查詢最後一次成功的結果：key -> (結果, 取得時間)
+_last_good_results = OrderedDict()
+_last_good_lock = threading.Lock()
+
+def _mark_upstream_failure():
+    _upstream_state.failed = True
+
+def serve_stale_on_outage(func):
+    """GitHub 故障時改回傳最後一次成功的結果，並標示資料時間"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # 關鍵字參數轉成字串放進鍵裡，暖啟動快照存成 JSON 後還原的鍵仍然相同
+        key = (func.__name__,) + args + tuple(f"{name}={value!r}" for name, value in sorted(kwargs.items()))
+        outer_failed = getattr(_upstream_state, 'failed', False)
+        _upstream_state.failed = False
+        try:
+            result = func(*args, **kwargs)
+            failed = _upstream_state.failed
+        finally:
+            _upstream_state.failed = outer_failed or _upstream_state.failed
+
+        if not failed:
+            if not result.startswith("❌"):
+                with _last_good_lock:
+                    _last_good_results[key] = (result, datetime.now())
+                    _last_good_results.move_to_end(key)
+                    while len(_last_good_results) > STALE_RESULT_LIMIT:
+                        _last_good_results.popitem(last=False)
+            return result
+
+        with _last_good_lock:
+            cached = _last_good_results.get(key)
+        if cached is None:
+            return result
+
+        value, fetched_at = cached
+        return (
+            f"⚠️ **過時資料**（截至 {fetched_at.strftime('%m/%d %H:%M:%S')}，"
+            f"GitHub 暫時無法連線，背景正在檢查恢復）\n{value}"
+        )
+    return wrapper
+
+# ===== 精簡資料紀錄：GitHub 回應只解碼一次，只保留需要的欄位，不留下整個 JSON =====
+# 時間在解碼時就轉成 datetime，重複出現的短字串（狀態、分支、作者）以 sys.intern 共用
+
+# 有安裝 orjson 時用它解碼（直接解析位元組，比標準 json 快），否則退回標準 json
+orjson = lazy_import("orjson") if importlib.util.find_spec("orjson") else None
+
+def decode_json(response):
+    """解碼 GitHub 回應的 JSON 內容"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return json.loads(response.content)
+
+def intern_text(value):
+    return sys.intern(value) if value is not None else None
+
+def parse_github_time(value):
+    """GitHub 的 ISO 8601 時間（結尾 Z）轉成帶時區的 datetime"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+class WorkflowRun:
+    """workflow run 的精簡紀錄"""
+    __slots__ = ('id', 'workflow_id', 'name', 'status', 'conclusion', 'created_at',
+                 'updated_at', 'run_number', 'head_branch', 'path', 'html_url')
+
+    def __init__(self, id, workflow_id, name, status, conclusion, created_at,
+                 updated_at, run_number, head_branch, path, html_url):
+        self.id = id
+        self.workflow_id = workflow_id
+        self.name = name
+        self.status = status
+        self.conclusion = conclusion
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.run_number = run_number
+        self.head_branch = head_branch
+        self.path = path
+        self.html_url = html_url
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            data['id'], data.get('workflow_id'), intern_text(data['name']), intern_text(data['status']),
+            intern_text(data['conclusion']), parse_github_time(data['created_at']),
+            parse_github_time(data.get('updated_at')), data['run_number'],
+            intern_text(data['head_branch']), intern_text(data.get('path') or ''), data['html_url'],
+        )
+
+class Commit:
+    """commit 的精簡紀錄（以 SHA 識別，內容永遠不變）"""
+    __slots__ = ('sha', 'message', 'author_name', 'author_login', 'author_date', 'parents')
+
+    def __init__(self, sha, message, author_name, author_login, author_date, parents=()):
+        self.sha = sha
+        self.message = message
+        self.author_name = author_name
+        self.author_login = author_login
+        self.author_date = author_date
+        self.parents = tuple(parents)
+
+    @classmethod
+    def from_json(cls, data):
+        author = data['commit']['author']
+        return cls(
+            data['sha'], data['commit']['message'], intern_text(author['name']),
+            intern_text(data['author']['login']) if data.get('author') else None,
+            parse_github_time(author['date']),
+            (parent['sha'] for parent in data.get('parents', ())),
+        )
+
+    def to_row(self):
+        """磁碟快取用的精簡格式"""
+        return [self.sha, self.message, self.author_name, self.author_login,
+                self.author_date.isoformat(), list(self.parents)]
+
+    @classmethod
+    def from_row(cls, row):
+        sha, message, author_name, author_login, author_date, parents = row
+        return cls(sha, message, intern_text(author_name), intern_text(author_login),
+                   datetime.fromisoformat(author_date), parents)
+
+class MergedPR:
+    """已合併 PR 的精簡紀錄"""
+    __slots__ = ('number', 'title', 'html_url', 'author', 'merged_at', 'labels')
+
+    def __init__(self, number, title, html_url, author, merged_at, labels=()):
+        self.number = number
+        self.title = title
+        self.html_url = html_url
+        self.author = author
+        self.merged_at = merged_at
+        self.labels = labels
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            data['number'], data['title'], data['html_url'], intern_text(data['user']['login']),
+            parse_github_time(data['pull_request']['merged_at']),
+            tuple(sys.intern(label['name']) for label in data.get('labels', ())),
+        )
+
+    @classmethod
+    def from_pull(cls, data):
+        """從 pulls API 的項目建立（合併時間在最外層，而不是 pull_request 底下）"""
+        return cls(
+            data['number'], data['title'], data['html_url'], intern_text(data['user']['login']),
+            parse_github_time(data['merged_at']),
+            tuple(sys.intern(label['name']) for label in data.get('labels', ())),
+        )
+
+def benchmark_records(count=3000):
+    """量測解碼吞吐量與每筆紀錄的記憶體（模擬 GitHub 回應，含用不到的巢狀欄位）"""
+    import random
+    rng = random.Random(0)
+    repository = {f"field_{i}": f"https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/{i}" for i in range(60)}
+    user = {'login': 'octocat', 'id': 1, 'type': 'User', 'site_admin': False,
+            **{f"{key}_url": f"https://api.github.com/users/octocat/{key}" for key in ('events', 'repos', 'orgs', 'gists')}}
+    
+    def run_item(i):
+        return {
+            'id': 9000000 + i, 'workflow_id': rng.choice((11, 12, 13)), 'name': rng.choice(("CI", "Deploy", "Lint")),
+            'status': 'completed', 'conclusion': rng.choice(('success', 'failure')),
+            'created_at': f"2025-01-{1 + i % 28:02d}T10:{i % 60:02d}:00Z",
+            'updated_at': f"2025-01-{1 + i % 28:02d}T10:{i % 60:02d}:30Z",
+            'run_number': i, 'head_branch': rng.choice(('main', 'dev')), 'path': '.github/workflows/ci.yml',
+            'html_url': f"https://github.com/{GITHUB_OWNER}/{GITHUB_REPO}/actions/runs/{9000000 + i}",
+            'head_commit': {'id': f"{i:040x}", 'message': "Fix things\n\nbody", 'author': {'name': 'Octo', 'email': 'o@x'}},
+            'actor': user, 'triggering_actor': user, 'repository': repository, 'head_repository': repository,
+        }
+    
+    def commit_item(i):
+        return {
+            'sha': f"{i:040x}", 'commit': {'message': f"Commit {i}\n\nbody", 'author': {'name': 'Octo', 'date': "2025-01-01T10:00:00Z"},
+                                         'committer': {'name': 'GitHub', 'date': "2025-01-01T10:00:00Z"}},
+            'author': user, 'committer': user, 'parents': [{'sha': f"{i - 1:040x}", 'url': 'x'}],
+            'html_url': f"https://github.com/{GITHUB_OWNER}/{GITHUB_REPO}/commit/{i:040x}",
+        }
+    
+    def pr_item(i):
+        return {
+            'number': i, 'title': f"Improve feature {i}", 'html_url': f"https://github.com/{GITHUB_OWNER}/{GITHUB_REPO}/pull/{i}",
+            'user': user, 'labels': [{'name': 'enhancement', 'color': 'a2eeef'}], 'body': "Description " * 20,
+            'pull_request': {'merged_at': "2025-01-01T10:00:00Z", 'url': 'x', 'html_url': 'x', 'diff_url': 'x'},
+            'repository_url': repository['field_0'],
+        }
+    
+    print(f"🧪 紀錄層基準測試: 每種 {count} 筆，JSON 解碼器: {'orjson' if orjson is not None else 'json'}")
+    for label, cls, make in (("WorkflowRun", WorkflowRun, run_item), ("Commit", Commit, commit_item), ("MergedPR", MergedPR, pr_item)):
+        payload = json.dumps([make(i) for i in range(count)]).encode('utf-8')
+        
+        started = time.perf_counter()
+        items = json.loads(payload)
+        json_elapsed = time.perf_counter() - started
+        fast_elapsed = None
+        if orjson is not None:
+            started = time.perf_counter()
+            items = orjson.loads(payload)
+            fast_elapsed = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        records = [cls.from_json(item) for item in items]
+        record_elapsed = time.perf_counter() - started
+        del records
+        
+        # 分別量測原始 dict 與精簡紀錄佔用的記憶體
+        tracemalloc.start()
+        items = json.loads(payload)
+        raw_bytes = tracemalloc.get_traced_memory()[0]
+        records = [cls.from_json(item) for item in items]
+        del items
+        record_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del records
+        
+        print(f"  {label}（回應 {len(payload) / count / 1024:.1f} KB/筆）")
+        print(f"    解碼: json {count / json_elapsed:,.0f} 筆/秒"
+              + (f"，orjson {count / fast_elapsed:,.0f} 筆/秒" if fast_elapsed else ""))
+        print(f"    轉成紀錄（含時間解析與 intern）: {count / record_elapsed:,.0f} 筆/秒")
+        print(f"    記憶體: 原始 dict {raw_bytes / count:,.0f} B/筆 → 紀錄 {record_bytes / count:,.0f} B/筆")
+
+# 保留您現有的所有函數（從這裡開始都是您原有的程式碼）
+
+@serve_stale_on_outage
+def get_latest_build_status():
+    """獲取最近一次的建置狀態"""
+    try:
+        if not GH_TOKEN:
+            return "❌ GitHub Token 未設定，請檢查 .env 檔案"
+        
+        url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/runs'
+        
+        github_log.debug("🌐 請求 GitHub API: %s", url)
+        
+        # 發送請求
+        response = github_get(url)
+        response.raise_for_status()  # 如果失敗會拋出異常
+        
+        data = decode_json(response)
+        
+        if not data['workflow_runs']:
+            return "📭 尚未有任何建置記錄"
+        
+        # 解析最新一筆執行（只保留精簡紀錄，原始 JSON 立即釋放）
+        latest_run = WorkflowRun.from_json(data['workflow_runs'][0])
+        del data
+        
+        status = latest_run.conclusion  # success, failure, cancelled
+        created_at = latest_run.created_at
+        html_url = latest_run.html_url
+        workflow_name = latest_run.name
+        
+        # 轉換為中文狀態
+        status_map = {
+            'success': '✅ 成功',
+            'failure': '❌ 失敗', 
+            'cancelled': '⏹️ 已取消',
+            None: '🔄 執行中'
+        }
+        
+        status_text = status_map.get(status, '❓ 未知狀態')
+        
+        # 格式化時間
+        formatted_time = created_at.strftime("%Y-%m-%d %H:%M:%S")
+        
+        return (f"📊 **最近一次建置狀態**\n"
+                f"**工作流程**: {workflow_name}\n"
+                f"**狀態**: {status_text}\n"
+                f"**時間**: {formatted_time}\n"
+                f"**詳細資訊**: [查看詳情]({html_url})"
+                + ("\n💡 使用 `!why_failed` 查看失敗原因" if status == 'failure' else ""))
+                
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 404:
+            return "❌ 找不到倉庫，請檢查 GITHUB_OWNER 和 GITHUB_REPO 設定"
+        elif e.response.status_code == 403:
+            return "❌ 權限不足，請檢查 GitHub Token 權限"
+        else:
+            return f"❌ HTTP 錯誤: {e.response.status_code}"
+    except Exception as e:
+        return f"❌ 獲取狀態時出錯: {str(e)}"
+        
+@serve_stale_on_outage
+def get_latest_commit():
+    """獲取最近一次的 commit 資訊"""
+    try:
+        if not GH_TOKEN:
+            return "❌ GitHub Token 未設定"
+        
+        url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/commits'
+        params = {'per_page': 1}
+        
+        github_log.debug("🌐 請求 GitHub Commits API: %s", url)
+        
+        response = github_get(url, params=params)
+        response.raise_for_status()
+        
+        commits = decode_json(response)
+        
+        if not commits:
+            return "📭 尚未有任何 commit 記錄"
+        
+        commit = Commit.from_json(commits[0])
+        del commits
+        # 分支最新的 commit 會變，每次都要查；但 commit 本身不會變，順便放進快取
+        commit_store.put(commit)
+        return format_commit_message(commit)
+        
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 404:
+            return "❌ 找不到倉庫"
+        elif e.response.status_code == 403:
+            return "❌ 權限不足"
+        else:
+            return f"❌ HTTP 錯誤: {e.response.status_code}"
+    except Exception as e:
+        return f"❌ 獲取 commit 資訊時出錯: {str(e)}"
+
+@traced("format commit")
+def format_commit_message(commit):
+    """格式化 commit 訊息"""
+    # 取得基本資訊
+    sha_short = commit.sha[:7]
+    message = commit.message
+    author_name = commit.author_name
+    commit_date = commit.author_date
+    
+    # 取得 GitHub 使用者名稱（安全處理）
+    github_username = commit.author_login or author_name
+    
+    # 處理 commit 訊息
+    first_line = message.split('\n')[0]
+    if len(first_line) > 100:
+        first_line = first_line[:97] + "..."
+    
+    # 格式化時間
+    formatted_time = commit_date.strftime("%m/%d %H:%M")
+    
+    # 建立 GitHub 連結
+    commit_url = f"https://github.com/{GITHUB_OWNER}/{GITHUB_REPO}/commit/{commit.sha}"
+    
+    return (f"📝 **最近一次 Commit**\n"
+            f"**訊息**: {first_line}\n"
+            f"**作者**: {author_name} (@{github_username})\n"
+            f"**時間**: {formatted_time}\n"
+            f"**Commit ID**: `{sha_short}`\n"
+            f"**詳細資訊**: [查看 commit]({commit_url})")
+
+@serve_stale_on_outage
+def get_workflow_status(workflow_file=None):
+    """獲取 GitHub Actions workflow 狀態"""
+    try:
+        if not GH_TOKEN:
+            return "❌ GitHub Token 未設定，請檢查 .env 檔案"
+        
+        # 構建 API URL
+        if workflow_file:
+            # 先獲取 workflow ID
+            workflow_id = get_workflow_id_by_name(workflow_file)
+            if workflow_id:
+                url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/workflows/{workflow_id}/runs'
+            else:
+                # 直接使用檔案名稱嘗試
+                url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/workflows/{workflow_file}/runs'
+        else:
+            # 獲取所有 workflow 的運行記錄
+            url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/runs'
+        
+        params = {'per_page': 5}
+        
+        github_log.debug("🌐 請求 GitHub Actions API: %s", url)
+        
+        response = github_get(url, params=params)
+        response.raise_for_status()
+        
+        data = decode_json(response)
+        
+        if not data.get('workflow_runs'):
+            return "📭 尚未有任何 workflow 運行記錄"
+        
+        runs = [WorkflowRun.from_json(run) for run in data['workflow_runs']]
+        del data
+        return format_workflow_runs(runs, workflow_file)
+        
+    except requests.exceptions.HTTPError as e:
+        error_msg = f"❌ GitHub API 錯誤: {e.response.status_code}"
+        if e.response.status_code == 404:
+            error_msg += " - 找不到倉庫或 workflow"
+            error_msg += f"\n💡 請使用 `!workflow_list` 查看正確的 workflow 檔案名稱"
+        elif e.response.status_code == 403:
+            error_msg += " - 權限不足，請檢查 token 權限"
+        return error_msg
+    except Exception as e:
+        return f"❌ 獲取 workflow 狀態時出錯: {str(e)}"
+
+def get_workflow_id_by_name(workflow_name):
+    """根據顯示名稱獲取 workflow ID"""
+    try:
+        url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/workflows'
+        response = github_get(url)
+        response.raise_for_status()
+        
+        data = decode_json(response)
+        
+        for workflow in data.get('workflows', []):
+            if workflow['name'].lower() == workflow_name.lower():
+                return workflow['id']
+        
+        return None
+    except:
+        return None
+
+@traced("format workflow runs")
+def format_workflow_runs(workflow_runs, workflow_filter=None):
+    """格式化 workflow 運行資訊"""
+    if not workflow_runs:
+        return "📭 沒有找到 workflow 運行記錄"
+    
     message = "🚀 **GitHub Actions Pipeline 狀態**\n\n"
     
     for i, run in enumerate(workflow_runs[:3]):
         status_emoji = {
-            'completed': '✅' if run['conclusion'] == 'success' else '❌',
+            'completed': '✅' if run.conclusion == 'success' else '❌',
             'in_progress': '🔄',
             'queued': '⏳',
             'pending': '⏳',
@@ -826,198 +3118,2181 @@ def format_workflow_runs(workflow_runs, workflow_filter=None):
             None: '進行中'
         }
         
-        emoji = status_emoji.get(run['status'], '❓')
-        conclusion = conclusion_map.get(run['conclusion'], '未知')
+        emoji = status_emoji.get(run.status, '❓')
+        conclusion = conclusion_map.get(run.conclusion, '未知')
         
-        created_at = datetime.fromisoformat(run['created_at'].replace('Z', '+00:00'))
-        formatted_time = created_at.strftime("%m/%d %H:%M")
+        formatted_time = run.created_at.strftime("%m/%d %H:%M")
         
         run_duration = ""
-        if run['status'] == 'completed' and run['updated_at']:
-            updated_at = datetime.fromisoformat(run['updated_at'].replace('Z', '+00:00'))
-            duration = updated_at - created_at
+        if run.status == 'completed' and run.updated_at:
+            duration = run.updated_at - run.created_at
             run_duration = f"⏱️ {duration.total_seconds():.0f}秒"
         
         message += (
-            f"{emoji} **{run['name']}**\n"
+            f"{emoji} **{run.name}**\n"
             f"   📋 狀態: {conclusion}\n"
             f"   🕒 時間: {formatted_time}\n"
-            f"   🔢 運行ID: #{run['run_number']}\n"
-            f"   🎯 分支: {run['head_branch']}\n"
-            f"   📁 檔案: `{run['path'].split('/')[-1]}`\n"
+            f"   🔢 運行ID: #{run.run_number}\n"
+            f"   🎯 分支: {run.head_branch}\n"
+            f"   📁 檔案: `{run.path.split('/')[-1]}`\n"
             f"   {run_duration}\n"
-            f"   🔗 [查看詳情]({run['html_url']})\n\n"
+            f"   🔗 [查看詳情]({run.html_url})\n\n"
+        )
+    
+    return message
+
+@serve_stale_on_outage
+def get_workflow_list():
+    """獲取可用的 workflow 列表"""
+    try:
+        if not GH_TOKEN:
+            return "❌ GitHub Token 未設定"
+        
+        url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/workflows'
+        
+        response = github_get(url)
+        response.raise_for_status()
+        
+        data = decode_json(response)
+        
+        if not data.get('workflows'):
+            return "📭 尚未設定任何 workflow"
+        
+        message = "📋 **可用的 Workflows**\n\n"
+        message += "💡 **使用方式**: `!pipeline_status <檔案名稱>`，或 `!pipeline_status all` 查看全部\n\n"
+        
+        for workflow in data['workflows']:
+            state_emoji = '✅' if workflow['state'] == 'active' else '⏸️'
+            file_name = workflow['path'].split('/')[-1]
+            message += f"{state_emoji} **{workflow['name']}**\n"
+            message += f"   📁 檔案: `{file_name}`\n"
+            message += f"   📊 狀態: {workflow['state']}\n\n"
+        
+        return message
+        
+    except Exception as e:
+        return f"❌ 獲取 workflow 列表時出錯: {str(e)}"
+       
+
+# ===== Commit 範圍：以 SHA 為鍵的不可變快取（記憶體 LRU + 磁碟），只抓沒看過的 commit =====
+
+COMMIT_CACHE_SIZE = int(os.getenv("COMMIT_CACHE_SIZE", "2000"))
+# 設為空字串則只用記憶體
+COMMIT_CACHE_DIR = os.getenv("COMMIT_CACHE_DIR", ".commit_cache")
+# 一次範圍查詢最多走訪幾個 commit
+COMMIT_RANGE_MAX = 200
+COMMIT_RANGE_SHOWN = 30
+FULL_SHA_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+SHORT_SHA_PATTERN = re.compile(r'^[0-9a-f]{7,39}$')
+
+class CommitStore:
+    """commit 以 SHA 定址，永遠不需要重新驗證
+
+    記憶體只保留最近用到的 COMMIT_CACHE_SIZE 筆；每筆同時寫到磁碟，
+    被擠出記憶體或重啟後從磁碟讀回。to_thread 的執行緒會同時存取，以鎖保護
+    """
+
+    def __init__(self, max_size, directory):
+        self.max_size = max_size
+        self.directory = directory
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def _path(self, sha):
+        return os.path.join(self.directory, sha[:2], f"{sha}.json")
+
+    def _remember(self, commit):
+        with self._lock:
+            self._memory[commit.sha] = commit
+            self._memory.move_to_end(commit.sha)
+            if len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def get(self, sha):
+        with self._lock:
+            commit = self._memory.get(sha)
+            if commit is not None:
+                self._memory.move_to_end(sha)
+                self.stats['memory_hits'] += 1
+                return commit
+        
+        if self.directory:
+            try:
+                with open(self._path(sha), encoding='utf-8') as f:
+                    commit = Commit.from_row(json.load(f))
+            except (OSError, ValueError, TypeError):
+                commit = None
+            if commit is not None:
+                self.stats['disk_hits'] += 1
+                self._remember(commit)
+                return commit
+        
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, commit):
+        with self._lock:
+            known = commit.sha in self._memory
+        self._remember(commit)
+        if known or not self.directory:
+            return
+        path = self._path(commit.sha)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(commit.to_row(), f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError as e:
+            github_log.warning(f"⚠️ 無法寫入 commit 快取: {e}")
+
+    def find_prefix(self, prefix):
+        """以縮寫 SHA 在快取中找完整 SHA；找不到或不唯一時回傳 None"""
+        with self._lock:
+            matches = {sha for sha in self._memory if sha.startswith(prefix)}
+        if self.directory:
+            try:
+                matches.update(
+                    name[:-len('.json')] for name in os.listdir(os.path.join(self.directory, prefix[:2]))
+                    if name.startswith(prefix) and name.endswith('.json')
+                )
+            except OSError:
+                pass
+        return matches.pop() if len(matches) == 1 else None
+
+commit_store = CommitStore(COMMIT_CACHE_SIZE, COMMIT_CACHE_DIR)
+
+def resolve_commit_ref(ref, counters):
+    """把分支、標籤或縮寫 SHA 轉成完整 SHA；完整 SHA 與快取中的縮寫不需要請求"""
+    ref = ref.strip()
+    lowered = ref.lower()
+    if FULL_SHA_PATTERN.match(lowered):
+        return lowered
+    if SHORT_SHA_PATTERN.match(lowered):
+        sha = commit_store.find_prefix(lowered)
+        if sha:
+            return sha
+    
+    # 分支與標籤會移動，一定要問 GitHub；只要 SHA 不要整個 commit
+    # ref 是使用者輸入，整段編碼成單一路徑片段，? # ../ 不能改變請求的網址
+    counters['requests'] += 1
+    response = github_get(
+        f'/repos/{GITHUB_OWNER}/{GITHUB_REPO}/commits/{urllib.parse.quote(ref, safe="")}',
+        headers={'Accept': 'application/vnd.github.sha'},
+    )
+    response.raise_for_status()
+    # 回傳值會當作快取的檔名，只接受完整的 SHA
+    sha = response.text.strip().lower()
+    if not FULL_SHA_PATTERN.match(sha):
+        raise ValueError(f"`{ref}` 沒有解析成有效的 commit SHA")
+    return sha
+
+def fetch_commit_history(sha, limit, counters):
+    """從 sha 開始抓一頁歷史，全部放進快取（list API 一次最多 100 筆）"""
+    counters['requests'] += 1
+    response = github_get(
+        f'/repos/{GITHUB_OWNER}/{GITHUB_REPO}/commits',
+        params={'sha': sha, 'per_page': max(1, min(limit, 100))},
+    )
+    response.raise_for_status()
+    for item in decode_json(response):
+        commit_store.put(Commit.from_json(item))
+        counters['fetched'] += 1
+
+def walk_commit_range(base_sha, head_sha, counters):
+    """從 head 沿第一個父 commit 往回走，直到 base（不含）或達到上限
+
+    回傳 (commits 由新到舊, 是否找到 base)
+    """
+    commits = []
+    sha = head_sha
+    while sha and sha != base_sha and len(commits) < COMMIT_RANGE_MAX:
+        commit = commit_store.get(sha)
+        if commit is None:
+            fetch_commit_history(sha, COMMIT_RANGE_MAX - len(commits), counters)
+            commit = commit_store.get(sha)
+            if commit is None:
+                raise LookupError(f"找不到 commit {sha[:7]}")
+        else:
+            counters['cached'] += 1
+        commits.append(commit)
+        sha = commit.parents[0] if commit.parents else None
+    return commits, sha == base_sha
+
+@traced("format commit range")
+def format_commit_range(base_ref, head_ref, commits, reached_base, counters):
+    """範圍摘要：每個 commit 一行，最後附上快取命中情況"""
+    message = f"📜 **Commits `{base_ref}..{head_ref}`**（{len(commits)} 個，沿第一個父 commit）\n\n"
+    for commit in commits[:COMMIT_RANGE_SHOWN]:
+        first_line = commit.message.split('\n')[0]
+        if len(first_line) > 72:
+            first_line = first_line[:69] + "..."
+        date = commit.author_date.strftime("%m/%d")
+        commit_url = f"https://github.com/{GITHUB_OWNER}/{GITHUB_REPO}/commit/{commit.sha}"
+        message += f"[`{commit.sha[:7]}`]({commit_url}) {first_line} — {commit.author_login or commit.author_name} · {date}\n"
+    if len(commits) > COMMIT_RANGE_SHOWN:
+        message += f"…另外 {len(commits) - COMMIT_RANGE_SHOWN} 個 commit\n"
+    if not reached_base:
+        message += f"\n⚠️ 走訪 {COMMIT_RANGE_MAX} 個 commit 內沒有遇到 `{base_ref}`，可能不在同一條歷史上\n"
+    message += (
+        f"\n📦 快取命中 {counters['cached']} 個，GitHub 請求 {counters['requests']} 次"
+        f"（新取得 {counters['fetched']} 個 commit）"
+    )
+    return message
+
+def get_commit_range(range_spec):
+    """`!commits from..to`：兩個 commit 之間的提交摘要"""
+    base_ref, separator, head_ref = range_spec.partition('..')
+    if not separator or not base_ref or not head_ref:
+        return "❌ 格式錯誤，請使用 `!commits <起點>..<終點>`，例如 `!commits v1.0..main`"
+    
+    try:
+        if not GH_TOKEN:
+            return "❌ GitHub Token 未設定"
+        
+        counters = {'requests': 0, 'cached': 0, 'fetched': 0}
+        base_sha = resolve_commit_ref(base_ref, counters)
+        head_sha = resolve_commit_ref(head_ref, counters)
+        commits, reached_base = walk_commit_range(base_sha, head_sha, counters)
+        if not commits:
+            return f"📭 `{base_ref}..{head_ref}` 之間沒有 commit"
+        return format_commit_range(base_ref, head_ref, commits, reached_base, counters)
+    
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code in (404, 422):
+            return "❌ 找不到指定的分支、標籤或 commit"
+        return f"❌ GitHub API 錯誤: {e.response.status_code}"
+    except Exception as e:
+        return f"❌ 查詢 commit 範圍時出錯: {str(e)}"
+
+# ===== Workflow 狀態矩陣：一頁 run 在記憶體中依 workflow 與分支分組 =====
+
+MATRIX_PAGE_SIZE = 100
+# 不在那一頁裡的 workflow 最多補查幾個，每個補查取幾筆 run
+MATRIX_MAX_FOLLOWUPS = 10
+MATRIX_FOLLOWUP_PAGE_SIZE = 20
+# 每個 workflow 最多顯示幾個分支（依最新 run 排序）
+MATRIX_MAX_BRANCHES = 5
+
+def group_runs_by_workflow_branch(runs, matrix=None):
+    """單次走訪，保留每個 (workflow_id, 分支) 的最新 run；API 由新到舊排序，先看到的就是最新的"""
+    matrix = {} if matrix is None else matrix
+    for run in runs:
+        matrix.setdefault(run.workflow_id, {}).setdefault(run.head_branch, run)
+    return matrix
+
+def collect_workflow_matrix():
+    """回傳 (workflows, matrix, 補查的 workflow 數, 未補查的 workflow 名稱)
+
+    1 次請求取得 workflow 清單、1 次取得最近 MATRIX_PAGE_SIZE 筆 run，
+    只對沒出現在這一頁的 workflow 個別補查
+    """
+    response = github_get(f'/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/workflows', params={'per_page': 100})
+    response.raise_for_status()
+    workflows = [
+        (workflow['id'], workflow['name'], workflow['path'].split('/')[-1])
+        for workflow in decode_json(response).get('workflows', [])
+        if workflow['state'] == 'active'
+    ]
+    
+    response = github_get(
+        f'/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/runs', params={'per_page': MATRIX_PAGE_SIZE}
+    )
+    response.raise_for_status()
+    matrix = group_runs_by_workflow_branch(
+        WorkflowRun.from_json(item) for item in decode_json(response).get('workflow_runs', [])
+    )
+    
+    missing = [workflow for workflow in workflows if workflow[0] not in matrix]
+    for workflow_id, _, _ in missing[:MATRIX_MAX_FOLLOWUPS]:
+        response = github_get(
+            f'/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/workflows/{workflow_id}/runs',
+            params={'per_page': MATRIX_FOLLOWUP_PAGE_SIZE},
+        )
+        response.raise_for_status()
+        group_runs_by_workflow_branch(
+            (WorkflowRun.from_json(item) for item in decode_json(response).get('workflow_runs', [])), matrix
         )
     
-    return message
+    skipped = [name for _, name, _ in missing[MATRIX_MAX_FOLLOWUPS:]]
+    return workflows, matrix, min(len(missing), MATRIX_MAX_FOLLOWUPS), skipped
+
+@traced("format workflow matrix")
+def format_workflow_matrix(workflows, matrix, followups, skipped):
+    """每個 workflow 一段，列出各分支的最新 run"""
+    run_emoji = {'success': '✅', 'failure': '❌', 'cancelled': '⏹️', 'skipped': '⏭️', 'timed_out': '⌛'}
+    
+    message = "🧮 **Workflow 狀態矩陣**\n"
+    message += f"取得最近 {MATRIX_PAGE_SIZE} 筆 run，另外補查 {followups} 個 workflow\n\n"
+    
+    for workflow_id, name, file_name in workflows:
+        branches = matrix.get(workflow_id)
+        message += f"**{name}** (`{file_name}`)\n"
+        if not branches:
+            message += "   📭 沒有任何運行記錄\n\n" if name not in skipped else "   ❔ 未補查\n\n"
+            continue
+        
+        latest = sorted(branches.values(), key=lambda run: run.created_at, reverse=True)
+        for run in latest[:MATRIX_MAX_BRANCHES]:
+            emoji = run_emoji.get(run.conclusion, '❓') if run.status == 'completed' else '🔄'
+            created = run.created_at.strftime("%m/%d %H:%M")
+            message += f"   {emoji} `{run.head_branch}` #{run.run_number} · {created} · [詳情]({run.html_url})\n"
+        if len(latest) > MATRIX_MAX_BRANCHES:
+            message += f"   …另外 {len(latest) - MATRIX_MAX_BRANCHES} 個分支\n"
+        message += "\n"
+    
+    if skipped:
+        message += f"⚠️ 另有 {len(skipped)} 個 workflow 未補查，請用 `!pipeline_status <檔案名稱>` 個別查詢\n"
+    return message
+
+@serve_stale_on_outage
+def get_workflow_matrix():
+    """`!pipeline_status all`：所有 workflow 在各分支的最新 run"""
+    try:
+        if not GH_TOKEN:
+            return "❌ GitHub Token 未設定，請檢查 .env 檔案"
+        
+        workflows, matrix, followups, skipped = collect_workflow_matrix()
+        if not workflows:
+            return "📭 尚未設定任何 workflow"
+        return format_workflow_matrix(workflows, matrix, followups, skipped)
+    
+    except requests.exceptions.HTTPError as e:
+        return f"❌ GitHub API 錯誤: {e.response.status_code}"
+    except Exception as e:
+        return f"❌ 獲取 workflow 狀態矩陣時出錯: {str(e)}"
+
+# ===== 失敗日誌擷取（串流解析 zip 日誌，不落地、不整包載入記憶體） =====
+
+# 日誌行前綴的時間戳，例如 "2024-01-01T00:00:00.1234567Z "
+LOG_TIMESTAMP_RE = re.compile(r'^\ufeff?\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?Z ?')
+# 錯誤行判斷（預先編譯，逐行比對）
+LOG_ERROR_RE = re.compile(
+    r'##\[error\]'
+    r'|Traceback \(most recent call last\)'
+    r'|\b(?:Error|ERROR|FAILED|FAILURE|Exception)\b[:!]?'
+    r'|\berror(?:\[\w+\])?:'
+    r'|exit code [1-9]\d*'
+)
+# 找出錯誤後要保留的上下文行數
+LOG_CONTEXT_BEFORE = 3
+LOG_CONTEXT_AFTER = 6
+LOG_MAX_BLOCKS = 3
+# 單行最多保留的字元數，超過就截斷（避免超長行吃光記憶體）
+LOG_MAX_LINE_CHARS = 300
+# 每次解壓縮的輸出上限，壓縮比再高也不會一次展開太多
+LOG_DECOMPRESS_CHUNK = 256 * 1024
+LOG_DOWNLOAD_CHUNK = 64 * 1024
+# 日誌下載比一般查詢慢得多，給較長的預算
+LOG_SCAN_BUDGET = 120
+
+class _ChunkReader:
+    """把 HTTP 串流的 chunk 包裝成可以精確讀取位元組的讀取器"""
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+        self.bytes_read = 0
+
+    def _fill(self):
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer += chunk
+                self.bytes_read += len(chunk)
+                return True
+        return False
+
+    def read_exact(self, size):
+        while len(self._buffer) < size:
+            if not self._fill():
+                raise EOFError("zip 串流提前結束")
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def read_some(self, limit):
+        """讀取最多 limit 位元組（至少 1 位元組）"""
+        if not self._buffer and not self._fill():
+            raise EOFError("zip 串流提前結束")
+        data, self._buffer = self._buffer[:limit], self._buffer[limit:]
+        return data
+
+    def unread(self, data):
+        if data:
+            self._buffer = data + self._buffer
+
+    def iter_exact(self, size):
+        """依序產出剛好 size 位元組的資料片段"""
+        remaining = size
+        while remaining > 0:
+            data = self.read_some(min(remaining, LOG_DOWNLOAD_CHUNK))
+            remaining -= len(data)
+            yield data
+
+class _LogExcerptCollector:
+    """逐行掃描日誌，保留前幾個錯誤區塊與上下文"""
+    def __init__(self, max_blocks=LOG_MAX_BLOCKS):
+        self.max_blocks = max_blocks
+        self.blocks = []
+        self.lines_scanned = 0
+        self._seen = set()
+        self._before = deque(maxlen=LOG_CONTEXT_BEFORE)
+        self._current = None
+        self._after_left = 0
+        self._entry = None
+
+    @property
+    def done(self):
+        return len(self.blocks) >= self.max_blocks and self._current is None
+
+    def start_entry(self, name):
+        self._close_block()
+        self._before.clear()
+        self._entry = name
+
+    def feed_line(self, raw_line):
+        self.lines_scanned += 1
+        line = LOG_TIMESTAMP_RE.sub('', raw_line.rstrip('\r'), count=1)
+        if len(line) > LOG_MAX_LINE_CHARS:
+            line = line[:LOG_MAX_LINE_CHARS - 3] + "..."
+        is_error = LOG_ERROR_RE.search(line) is not None
+
+        if self._current is not None:
+            self._current['lines'].append(line)
+            if is_error:
+                self._after_left = LOG_CONTEXT_AFTER
+            else:
+                self._after_left -= 1
+            if self._after_left <= 0:
+                self._close_block()
+            return
+
+        if is_error and len(self.blocks) < self.max_blocks:
+            key = line.strip()
+            if key not in self._seen:
+                self._seen.add(key)
+                self._current = {'entry': self._entry, 'lines': list(self._before) + [line]}
+                self._after_left = LOG_CONTEXT_AFTER
+                self._before.clear()
+                return
+
+        self._before.append(line)
+
+    def finish(self):
+        self._close_block()
+
+    def _close_block(self):
+        if self._current is not None:
+            self.blocks.append(self._current)
+            self._current = None
+
+class _LineSplitter:
+    """把解壓縮後的位元組切成行，未完成的行長度有上限"""
+    def __init__(self, collector):
+        self.collector = collector
+        self._partial = b""
+        self._overflow = False
+
+    def feed(self, data):
+        start = 0
+        while not self.collector.done:
+            newline = data.find(b"\n", start)
+            if newline == -1:
+                break
+            self._emit(data[start:newline])
+            start = newline + 1
+        if self.collector.done:
+            return
+        rest = data[start:]
+        room = LOG_MAX_LINE_CHARS * 4 - len(self._partial)
+        if len(rest) > room:
+            rest = rest[:max(room, 0)]
+            self._overflow = True
+        self._partial += rest
+
+    def _emit(self, tail):
+        if self._overflow:
+            line = self._partial
+        else:
+            line = self._partial + tail[:LOG_MAX_LINE_CHARS * 4]
+        self._partial = b""
+        self._overflow = False
+        self.collector.feed_line(line.decode('utf-8', errors='replace'))
+
+    def flush(self):
+        if self._partial and not self.collector.done:
+            self._emit(b"")
+
+def _zip_entry_job_name(entry_name):
+    """從 zip 檔名推回 job 名稱（"1_build.txt" 或 "build/1_Set up job.txt"）"""
+    if '/' in entry_name:
+        return entry_name.split('/', 1)[0]
+    return re.sub(r'^\d+_', '', entry_name).rsplit('.', 1)[0]
+
+def _normalize_job_name(name):
+    return re.sub(r'[^0-9a-z]', '', name.lower())
+
+def scan_log_archive(chunks, collector, skip_jobs=()):
+    """串流掃描 GitHub Actions 日誌 zip，逐個檔案解壓並交給 collector
+
+    只依序讀取 local file header，不需要中央目錄，所以不必下載完整個檔案。
+    """
+    reader = _ChunkReader(chunks)
+    skip_jobs = {_normalize_job_name(name) for name in skip_jobs}
+    entries_scanned = 0
+
+    while not collector.done:
+        try:
+            signature = reader.read_exact(4)
+        except EOFError:
+            break
+        if signature != b'PK\x03\x04':
+            # 中央目錄 (PK\x01\x02) 或結尾記錄，代表所有檔案都讀完了
+            break
+
+        (_, flags, method, _, _, _, comp_size, _,
+         name_len, extra_len) = struct.unpack('<HHHHHIIIHH', reader.read_exact(26))
+        name = reader.read_exact(name_len).decode('utf-8', errors='replace')
+        extra = reader.read_exact(extra_len)
+        has_descriptor = bool(flags & 0x08)
+
+        # zip64：有 0x0001 extra 欄位時，真正的大小放在 extra，data descriptor 的大小也是 8 位元組
+        zip64 = False
+        pos = 0
+        while pos + 4 <= len(extra):
+            header_id, size = struct.unpack('<HH', extra[pos:pos + 4])
+            if header_id == 0x0001:
+                zip64 = True
+                if comp_size == 0xFFFFFFFF and size >= 16:
+                    comp_size = struct.unpack('<Q', extra[pos + 12:pos + 20])[0]
+                break
+            pos += 4 + size
+
+        wanted = (name.endswith('.txt')
+                  and _normalize_job_name(_zip_entry_job_name(name)) not in skip_jobs)
+
+        if not has_descriptor and not wanted:
+            for _ in reader.iter_exact(comp_size):
+                pass
+            continue
+
+        if method not in (0, 8) or (method == 0 and has_descriptor):
+            # 無法在不知道大小的情況下跳過，直接停止掃描
+            break
+
+        if wanted:
+            collector.start_entry(name)
+            entries_scanned += 1
+        splitter = _LineSplitter(collector)
+
+        if method == 0:
+            for data in reader.iter_exact(comp_size):
+                if wanted and not collector.done:
+                    splitter.feed(data)
+        else:
+            inflater = zlib.decompressobj(-15)
+            source = reader.iter_exact(comp_size) if not has_descriptor else None
+            while not inflater.eof:
+                if source is not None:
+                    data = next(source, b"")
+                    if not data:
+                        break
+                else:
+                    data = reader.read_some(LOG_DOWNLOAD_CHUNK)
+                output = inflater.decompress(data, LOG_DECOMPRESS_CHUNK)
+                while True:
+                    if wanted and not collector.done:
+                        splitter.feed(output)
+                    # 串流結束時 unconsumed_tail 不會清空（剩下的已放進 unused_data），必須先檢查 eof
+                    if inflater.eof or not inflater.unconsumed_tail:
+                        break
+                    output = inflater.decompress(inflater.unconsumed_tail, LOG_DECOMPRESS_CHUNK)
+                if collector.done:
+                    break
+            if collector.done:
+                break
+            if has_descriptor:
+                reader.unread(inflater.unused_data)
+            elif source is not None:
+                for _ in source:
+                    pass
+
+        splitter.flush()
+
+        if has_descriptor:
+            # CRC-32 加上壓縮前後的大小（zip64 各 8 位元組），前面的簽章可有可無
+            sizes_len = 16 if zip64 else 8
+            descriptor = reader.read_exact(4)
+            if descriptor == b'PK\x07\x08':
+                reader.read_exact(4 + sizes_len)
+            else:
+                reader.read_exact(sizes_len)
+
+    collector.finish()
+    return entries_scanned, reader.bytes_read
+
+def find_workflow_run(run_ref=None):
+    """找出要分析的 workflow run：未指定時取最近一次失敗的 run"""
+    base_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/runs'
+
+    if run_ref is None:
+        response = github_get(base_url, params={'status': 'failure', 'per_page': 1}, timeout=15)
+        response.raise_for_status()
+        runs = decode_json(response).get('workflow_runs', [])
+        return WorkflowRun.from_json(runs[0]) if runs else None
+
+    run_ref = str(run_ref).lstrip('#')
+    if not run_ref.isdigit():
+        return None
+
+    # 先當作 run 編號（#123）在最近的 run 中尋找
+    response = github_get(base_url, params={'per_page': 100}, timeout=15)
+    response.raise_for_status()
+    for run in decode_json(response).get('workflow_runs', []):
+        if str(run['run_number']) == run_ref:
+            return WorkflowRun.from_json(run)
+
+    # 再當作 run ID 直接查詢
+    response = github_get(f'{base_url}/{run_ref}', timeout=15)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return WorkflowRun.from_json(decode_json(response))
+
+@serve_stale_on_outage
+def get_failed_run_excerpt(run_ref=None):
+    """下載失敗 run 的日誌並擷取錯誤片段"""
+    try:
+        if not GH_TOKEN:
+            return "❌ GitHub Token 未設定"
+
+        run = find_workflow_run(run_ref)
+        if not run:
+            if run_ref is None:
+                return "📭 最近沒有失敗的 workflow run"
+            return f"❌ 找不到 run `{run_ref}`，請輸入 run 編號（例如 `#42`）或 run ID"
+
+        if run.status != 'completed':
+            return f"🔄 Run #{run.run_number} 仍在執行中，完成後才能取得日誌"
+
+        # 先查 job 結果：成功的 job 不需要掃描
+        jobs_url = f"https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/runs/{run.id}/jobs"
+        response = github_get(jobs_url, params={'per_page': 100}, timeout=15)
+        response.raise_for_status()
+        jobs = decode_json(response).get('jobs', [])
+        failed_jobs = [job for job in jobs if job.get('conclusion') == 'failure']
+        passed_jobs = [job['name'] for job in jobs if job.get('conclusion') in ('success', 'skipped')]
+
+        logs_url = f"https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/runs/{run.id}/logs"
+        github_log.debug("🌐 串流下載 workflow 日誌: %s", logs_url)
+
+        collector = _LogExcerptCollector()
+        with github_get(logs_url, stream=True, timeout=(10, 60)) as response:
+            if response.status_code == 410:
+                return f"⌛ Run #{run.run_number} 的日誌已過期，無法下載"
+            response.raise_for_status()
+            entries, downloaded = scan_log_archive(
+                response.iter_content(chunk_size=LOG_DOWNLOAD_CHUNK), collector, skip_jobs=passed_jobs
+            )
+
+        return format_failed_run_excerpt(run, failed_jobs, collector, entries, downloaded)
+
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 404:
+            return "❌ 找不到 run 或日誌"
+        elif e.response.status_code == 403:
+            return "❌ 權限不足，下載日誌需要 actions:read 權限"
+        else:
+            return f"❌ HTTP 錯誤: {e.response.status_code}"
+    except Exception as e:
+        return f"❌ 擷取失敗日誌時出錯: {str(e)}"
+
+@traced("format failed excerpt")
+def format_failed_run_excerpt(run, failed_jobs, collector, entries, downloaded):
+    """格式化失敗日誌摘要（控制在單則訊息長度內）"""
+    conclusion = run.conclusion
+    header = (
+        f"🔍 **失敗原因摘要** - {run.name} #{run.run_number}\n"
+        f"**分支**: {run.head_branch} | **結果**: {conclusion or '進行中'}\n"
+    )
+
+    if failed_jobs:
+        job_lines = []
+        for job in failed_jobs[:3]:
+            failed_steps = [step['name'] for step in job.get('steps', []) if step.get('conclusion') == 'failure']
+            step_text = f" → {', '.join(failed_steps[:2])}" if failed_steps else ""
+            job_lines.append(f"• `{job['name']}`{step_text}")
+        header += "**失敗的 Job**:\n" + "\n".join(job_lines) + "\n"
+
+    footer = (
+        f"\n📄 掃描 {entries} 個日誌檔、{collector.lines_scanned} 行"
+        f"（下載 {downloaded / 1024:.0f} KB）\n"
+        f"🔗 [查看完整日誌]({run.html_url})"
+    )
+
+    if not collector.blocks:
+        return header + "\n📭 日誌中找不到明顯的錯誤訊息" + footer
+
+    budget = 2000 - len(header) - len(footer) - 20
+    excerpt = ""
+    for block in collector.blocks:
+        entry_name = block['entry'].rsplit('/', 1)[-1]
+        block_text = f"── {entry_name}\n" + "\n".join(block['lines']) + "\n"
+        block_text = block_text.replace("```", "'''")
+        if len(excerpt) + len(block_text) > budget:
+            remaining = budget - len(excerpt)
+            if remaining > 100:
+                excerpt += block_text[:remaining - 4] + "...\n"
+            break
+        excerpt += block_text
+
+    return header + f"```\n{excerpt}```" + footer
+
+# Search API 單一查詢最多只能取回 1000 筆，超過時把時間範圍切成較小的區間
+SEARCH_RESULT_CAP = 1000
+SEARCH_PAGE_SIZE = 100
+SEARCH_MAX_PARALLEL = int(os.getenv("SEARCH_MAX_PARALLEL", "3"))
+# 區間縮到這個長度還超過上限就不再切割
+SEARCH_MIN_WINDOW = timedelta(hours=1)
+SEARCH_MAX_QUOTA_WAIT = 60
+
+class SearchQuota:
+    """追蹤 Search API 的剩餘配額（預設每分鐘 30 次），用完時等到重置"""
+    def __init__(self):
+        self.remaining = None
+        self.reset_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # 等待時間在鎖內計算、在鎖外睡眠，等待中不會擋住其他執行緒的 update
+        while True:
+            with self._lock:
+                wait = 0.0
+                if self.remaining is not None and self.remaining <= 0:
+                    wait = self.reset_at - time.time()
+                    budget = remaining_budget()
+                    if wait > SEARCH_MAX_QUOTA_WAIT or (budget is not None and wait > budget):
+                        raise RuntimeError(f"Search API 配額已用完，約 {wait:.0f} 秒後重置")
+                    if wait <= 0:
+                        self.remaining = None
+                if wait <= 0:
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    return
+            github_log.warning(f"⏳ Search API 配額已用完，等待 {wait:.0f} 秒")
+            time.sleep(wait)
+
+    def update(self, response):
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        with self._lock:
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset is not None:
+                self.reset_at = float(reset)
+
+search_quota = SearchQuota()
+_search_executor = None
+
+def _get_search_executor():
+    global _search_executor
+    if _search_executor is None:
+        with _github_session_lock:
+            if _search_executor is None:
+                _search_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=SEARCH_MAX_PARALLEL, thread_name_prefix="github-search"
+                )
+    return _search_executor
+
+def _submit_search(func, *args):
+    # 每個工作複製一份 context，讓互動期限也傳進搜尋執行緒
+    return _get_search_executor().submit(contextvars.copy_context().run, func, *args)
+
+def search_merged_prs_window(start, end, page=1):
+    """查詢單一時間區間（含頭尾）的一頁結果，回傳 (PR 列表, 總數, 是否不完整)"""
+    merged_range = f"{start.strftime('%Y-%m-%dT%H:%M:%S')}Z..{end.strftime('%Y-%m-%dT%H:%M:%S')}Z"
+    query = f'repo:{GITHUB_OWNER}/{GITHUB_REPO} is:pr is:merged merged:{merged_range}'
+    params = {'q': query, 'sort': 'updated', 'order': 'desc', 'per_page': SEARCH_PAGE_SIZE, 'page': page}
+    
+    response = github_get('/search/issues', params=params)
+    response.raise_for_status()
+    
+    data = decode_json(response)
+    prs = [MergedPR.from_json(item) for item in data.get('items', [])]
+    return prs, data.get('total_count', 0), data.get('incomplete_results', False)
 
-def get_workflow_list():
-    """獲取可用的 workflow 列表"""
+def split_search_window(start, end, total):
+    """依結果數量把區間切成大約不超過上限的幾段"""
+    parts = max(2, math.ceil(total / (SEARCH_RESULT_CAP * 0.9)))
+    span = (end - start).total_seconds() + 1
+    bounds = [start + timedelta(seconds=int(span * i / parts)) for i in range(parts)] + [end + timedelta(seconds=1)]
+    return [
+        (bounds[i], bounds[i + 1] - timedelta(seconds=1))
+        for i in range(parts)
+        if bounds[i + 1] > bounds[i]
+    ]
+
+def format_search_split_note(info):
+    """查詢範圍被切割時提供給使用者的說明"""
+    if not info or not info.get('split'):
+        return ""
+    note = (f"ℹ️ 查詢結果超過 Search API 的 {SEARCH_RESULT_CAP} 筆上限，"
+            f"已拆成 {info['windows']} 個時間區間查詢後合併")
+    if info.get('truncated'):
+        note += "（部分區間仍超過上限，結果可能不完整）"
+    return note + "\n\n"
+
+def get_merged_prs_since(since_date, until_date=None, info=None):
+    """獲取指定時間後合併的 PR
+
+    結果超過 Search API 上限時自動切割時間區間，區間內的分頁平行抓取並去除重複。
+    info 若為 dict，會填入 windows（區間數）、split、requests、truncated。
+    """
     try:
         if not GH_TOKEN:
-            return "❌ GitHub Token 未設定"
+            return None, "❌ GitHub Token 未設定"
         
-        headers = {
-            'Authorization': f'token {GH_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
+        start = datetime.strptime(since_date, "%Y-%m-%d")
+        if until_date:
+            end = datetime.strptime(until_date, "%Y-%m-%d") + timedelta(days=1, seconds=-1)
+        else:
+            end = datetime.utcnow().replace(microsecond=0)
         
-        url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/workflows'
+        prs_by_number = {}
+        windows = 0
+        request_count = 0
+        truncated = False
+        page_jobs = []
+        pending = [(start, end)]
         
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
+        try:
+            # 先平行查詢每個區間的第一頁，同時得知總數；太多就再切割
+            while pending:
+                futures = [(window, _submit_search(search_merged_prs_window, *window)) for window in pending]
+                pending = []
+                for (window_start, window_end), future in futures:
+                    prs, total, incomplete = future.result()
+                    request_count += 1
+                    if total > SEARCH_RESULT_CAP and window_end - window_start > SEARCH_MIN_WINDOW:
+                        pending.extend(split_search_window(window_start, window_end, total))
+                        continue
+                    
+                    windows += 1
+                    truncated = truncated or incomplete or total > SEARCH_RESULT_CAP
+                    for pr in prs:
+                        prs_by_number[pr.number] = pr
+                    last_page = math.ceil(min(total, SEARCH_RESULT_CAP) / SEARCH_PAGE_SIZE)
+                    page_jobs.extend((window_start, window_end, page) for page in range(2, last_page + 1))
+            
+            # 其餘分頁平行抓取
+            for future in [_submit_search(search_merged_prs_window, *job) for job in page_jobs]:
+                prs, _, incomplete = future.result()
+                request_count += 1
+                truncated = truncated or incomplete
+                for pr in prs:
+                    prs_by_number[pr.number] = pr
+        except Exception:
+            # 搜尋在其他執行緒失敗，這裡補記上游故障，讓呼叫端可以改用舊資料
+            _mark_upstream_failure()
+            raise
         
-        data = response.json()
+        if windows > 1:
+            github_log.info(f"ℹ️ 合併 PR 查詢已拆成 {windows} 個時間區間（{request_count} 次請求）")
+        if info is not None:
+            info.update(windows=windows, split=windows > 1, requests=request_count, truncated=truncated)
         
-        if not data.get('workflows'):
-            return "📭 尚未設定任何 workflow"
+        return sorted(prs_by_number.values(), key=lambda pr: pr.merged_at, reverse=True), None
         
-        message = "📋 **可用的 Workflows**\n\n"
-        message += "💡 **使用方式**: `!pipeline_status <檔案名稱>`\n\n"
+    except Exception as e:
+        return None, f"❌ 獲取 PR 時出錯: {str(e)}"
+
+@traced("format changelog")
+def generate_changelog(prs, info=None):
+    """生成精簡的 changelog"""
+    if not prs:
+        return None
+    
+    # 計算時間範圍
+    start_date = (datetime.now() - timedelta(days=CHECK_INTERVAL_DAYS)).strftime("%Y-%m-%d")
+    end_date = datetime.now().strftime("%Y-%m-%d")
+    
+    changelog = f"📊 **每周更新報告 ({start_date} ~ {end_date})**\n\n"
+    changelog += f"本周共合併了 **{len(prs)}** 個 PR\n\n"
+    changelog += format_search_split_note(info)
+    
+    for pr in prs:
+        pr_number = pr.number
+        pr_title = pr.title
+        pr_url = pr.html_url
+        author = pr.author
         
-        for workflow in data['workflows']:
-            state_emoji = '✅' if workflow['state'] == 'active' else '⏸️'
-            file_name = workflow['path'].split('/')[-1]
-            message += f"{state_emoji} **{workflow['name']}**\n"
-            message += f"   📁 檔案: `{file_name}`\n"
-            message += f"   📊 狀態: {workflow['state']}\n\n"
+        # 格式化時間
+        formatted_time = pr.merged_at.strftime("%m/%d")
         
-        return message
+        changelog += f"• [#{pr_number}]({pr_url}) {pr_title}\n"
+        changelog += f"  👤 {author} | 📅 {formatted_time}\n\n"
+    
+    changelog += f"💡 使用 `!changelog {CHECK_INTERVAL_DAYS}` 查看詳細內容"
+    return changelog
+
+# ===== Pipeline 圖表：資料在執行緒中抓取，繪圖在獨立程序池中執行 =====
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "1" if LOW_MEMORY_MODE else "2"))
+CHART_CACHE_SIZE = 32
+CHART_MAX_DAYS = 30
+CHART_MAX_PAGES = 3
+CHART_BUDGET = 20
+
+_chart_pool = None
+# (查詢, 資料版本) -> PNG 位元組
+_chart_cache = OrderedDict()
+# 相同查詢同時只繪製一次，其他請求等待同一個結果
+_chart_inflight = {}
+
+def charts_available():
+    return importlib.util.find_spec("matplotlib") is not None
+
+def start_chart_pool():
+    """建立圖表程序池
+
+    啟動時（其他執行緒啟動前）使用 fork，worker 共用父程序已載入的記憶體，也不會重新執行 bot.py。
+    之後才建立（沒有預先建立或 worker 異常結束後重建）時已有其他執行緒，fork 可能繼承被鎖住的鎖，
+    改用 forkserver：worker 從乾淨的伺服器程序產生，代價是會重新匯入 bot.py（不執行 __main__）。
+    """
+    global _chart_pool
+    if _chart_pool is None:
+        import multiprocessing
+        import charts
+        if threading.active_count() == 1:
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["charts"])
+        _chart_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=CHART_WORKERS,
+            mp_context=context,
+        )
+        _chart_pool.submit(charts.warmup)
+    return _chart_pool
+
+def _runs_url_for(workflow):
+    if workflow:
+        workflow_id = get_workflow_id_by_name(workflow) or workflow
+        return f'/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/workflows/{workflow_id}/runs'
+    return f'/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/runs'
+
+def get_pipeline_data_version(workflow=None):
+    """以最新一筆 run 當作資料版本：沒有新的 run 就沿用快取的圖表"""
+    response = github_get(_runs_url_for(workflow), params={'per_page': 1})
+    response.raise_for_status()
+    runs = decode_json(response).get('workflow_runs', [])
+    if not runs:
+        return None
+    latest = WorkflowRun.from_json(runs[0])
+    return (latest.id, latest.status, latest.updated_at)
+
+def collect_pipeline_chart_data(workflow, days):
+    """抓取時間範圍內的 run 與合併的 PR，整理成每日統計"""
+    start = datetime.utcnow().date() - timedelta(days=days - 1)
+    params = {'per_page': 100, 'created': f'>={start.isoformat()}'}
+    
+    day_keys = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    durations = {key: [] for key in day_keys}
+    outcomes = {key: [0, 0] for key in day_keys}  # [成功數, 完成數]
+    
+    url = _runs_url_for(workflow)
+    for page in range(1, CHART_MAX_PAGES + 1):
+        response = github_get(url, params=dict(params, page=page))
+        response.raise_for_status()
+        page_runs = [WorkflowRun.from_json(run) for run in decode_json(response).get('workflow_runs', [])]
+        for run in page_runs:
+            day = run.created_at.date().isoformat()
+            if day not in durations or run.status != 'completed':
+                continue
+            durations[day].append((run.updated_at - run.created_at).total_seconds() / 60)
+            outcomes[day][1] += 1
+            if run.conclusion == 'success':
+                outcomes[day][0] += 1
+        if len(page_runs) < 100:
+            break
+    
+    merged = {key: 0 for key in day_keys}
+    prs, error = get_merged_prs_since(start.isoformat())
+    if error:
+        raise RuntimeError(error)
+    for pr in prs:
+        day = pr.merged_at.date().isoformat()
+        if day in merged:
+            merged[day] += 1
+    
+    return {
+        'title': f"{workflow or 'All workflows'} - last {days} days",
+        'days': [key[5:] for key in day_keys],
+        'durations': [durations[key] for key in day_keys],
+        'success_rates': [
+            outcomes[key][0] * 100 / outcomes[key][1] if outcomes[key][1] else None
+            for key in day_keys
+        ],
+        'merged_prs': [merged[key] for key in day_keys],
+    }
+
+def summarize_chart_series(series):
+    """圖表附帶的文字摘要"""
+    all_durations = sorted(d for values in series['durations'] for d in values)
+    total_runs = len(all_durations)
+    rates = [r for r in series['success_rates'] if r is not None]
+    median = all_durations[total_runs // 2] if total_runs else 0
+    return (
+        f"📈 **{series['title']}**\n"
+        f"• 完成的 run: {total_runs} | 耗時中位數: {median:.1f} 分鐘\n"
+        f"• 平均每日成功率: {sum(rates) / len(rates):.0f}%\n" if rates else
+        f"📈 **{series['title']}**\n• 範圍內沒有完成的 run\n"
+    ) + f"• 合併的 PR: {sum(series['merged_prs'])} 個"
+
+async def render_chart_in_pool(series):
+    """在程序池中繪圖，不佔用事件迴圈"""
+    import charts
+    loop = asyncio.get_running_loop()
+    with trace_span("render chart"):
+        try:
+            return await loop.run_in_executor(start_chart_pool(), charts.render_pipeline_chart, series)
+        except concurrent.futures.process.BrokenProcessPool:
+            # worker 異常結束時重建程序池再試一次
+            global _chart_pool
+            _chart_pool = None
+            return await loop.run_in_executor(start_chart_pool(), charts.render_pipeline_chart, series)
+
+async def get_pipeline_chart(workflow=None, days=7):
+    """取得 pipeline 圖表，回傳 (PNG 位元組, 摘要) 或 (None, 錯誤訊息)"""
+    if not charts_available():
+        return None, "❌ 未安裝 matplotlib，無法產生圖表"
+    if not GH_TOKEN:
+        return None, "❌ GitHub Token 未設定"
+    
+    try:
+        version = await call_with_deadline(get_pipeline_data_version, workflow, budget=CHART_BUDGET)
+    except Exception as e:
+        return None, f"❌ 獲取 pipeline 資料時出錯: {str(e)}"
+    if version is None:
+        return None, "📭 尚未有任何 workflow 運行記錄"
+    
+    key = (workflow, days, datetime.utcnow().date().isoformat(), version)
+    if key in _chart_cache:
+        _chart_cache.move_to_end(key)
+        return _chart_cache[key]
+    
+    if key in _chart_inflight:
+        return await asyncio.shield(_chart_inflight[key])
+    
+    future = asyncio.get_running_loop().create_future()
+    _chart_inflight[key] = future
+    # 被取消（BaseException）時也要讓等待同一張圖的請求拿到結果
+    result = (None, "❌ 圖表產生已中斷，請再試一次")
+    try:
+        series = await call_with_deadline(collect_pipeline_chart_data, workflow, days, budget=CHART_BUDGET)
+        png = await render_chart_in_pool(series)
+        result = (png, summarize_chart_series(series))
+        _chart_cache[key] = result
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    except Exception as e:
+        result = (None, f"❌ 產生圖表時出錯: {str(e)}")
+    finally:
+        del _chart_inflight[key]
+        future.set_result(result)
+    return result
+
+async def benchmark_charts(users=50, queries=5, days=14):
+    """模擬多位使用者同時要求圖表，量測繪圖吞吐量與事件迴圈延遲"""
+    import random
+    
+    def fake_series(seed):
+        rng = random.Random(seed)
+        return {
+            'title': f"bench #{seed}",
+            'days': [f"10-{i + 1:02d}" for i in range(days)],
+            'durations': [[rng.uniform(1, 10) for _ in range(rng.randint(0, 12))] for _ in range(days)],
+            'success_rates': [rng.choice([None, rng.uniform(0, 100)]) for _ in range(days)],
+            'merged_prs': [rng.randint(0, 8) for _ in range(days)],
+        }
+    
+    # 量測事件迴圈在繪圖期間是否被卡住
+    max_lag = 0.0
+    stop = asyncio.Event()
+    
+    async def ticker():
+        nonlocal max_lag
+        while not stop.is_set():
+            before = time.perf_counter()
+            await asyncio.sleep(0.01)
+            max_lag = max(max_lag, time.perf_counter() - before - 0.01)
+    
+    ticker_task = asyncio.create_task(ticker())
+    await render_chart_in_pool(fake_series(-1))  # 預熱：worker 載入 matplotlib
+    
+    cache = {}
+    latencies = []
+    renders = 0
+    
+    async def one_user(i):
+        nonlocal renders
+        started = time.perf_counter()
+        seed = i % queries
+        if seed not in cache:
+            renders += 1
+            cache[seed] = asyncio.ensure_future(render_chart_in_pool(fake_series(seed)))
+        await cache[seed]
+        latencies.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(one_user(i) for i in range(users)))
+    elapsed = time.perf_counter() - started
+    
+    cold_latencies = []
+    cold_started = time.perf_counter()
+    for seed in range(queries):
+        t0 = time.perf_counter()
+        await render_chart_in_pool(fake_series(100 + seed))
+        cold_latencies.append(time.perf_counter() - t0)
+    cold_elapsed = time.perf_counter() - cold_started
+    
+    stop.set()
+    await ticker_task
+    latencies.sort()
+    
+    print(f"🧪 圖表基準測試: {users} 位使用者、{queries} 種查詢、{CHART_WORKERS} 個 worker")
+    print(f"  同時請求: 總耗時 {elapsed:.2f} 秒，實際繪圖 {renders} 次，"
+          f"{users / elapsed:.1f} 請求/秒")
+    print(f"  延遲 p50 {latencies[len(latencies) // 2] * 1000:.0f} ms / "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms")
+    print(f"  單張繪圖（無快取）: 平均 {cold_elapsed / queries * 1000:.0f} ms")
+    print(f"  事件迴圈最大延遲: {max_lag * 1000:.1f} ms")
+
+# ===== 歷史匯出：逐頁串流寫入 gzip 暫存檔，以單一附件上傳 =====
+
+EXPORT_MAX_DAYS = int(os.getenv("EXPORT_MAX_DAYS", "365"))
+# 每段查詢的天數；runs API 與 Search API 每個查詢最多只回傳 1000 筆，長區間必須切段
+EXPORT_WINDOW_DAYS = int(os.getenv("EXPORT_WINDOW_DAYS", "7"))
+# 壓縮資料超過這個大小就改寫到磁碟暫存檔
+EXPORT_SPOOL_BYTES = int(os.getenv("EXPORT_SPOOL_BYTES", str(1024 * 1024)))
+# Discord 附件大小上限
+EXPORT_MAX_BYTES = int(os.getenv("EXPORT_MAX_BYTES", str(8 * 1024 * 1024)))
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+EXPORT_FORMATS = ('csv', 'json', 'md')
+EXPORT_COLUMNS = {
+    'runs': ('id', 'workflow', 'run_number', 'branch', 'status', 'conclusion',
+             'created_at', 'updated_at', 'duration_min', 'url'),
+    'changelog': ('number', 'title', 'author', 'merged_at', 'labels', 'url'),
+}
+RUNS_RESULT_CAP = 1000
+
+export_slots = asyncio.Semaphore(EXPORT_MAX_CONCURRENT)
+
+def export_windows(days):
+    """把查詢範圍切成 EXPORT_WINDOW_DAYS 天一段（頭尾都包含），由新到舊"""
+    end = datetime.utcnow().replace(microsecond=0)
+    start = end - timedelta(days=days)
+    while end > start:
+        window_start = max(start, end - timedelta(days=EXPORT_WINDOW_DAYS))
+        yield window_start, end
+        end = window_start - timedelta(seconds=1)
+
+def iter_export_runs(days, info):
+    """逐頁產生 workflow run 紀錄"""
+    for window_start, window_end in export_windows(days):
+        created = f"{window_start.strftime('%Y-%m-%dT%H:%M:%S')}Z..{window_end.strftime('%Y-%m-%dT%H:%M:%S')}Z"
+        for page in range(1, RUNS_RESULT_CAP // 100 + 1):
+            response = github_get(f'/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/runs',
+                                  params={'per_page': 100, 'created': created, 'page': page})
+            response.raise_for_status()
+            data = decode_json(response)
+            info['requests'] += 1
+            if page == 1 and data.get('total_count', 0) > RUNS_RESULT_CAP:
+                info['truncated'] = True
+            runs = [WorkflowRun.from_json(item) for item in data.get('workflow_runs', [])]
+            yield runs
+            if len(runs) < 100:
+                break
+
+def iter_export_prs(days, info):
+    """逐頁產生合併 PR 紀錄；超過 Search API 上限的區間再切小"""
+    pending = list(export_windows(days))
+    while pending:
+        window = pending.pop(0)
+        prs, total, incomplete = search_merged_prs_window(*window)
+        info['requests'] += 1
+        if total > SEARCH_RESULT_CAP and window[1] - window[0] > SEARCH_MIN_WINDOW:
+            pending[:0] = reversed(split_search_window(*window, total))
+            continue
         
+        info['truncated'] = info['truncated'] or incomplete or total > SEARCH_RESULT_CAP
+        yield prs
+        last_page = math.ceil(min(total, SEARCH_RESULT_CAP) / SEARCH_PAGE_SIZE)
+        for page in range(2, last_page + 1):
+            prs, _, incomplete = search_merged_prs_window(*window, page)
+            info['requests'] += 1
+            info['truncated'] = info['truncated'] or incomplete
+            yield prs
+
+def export_row(kind, record):
+    """紀錄轉成匯出的一列（與 EXPORT_COLUMNS 對應）"""
+    if kind == 'runs':
+        finished = record.status == 'completed' and record.updated_at
+        duration = f"{(record.updated_at - record.created_at).total_seconds() / 60:.1f}" if finished else ""
+        return (record.id, record.name, record.run_number, record.head_branch, record.status,
+                record.conclusion or "", record.created_at.isoformat(),
+                record.updated_at.isoformat() if record.updated_at else "", duration, record.html_url)
+    return (record.number, record.title, record.author, record.merged_at.isoformat(),
+            ";".join(record.labels), record.html_url)
+
+def write_export(kind, days, fmt, stream):
+    """把資料逐頁寫進文字串流，寫完一頁就丟掉；回傳 (筆數, 資訊)"""
+    columns = EXPORT_COLUMNS[kind]
+    info = {'requests': 0, 'truncated': False}
+    pages = iter_export_runs(days, info) if kind == 'runs' else iter_export_prs(days, info)
+    
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(columns)
+    elif fmt == 'md':
+        stream.write("| " + " | ".join(columns) + " |\n")
+        stream.write("|" + " --- |" * len(columns) + "\n")
+    else:
+        stream.write("[")
+    
+    count = 0
+    for records in pages:
+        for record in records:
+            row = export_row(kind, record)
+            if fmt == 'csv':
+                writer.writerow(row)
+            elif fmt == 'md':
+                stream.write("| " + " | ".join(str(value).replace("|", "\\|") for value in row) + " |\n")
+            else:
+                stream.write(("," if count else "") + "\n" + json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            count += 1
+    
+    if fmt == 'json':
+        stream.write("\n]\n")
+    return count, info
+
+def build_export(kind, days, fmt):
+    """產生壓縮的匯出檔，回傳 (暫存檔, 檔名, 摘要)；檔案太大時暫存檔為 None
+
+    記憶體中只有目前這一頁的紀錄與最多 EXPORT_SPOOL_BYTES 的壓縮資料
+    """
+    filename = f"{GITHUB_REPO}-{kind}-{days}d.{fmt}"
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    try:
+        compressed = gzip.GzipFile(filename=filename, mode='wb', fileobj=spool)
+        # 匯出逐頁讀過就丟，不寫進 GitHub 回應快取
+        token = github_cache_bypass.set(True)
+        try:
+            with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as stream:
+                count, info = write_export(kind, days, fmt, stream)
+        finally:
+            github_cache_bypass.reset(token)
+        size = spool.tell()
+    except BaseException:
+        spool.close()
+        raise
+    
+    summary = f"📦 已匯出 {count} 筆（近 {days} 天，{info['requests']} 次請求），壓縮後 {size / 1024:.1f} KB"
+    if info['truncated']:
+        summary += f"\n⚠️ 部分時間區間超過 API 的 {SEARCH_RESULT_CAP} 筆上限，結果可能不完整（可調小 EXPORT_WINDOW_DAYS）"
+    if size > EXPORT_MAX_BYTES:
+        spool.close()
+        return None, filename, summary + f"\n❌ 超過附件上限 {EXPORT_MAX_BYTES // (1024 * 1024)} MB，請縮短天數"
+    spool.seek(0)
+    return spool, filename + ".gz", summary
+
+async def run_export(kind, days, fmt):
+    """驗證參數並在背景執行緒產生匯出檔，回傳 (discord.File 或 None, 訊息)"""
+    kind = (kind or "").lower()
+    fmt = (fmt or "csv").lower()
+    if kind not in EXPORT_COLUMNS:
+        return None, "❌ 用法: `!export changelog|runs <天數> [csv|json|md]`"
+    if fmt not in EXPORT_FORMATS:
+        return None, f"❌ 不支援的格式，可用: {', '.join(EXPORT_FORMATS)}"
+    if not 1 <= days <= EXPORT_MAX_DAYS:
+        return None, f"❌ 天數必須介於 1 到 {EXPORT_MAX_DAYS} 之間"
+    if export_slots.locked():
+        return None, f"⏳ 目前已有 {EXPORT_MAX_CONCURRENT} 個匯出在進行，請稍後再試"
+    
+    async with export_slots:
+        try:
+            spool, filename, summary = await asyncio.to_thread(build_export, kind, days, fmt)
+        except Exception as e:
+            return None, f"❌ 匯出失敗: {e}"
+    if spool is None:
+        return None, summary
+    return discord.File(spool, filename=filename), summary
+
+# ===== 即時狀態看板：每個頻道一則置頂訊息，內容有變化才編輯 =====
+
+# 叢集模式下每個 worker 只負責自己分片上的看板，各自存一個檔案，避免互相覆寫
+LIVE_BOARD_FILE = os.getenv("LIVE_BOARD_FILE", f"live_boards{'-' + CLUSTER_ID if CLUSTER_ID else ''}.json")
+LIVE_BOARD_INTERVAL = int(os.getenv("LIVE_BOARD_INTERVAL", "60"))
+# 同一則看板兩次編輯之間的最短間隔（秒）
+LIVE_BOARD_MIN_EDIT_INTERVAL = int(os.getenv("LIVE_BOARD_MIN_EDIT_INTERVAL", "120"))
+# 每輪最多編輯幾則看板，其餘留到下一輪
+LIVE_BOARD_MAX_EDITS_PER_TICK = int(os.getenv("LIVE_BOARD_MAX_EDITS_PER_TICK", "20"))
+LIVE_BOARD_BUDGET = 20
+
+class LiveBoard:
+    """單一頻道的看板狀態"""
+    __slots__ = ('channel_id', 'message_id', 'content_hash', 'last_edit')
+
+    def __init__(self, channel_id, message_id=None, content_hash=None):
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.content_hash = content_hash
+        self.last_edit = 0.0
+
+# 頻道 ID -> LiveBoard
+live_boards = {}
+# 已經警告過找不到的看板頻道，避免每輪重複記錄
+_missing_live_board_channels = set()
+live_board_stats = {'renders': 0, 'edits': 0, 'skipped_unchanged': 0, 'deferred': 0}
+
+def load_live_boards():
+    """從檔案載入已啟用的看板；分片模式下只保留本程序看得到的頻道（其他分片的看板由負責的 worker 更新）"""
+    path = LIVE_BOARD_FILE
+    if CLUSTER_ID and not os.path.exists(path) and os.path.exists("live_boards.json"):
+        # 從單一程序改成叢集模式時，沿用原本共用的檔案
+        path = "live_boards.json"
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        live_board_log.error(f"❌ 讀取看板設定失敗: {e}")
+        return
+    skipped = 0
+    for channel_id, entry in data.items():
+        if SHARDED and bot.get_channel(int(channel_id)) is None:
+            skipped += 1
+            continue
+        live_boards[int(channel_id)] = LiveBoard(int(channel_id), entry.get('message_id'), entry.get('hash'))
+    if skipped:
+        live_board_log.info(f"ℹ️  {skipped} 個看板不在本程序的分片上，由其他 worker 負責")
+
+def save_live_boards():
+    """把看板設定寫回檔案（先寫暫存檔再取代，避免寫到一半）"""
+    data = {
+        str(board.channel_id): {'message_id': board.message_id, 'hash': board.content_hash}
+        for board in live_boards.values()
+    }
+    tmp_path = LIVE_BOARD_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, LIVE_BOARD_FILE)
+
+def collect_live_board_state():
+    """抓取看板需要的資料：每個 workflow 的最新 run 與最新 commit"""
+    response = github_get(f'/repos/{GITHUB_OWNER}/{GITHUB_REPO}/actions/runs', params={'per_page': 50})
+    response.raise_for_status()
+    
+    latest_by_workflow = {}
+    for item in decode_json(response).get('workflow_runs', []):
+        run = WorkflowRun.from_json(item)
+        # API 依建立時間由新到舊排序，第一次看到的就是最新的
+        latest_by_workflow.setdefault(run.name, run)
+    
+    response = github_get(f'/repos/{GITHUB_OWNER}/{GITHUB_REPO}/commits', params={'per_page': 1})
+    response.raise_for_status()
+    commits = decode_json(response)
+    commit = Commit.from_json(commits[0]) if commits else None
+    
+    # 狀態只放顯示用的字串，可以直接雜湊，畫看板時也不必再轉換
+    runs = [
+        (run.name, run.status, run.conclusion, run.head_branch, run.run_number,
+         run.created_at.strftime("%m/%d %H:%M"), run.html_url)
+        for run in sorted(latest_by_workflow.values(), key=lambda r: r.name)
+    ]
+    commit_state = None
+    if commit:
+        commit_state = (commit.sha, commit.message.split('\n')[0][:100],
+                        commit.author_login or commit.author_name, commit.author_date.strftime("%m/%d %H:%M"))
+    return {'runs': runs, 'commit': commit_state}
+
+def live_board_hash(state):
+    """看板內容的雜湊：只有內容改變時才需要編輯訊息"""
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+def build_live_board_embed(state):
+    """把看板狀態畫成 Embed"""
+    embed = discord.Embed(
+        title="📡 即時狀態看板",
+        description=f"{GITHUB_OWNER}/{GITHUB_REPO} 的 workflow 與最新提交（內容有變化時自動更新）",
+        color=0x2C3E50,
+        timestamp=datetime.utcnow()
+    )
+    
+    run_emoji = {'success': '✅', 'failure': '❌', 'cancelled': '⏹️', 'skipped': '⏭️', 'timed_out': '⌛'}
+    for name, status, conclusion, branch, run_number, created, html_url in state['runs'][:20]:
+        emoji = run_emoji.get(conclusion, '❓') if status == 'completed' else '🔄'
+        embed.add_field(
+            name=f"{emoji} {name}"[:256],
+            value=f"🎯 {branch} | [#{run_number}]({html_url}) | 🕒 {created}",
+            inline=False
+        )
+    if not state['runs']:
+        embed.add_field(name="🚀 Workflows", value="📭 尚未有任何 workflow 運行記錄", inline=False)
+    
+    if state['commit']:
+        sha, first_line, author, committed = state['commit']
+        commit_url = f"https://github.com/{GITHUB_OWNER}/{GITHUB_REPO}/commit/{sha}"
+        embed.add_field(
+            name="📝 最新提交",
+            value=f"[`{sha[:7]}`]({commit_url}) {first_line}\n👤 {author} | 🕒 {committed}",
+            inline=False
+        )
+    
+    embed.set_footer(text="最後變更時間")
+    return embed
+
+async def enable_live_board(channel):
+    """在頻道建立（或重新使用）看板訊息並置頂"""
+    board = live_boards.get(channel.id) or LiveBoard(channel.id)
+    state = await call_with_deadline(collect_live_board_state, budget=LIVE_BOARD_BUDGET)
+    message, created = await upsert_message(channel, board.message_id, embed=build_live_board_embed(state))
+    if created:
+        try:
+            await message.pin()
+        except discord.HTTPException as e:
+            live_board_log.warning(f"⚠️ 無法置頂看板訊息: {e}")
+    board.message_id = message.id
+    board.content_hash = live_board_hash(state)
+    board.last_edit = time.monotonic()
+    live_boards[channel.id] = board
+    save_live_boards()
+
+async def disable_live_board(channel):
+    board = live_boards.pop(channel.id, None)
+    if board is None:
+        return False
+    save_live_boards()
+    if board.message_id:
+        try:
+            await channel.get_partial_message(board.message_id).unpin()
+        except discord.HTTPException:
+            pass
+    return True
+
+@tasks.loop(seconds=LIVE_BOARD_INTERVAL)
+async def refresh_live_boards():
+    """所有看板共用一次資料抓取；只編輯內容有變化且超過最短間隔的看板"""
+    # 多個副本同時運行時只由領導者編輯，避免同一則看板被來回覆寫（叢集中每組分片各有一個領導者）
+    if not coordinator.is_leader:
+        return
+    
+    # 只處理本程序（分片）看得到的頻道；看不到的（頻道已刪除或 Bot 被移出伺服器）只警告一次
+    boards = []
+    for board in live_boards.values():
+        if bot.get_channel(board.channel_id):
+            boards.append(board)
+            _missing_live_board_channels.discard(board.channel_id)
+        elif board.channel_id not in _missing_live_board_channels:
+            _missing_live_board_channels.add(board.channel_id)
+            live_board_log.warning(f"⚠️ 找不到看板頻道 {board.channel_id}，暫停更新")
+    if not boards:
+        return
+    
+    try:
+        state = await call_with_deadline(collect_live_board_state, budget=LIVE_BOARD_BUDGET)
     except Exception as e:
-        return f"❌ 獲取 workflow 列表時出錯: {str(e)}"
-       
+        live_board_log.error(f"❌ 更新看板資料失敗: {e}")
+        return
+    live_board_stats['renders'] += 1
+    
+    content_hash = live_board_hash(state)
+    embed = None
+    edits = 0
+    now = time.monotonic()
+    changed = False
+    
+    for board in boards:
+        if board.content_hash == content_hash:
+            live_board_stats['skipped_unchanged'] += 1
+            continue
+        if now - board.last_edit < LIVE_BOARD_MIN_EDIT_INTERVAL or edits >= LIVE_BOARD_MAX_EDITS_PER_TICK:
+            live_board_stats['deferred'] += 1
+            continue
+        
+        if embed is None:
+            embed = build_live_board_embed(state)
+        channel = bot.get_channel(board.channel_id)
+        try:
+            message, created = await upsert_message(channel, board.message_id, embed=embed)
+        except discord.HTTPException as e:
+            live_board_log.error(f"❌ 更新看板失敗（頻道 {board.channel_id}）: {e}")
+            continue
+        if created:
+            try:
+                await message.pin()
+            except discord.HTTPException:
+                pass
+        board.message_id = message.id
+        board.content_hash = content_hash
+        board.last_edit = now
+        edits += 1
+        changed = True
+    
+    live_board_stats['edits'] += edits
+    if changed:
+        save_live_boards()
+
+refresh_live_boards.before_loop(wait_for_leader_election)
+
+# ===== 領導者選舉與工作去重：多個實例同時運行時，排程報告只發送一次 =====
+
+# 多個實例（例如 Render 滾動部署時的新舊程序）必須指向同一個資料庫檔案才能互相協調
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "bot_state.db")
+# 租約有效期與續約間隔（秒）；領導者當機後最多 LEADER_LEASE_TTL 秒由其他實例接手
+LEADER_LEASE_TTL = int(os.getenv("LEADER_LEASE_TTL", "45"))
+LEADER_RENEW_INTERVAL = int(os.getenv("LEADER_RENEW_INTERVAL", "15"))
+# 執行中的工作超過這個時間（秒）仍未完成，視為執行者已當機，允許重新認領
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "3600"))
+# 每周報告：排程檢查與間隔檢查共用同一個工作 ID，同一週只會發送一次
+WEEKLY_REPORT_JOB = "weekly_changelog"
+
+class JobCoordinator:
+    """以 SQLite 實作的租約與工作紀錄
+
+    - leases：每個租約一列，記錄持有者與到期時間，只有持有者或租約過期時才能寫入
+    - job_runs：(job_id, run_window) 為主鍵，成功插入的實例才執行該工作
+    兩個規則都是單一條 SQL 語句完成，多個程序同時呼叫也不會重複取得
+    """
+
+    def __init__(self, path, instance_id=None):
+        self.path = path
+        self.instance_id = instance_id or f"{socket.gethostname()}-{os.getpid()}-{os.urandom(3).hex()}"
+        self.is_leader = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_runs ("
+                "job_id TEXT NOT NULL, run_window TEXT NOT NULL, holder TEXT NOT NULL, "
+                "started_at REAL NOT NULL, status TEXT NOT NULL, PRIMARY KEY (job_id, run_window))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._connect().execute(sql, params)
+
+    def acquire_lease(self, name, ttl):
+        """取得或續約租約；其他實例持有且尚未過期時回傳 False"""
+        now = time.time()
+        cursor = self._execute(
+            "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+            "WHERE leases.holder = excluded.holder OR leases.expires_at <= ?",
+            (name, self.instance_id, now + ttl, now),
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, name):
+        """主動釋放租約，讓其他實例不必等到過期"""
+        self._execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, self.instance_id))
+        self.is_leader = False
+
+    def lease_holder(self, name):
+        """回傳 (持有者, 到期時間)，沒有租約時回傳 None"""
+        return self._execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+
+    def claim_job(self, job_id, run_window):
+        """認領某個時間窗口的工作；已有人完成或正在執行時回傳 False"""
+        now = time.time()
+        cursor = self._execute(
+            "INSERT INTO job_runs (job_id, run_window, holder, started_at, status) VALUES (?, ?, ?, ?, 'running') "
+            "ON CONFLICT(job_id, run_window) DO UPDATE SET holder = excluded.holder, "
+            "started_at = excluded.started_at, status = 'running' "
+            "WHERE job_runs.status = 'running' AND job_runs.started_at <= ?",
+            (job_id, run_window, self.instance_id, now, now - JOB_STALE_AFTER),
+        )
+        return cursor.rowcount == 1
 
-def get_merged_prs_since(since_date):
-    """獲取指定時間後合併的 PR"""
+    def finish_job(self, job_id, run_window, succeeded):
+        """成功時標記完成；失敗時刪除紀錄，讓同一個窗口之後可以重試"""
+        if succeeded:
+            self._execute(
+                "UPDATE job_runs SET status = 'done' WHERE job_id = ? AND run_window = ? AND holder = ?",
+                (job_id, run_window, self.instance_id),
+            )
+        else:
+            self._execute(
+                "DELETE FROM job_runs WHERE job_id = ? AND run_window = ? AND holder = ?",
+                (job_id, run_window, self.instance_id),
+            )
+
+    def recent_jobs(self, limit=5):
+        """最近的工作紀錄：(job_id, run_window, holder, started_at, status)"""
+        return self._execute(
+            "SELECT job_id, run_window, holder, started_at, status FROM job_runs "
+            "ORDER BY started_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+
+coordinator = JobCoordinator(STATE_DB_PATH)
+
+def leader_lease_name():
+    """同一組分片的副本競爭同一個租約；叢集中不同 worker 各自選出領導者"""
+    return f"leader:{','.join(str(s) for s in SHARD_IDS)}" if SHARD_IDS else "leader:all"
+
+def current_report_window(now=None):
+    """每周報告的時間窗口（ISO 週，例如 2025-W07）"""
+    year, week, _ = (now or datetime.utcnow()).isocalendar()
+    return f"{year}-W{week:02d}"
+
+# run_job_once 的結果：已執行、已由其他檢查或實例認領、本實例不是領導者、狀態資料庫無法存取
+JOB_RAN = "ran"
+JOB_CLAIMED_ELSEWHERE = "claimed_elsewhere"
+JOB_NOT_LEADER = "not_leader"
+JOB_UNAVAILABLE = "unavailable"
+
+async def run_job_once(job_id, run_window, func, *args):
+    """只有領導者、且該時間窗口還沒被執行過時才執行 func；func 的例外會釋放認領後再拋出"""
+    if not coordinator.is_leader:
+        leader_log.info(f"ℹ️  本實例不是領導者，略過工作 {job_id} [{run_window}]")
+        return JOB_NOT_LEADER
+    
     try:
-        if not GH_TOKEN:
-            return None, "❌ GitHub Token 未設定"
+        claimed = await asyncio.to_thread(coordinator.claim_job, job_id, run_window)
+    except sqlite3.Error as e:
+        leader_log.error(f"❌ 無法認領工作 {job_id} [{run_window}]: {e}")
+        return JOB_UNAVAILABLE
+    if not claimed:
+        leader_log.info(f"⏭️  工作 {job_id} [{run_window}] 已由其他檢查或實例執行，略過")
+        return JOB_CLAIMED_ELSEWHERE
+    
+    succeeded = False
+    try:
+        await func(*args)
+        succeeded = True
+    finally:
+        await asyncio.to_thread(coordinator.finish_job, job_id, run_window, succeeded)
+    return JOB_RAN
+
+@tasks.loop(seconds=LEADER_RENEW_INTERVAL)
+async def renew_leader_lease():
+    """定期續約；資料庫無法存取時保守地放棄領導權"""
+    try:
+        acquired = await asyncio.to_thread(coordinator.acquire_lease, leader_lease_name(), LEADER_LEASE_TTL)
+    except sqlite3.Error as e:
+        leader_log.error(f"❌ 租約續約失敗: {e}")
+        acquired = False
+    
+    if acquired and not coordinator.is_leader:
+        leader_log.info(f"👑 本實例成為領導者（{coordinator.instance_id}）")
+    elif not acquired and coordinator.is_leader:
+        leader_log.warning(f"⚠️ 本實例失去領導權（{coordinator.instance_id}）")
+    coordinator.is_leader = acquired
+    leader_elected.set()
+
+def build_leader_info_message():
+    """建立領導者與工作紀錄訊息"""
+    holder = coordinator.lease_holder(leader_lease_name())
+    
+    message = "👑 **領導者狀態**\n"
+    message += f"• 本實例: `{coordinator.instance_id}`{' 👈 領導者' if coordinator.is_leader else ''}\n"
+    if holder:
+        remaining = holder[1] - time.time()
+        state = f"剩餘 {remaining:.0f} 秒" if remaining > 0 else "已過期"
+        message += f"• 租約持有者: `{holder[0]}`（{state}）\n"
+    else:
+        message += "• 租約持有者: 無\n"
+    message += f"• 狀態資料庫: `{STATE_DB_PATH}`\n"
+    
+    jobs = coordinator.recent_jobs()
+    if jobs:
+        message += "\n📋 **最近的工作**\n"
+        for job_id, run_window, job_holder, started_at, status in jobs:
+            started = datetime.fromtimestamp(started_at).strftime('%m/%d %H:%M')
+            icon = "✅" if status == "done" else "⏳"
+            message += f"{icon} `{job_id}` [{run_window}] {started} · `{job_holder}`\n"
+    return message
+
+async def run_interval_check(since_date):
+    """間隔檢查的報告內容；抓取失敗時拋出例外，讓工作紀錄釋放以便重試"""
+    prs, error = await asyncio.to_thread(get_merged_prs_since, since_date)
+    
+    if error:
+        raise RuntimeError(f"檢查新 PR 失敗: {error}")
+    
+    if prs:
+        scheduler_log.info(f"📝 發現 {len(prs)} 個新合併的 PR")
+        changelog_content = generate_changelog(prs)
         
-        headers = {
-            'Authorization': f'token {GH_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
+        if changelog_content and CHANGELOG_CHANNEL_ID:
+            if not await send_changelog_to_channel(changelog_content):
+                raise RuntimeError("手動每周報告發送失敗")
+            scheduler_log.info("✅ 手動每周報告發送成功")
+    else:
+        scheduler_log.info("📭 本周沒有新合併的 PR")
+
+# 保留您原有的手動檢查任務（但排程系統會使用新的檢查邏輯）
+@tasks.loop(hours=24)
+async def check_new_prs_task():
+    """定期檢查新合併的 PR（保留原有功能）"""
+    global last_check_time
+    
+    try:
+        # 檢查是否達到設定的間隔天數
+        time_since_last_check = datetime.now() - last_check_time
+        if time_since_last_check.days < CHECK_INTERVAL_DAYS:
+            next_check = last_check_time + timedelta(days=CHECK_INTERVAL_DAYS)
+            scheduler_log.info(f"⏰ 下次手動檢查時間: {next_check.strftime('%Y-%m-%d %H:%M')}")
+            return
         
-        url = f'https://api.github.com/search/issues'
-        query = f'repo:{GITHUB_OWNER}/{GITHUB_REPO} is:pr is:merged merged:>={since_date}'
-        params = {'q': query, 'sort': 'updated', 'order': 'desc'}
+        scheduler_log.info(f"🔍 進行手動每周檢查（間隔: {CHECK_INTERVAL_DAYS}天）...")
         
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
+        since_date = last_check_time.strftime("%Y-%m-%d")
+        # 與週一排程檢查共用同一個工作 ID，同一週只會有一份報告
+        outcome = await run_job_once(WEEKLY_REPORT_JOB, current_report_window(), run_interval_check, since_date)
+        if outcome not in (JOB_RAN, JOB_CLAIMED_ELSEWHERE):
+            # 沒有實際執行也沒有其他實例負責：保留檢查時間，下一輪再試
+            scheduler_log.info(f"ℹ️  手動檢查未執行（{outcome}），明天再試")
+            return
         
-        data = response.json()
-        return data.get('items', []), None
+        last_check_time = datetime.now()
+        scheduler_log.info(f"✅ 手動檢查完成，下次檢查在 {CHECK_INTERVAL_DAYS} 天後")
         
     except Exception as e:
-        return None, f"❌ 獲取 PR 時出錯: {str(e)}"
+        scheduler_log.exception(f"❌ 手動定期檢查任務錯誤: {str(e)}")
 
-def generate_changelog(prs):
-    """生成精簡的 changelog"""
-    if not prs:
-        return None
+check_new_prs_task.before_loop(wait_for_leader_election)
+
+# ===== 事件訂閱：依 (repo, 事件類型, workflow/標籤, 分支, 結果) 把事件路由到多個頻道 =====
+
+# 輪詢 GitHub 新事件的間隔（秒）；只有領導者輪詢，游標存在狀態資料庫中
+EVENT_POLL_INTERVAL = int(os.getenv("EVENT_POLL_INTERVAL", "60"))
+SUBSCRIPTION_EVENT_TYPES = {'workflow': 'workflow run 完成', 'pr': 'PR 合併'}
+SUBSCRIPTION_WILDCARD = "*"
+# workflow run 可能的結果（GitHub 的 conclusion 欄位），訂閱時驗證，打錯字的訂閱永遠不會觸發
+WORKFLOW_CONCLUSIONS = ('success', 'failure', 'cancelled', 'skipped', 'timed_out',
+                        'action_required', 'neutral', 'stale', 'startup_failure')
+# 每次輪詢最多往回翻幾頁（每頁 50 筆）；兩次輪詢之間的事件超過這個數量時，較舊的會被略過並記錄警告
+EVENT_POLL_MAX_PAGES = int(os.getenv("EVENT_POLL_MAX_PAGES", "5"))
+EVENT_POLL_PAGE_SIZE = 50
+# 可以訂閱的 repo：設定的 repo 加上 SUBSCRIPTION_REPOS（逗號分隔的 owner/name）
+# Token 看得到的私有 repo 不應該讓任何有管理訊息權限的人轉發到自己的頻道
+SUBSCRIPTION_REPOS = {
+    repo.strip().lower()
+    for repo in [f"{GITHUB_OWNER}/{GITHUB_REPO}", *os.getenv("SUBSCRIPTION_REPOS", "").split(",")]
+    if repo.strip()
+}
+
+class Subscription:
+    """一筆訂閱；target 是 workflow 名稱（或檔名）或 PR 標籤，* 代表全部"""
+    __slots__ = ('id', 'channel_id', 'repo', 'event_type', 'target', 'branch', 'conclusion')
+
+    def __init__(self, id, channel_id, repo, event_type, target, branch, conclusion):
+        self.id = id
+        self.channel_id = channel_id
+        self.repo = repo
+        self.event_type = event_type
+        self.target = target
+        self.branch = branch
+        self.conclusion = conclusion
+
+    def key(self):
+        # repo、workflow 名稱與標籤不分大小寫：`ci` 也要對到 "CI"
+        return (self.repo.lower(), self.event_type, self.target.lower(), self.branch, self.conclusion)
+
+    def describe(self):
+        target = "全部" if self.target == SUBSCRIPTION_WILDCARD else f"`{self.target}`"
+        branch = "全部分支" if self.branch == SUBSCRIPTION_WILDCARD else f"🎯 {self.branch}"
+        text = f"`#{self.id}` {SUBSCRIPTION_EVENT_TYPES[self.event_type]} · {target} · {branch}"
+        if self.conclusion != SUBSCRIPTION_WILDCARD:
+            text += f" · 只通知 {self.conclusion}"
+        return f"{text} · 📦 {self.repo}"
+
+class SubscriptionStore:
+    """以 SQLite 儲存訂閱，並在記憶體中編譯成索引
+
+    索引的鍵是 (repo, 事件類型, 目標, 分支, 結果)，值是該鍵的訂閱；
+    路由一個事件只需探測目標 × 分支 × 結果的萬用字元組合，
+    耗時與符合的訂閱數成正比，與訂閱總數無關
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}
+        self._conn = None
+        self._lock = threading.Lock()
+        self._data_version = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS subscriptions ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, channel_id INTEGER NOT NULL, repo TEXT NOT NULL, "
+                "event_type TEXT NOT NULL, target TEXT NOT NULL, branch TEXT NOT NULL, conclusion TEXT NOT NULL, "
+                "UNIQUE (channel_id, repo, event_type, target, branch, conclusion))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS event_cursors ("
+                "repo TEXT NOT NULL, event_type TEXT NOT NULL, cursor TEXT NOT NULL, PRIMARY KEY (repo, event_type))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def refresh(self):
+        """其他實例修改過資料庫時重新編譯索引（PRAGMA data_version 只在別的連線寫入後改變）"""
+        with self._lock:
+            conn = self._connect()
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return
+            index = {}
+            for row in conn.execute("SELECT id, channel_id, repo, event_type, target, branch, conclusion FROM subscriptions"):
+                subscription = Subscription(*row)
+                index.setdefault(subscription.key(), {})[subscription.id] = subscription
+            self.index = index
+            self._data_version = version
+
+    def add(self, channel_id, repo, event_type, target, branch, conclusion):
+        """新增訂閱；同一頻道已有相同訂閱時回傳 None"""
+        with self._lock:
+            cursor = self._connect().execute(
+                "INSERT OR IGNORE INTO subscriptions (channel_id, repo, event_type, target, branch, conclusion) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (channel_id, repo, event_type, target, branch, conclusion),
+            )
+            if cursor.rowcount != 1:
+                return None
+            subscription = Subscription(cursor.lastrowid, channel_id, repo, event_type, target, branch, conclusion)
+            self.index.setdefault(subscription.key(), {})[subscription.id] = subscription
+            return subscription
+
+    def remove(self, subscription_id, channel_id):
+        """刪除此頻道的訂閱；回傳是否有刪除"""
+        with self._lock:
+            row = self._connect().execute(
+                "DELETE FROM subscriptions WHERE id = ? AND channel_id = ? "
+                "RETURNING repo, event_type, target, branch, conclusion",
+                (subscription_id, channel_id),
+            ).fetchone()
+            if row is None:
+                return False
+            key = Subscription(subscription_id, channel_id, *row).key()
+            bucket = self.index.get(key, {})
+            bucket.pop(subscription_id, None)
+            if not bucket:
+                self.index.pop(key, None)
+            return True
+
+    def for_channel(self, channel_id):
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, channel_id, repo, event_type, target, branch, conclusion FROM subscriptions "
+                "WHERE channel_id = ? ORDER BY id",
+                (channel_id,),
+            ).fetchall()
+        return [Subscription(*row) for row in rows]
+
+    def event_types_by_repo(self):
+        """需要輪詢的 repo 與各自的事件類型"""
+        with self._lock:
+            keys = list(self.index)
+        repos = {}
+        for repo, event_type, *_ in keys:
+            repos.setdefault(repo, set()).add(event_type)
+        return repos
+
+    def match(self, repo, event_type, targets, branch, conclusion):
+        """回傳符合事件的訂閱（同一筆只出現一次）"""
+        matched = {}
+        repo = repo.lower()
+        with self._lock:
+            for target in {*(target.lower() for target in targets), SUBSCRIPTION_WILDCARD}:
+                for branch_key in {branch, SUBSCRIPTION_WILDCARD}:
+                    for conclusion_key in {conclusion, SUBSCRIPTION_WILDCARD}:
+                        matched.update(self.index.get((repo, event_type, target, branch_key, conclusion_key), ()))
+        return list(matched.values())
+
+    def get_cursor(self, repo, event_type):
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT cursor FROM event_cursors WHERE repo = ? AND event_type = ?", (repo, event_type)
+            ).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def set_cursor(self, repo, event_type, value):
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO event_cursors (repo, event_type, cursor) VALUES (?, ?, ?) "
+                "ON CONFLICT(repo, event_type) DO UPDATE SET cursor = excluded.cursor",
+                (repo, event_type, value.isoformat()),
+            )
+
+subscription_store = SubscriptionStore(STATE_DB_PATH)
+
+def fetch_event_pages(repo, event_type, path, params, cursor):
+    """由新到舊逐頁抓取，直到某頁出現游標以前（updated_at）的項目；第一次輪詢（沒有游標）只抓一頁"""
+    items = []
+    for page in range(1, EVENT_POLL_MAX_PAGES + 1):
+        response = github_get(path, params={**params, 'per_page': EVENT_POLL_PAGE_SIZE, 'page': page})
+        response.raise_for_status()
+        data = decode_json(response)
+        page_items = data.get('workflow_runs', []) if event_type == 'workflow' else data
+        items.extend(page_items)
+        if (cursor is None or len(page_items) < EVENT_POLL_PAGE_SIZE
+                or any(parse_github_time(item['updated_at']) <= cursor for item in page_items)):
+            return items
+    event_log.warning(f"⚠️ {repo} 的 {event_type} 事件在兩次輪詢之間超過 {len(items)} 筆，較舊的事件不會通知")
+    return items
+
+def collect_subscribed_events(repo, event_types):
+    """抓取 repo 在游標之後的新事件，回傳 (事件列表, 新游標)
+
+    事件是 (事件類型, 目標列表, 分支, 結果, 紀錄)；第一次輪詢只記錄游標、不發送，避免把舊事件洗進頻道
+    """
+    events = []
+    cursors = {}
+    if 'workflow' in event_types:
+        cursor = subscription_store.get_cursor(repo, 'workflow')
+        items = fetch_event_pages(repo, 'workflow', f'/repos/{repo}/actions/runs', {'status': 'completed'}, cursor)
+        runs = [WorkflowRun.from_json(item) for item in items]
+        for run in runs:
+            if cursor is not None and run.updated_at > cursor:
+                targets = (run.name, os.path.basename(run.path)) if run.path else (run.name,)
+                events.append(('workflow', targets, run.head_branch, run.conclusion, run))
+        newest = max((run.updated_at for run in runs), default=None)
+        if newest and (cursor is None or newest > cursor):
+            cursors['workflow'] = newest
+    
+    if 'pr' in event_types:
+        cursor = subscription_store.get_cursor(repo, 'pr')
+        items = fetch_event_pages(repo, 'pr', f'/repos/{repo}/pulls',
+                                  {'state': 'closed', 'sort': 'updated', 'direction': 'desc'}, cursor)
+        merged = [(MergedPR.from_pull(item), intern_text(item['base']['ref']))
+                  for item in items if item.get('merged_at')]
+        for pr, base_branch in merged:
+            if cursor is not None and pr.merged_at > cursor:
+                events.append(('pr', pr.labels, base_branch, SUBSCRIPTION_WILDCARD, pr))
+        newest = max((pr.merged_at for pr, _ in merged), default=None)
+        if newest and (cursor is None or newest > cursor):
+            cursors['pr'] = newest
+    
+    # 依時間由舊到新發送
+    events.sort(key=lambda event: event[4].updated_at if event[0] == 'workflow' else event[4].merged_at)
+    return events, cursors
+
+def format_subscription_event(repo, event):
+    """把事件轉成一行通知"""
+    event_type, _, branch, conclusion, record = event
+    if event_type == 'workflow':
+        emoji = {'success': '✅', 'failure': '❌', 'cancelled': '⏹️', 'skipped': '⏭️', 'timed_out': '⌛'}.get(conclusion, '❓')
+        return (f"{emoji} **{record.name}** [#{record.run_number}]({record.html_url}) {conclusion} · "
+                f"🎯 {branch} · 📦 {repo}")
+    labels = f" · 🏷️ {', '.join(record.labels)}" if record.labels else ""
+    return (f"🔀 已合併 [#{record.number}]({record.html_url}) {record.title} · 👤 {record.author} · "
+            f"🎯 {branch}{labels} · 📦 {repo}")
+
+@tasks.loop(seconds=EVENT_POLL_INTERVAL)
+async def poll_subscribed_events():
+    """領導者輪詢訂閱中的 repo，把新事件依索引送到各頻道
+
+    一個 repo 的游標只在它路由到的每個頻道都發送成功後才推進；暫時性的失敗下次會重送
+    （已成功的頻道可能收到重複的通知），頻道不存在或沒有權限則視為永久失敗，不擋住游標
+    """
+    if not coordinator.is_leader:
+        return
     
-    # 計算時間範圍
-    start_date = (datetime.now() - timedelta(days=CHECK_INTERVAL_DAYS)).strftime("%Y-%m-%d")
-    end_date = datetime.now().strftime("%Y-%m-%d")
+    try:
+        await asyncio.to_thread(subscription_store.refresh)
+    except sqlite3.Error as e:
+        event_log.error(f"❌ 無法載入訂閱: {e}")
+        return
     
-    changelog = f"📊 **每周更新報告 ({start_date} ~ {end_date})**\n\n"
-    changelog += f"本周共合併了 **{len(prs)}** 個 PR\n\n"
+    outbox = {}
+    channel_repos = {}
+    new_cursors = []
+    for repo, event_types in subscription_store.event_types_by_repo().items():
+        if repo not in SUBSCRIPTION_REPOS:
+            event_log.warning(f"⚠️ {repo} 不在允許訂閱的 repo 中，略過")
+            continue
+        try:
+            events, cursors = await asyncio.to_thread(collect_subscribed_events, repo, event_types)
+        except Exception as e:
+            event_log.warning(f"⚠️ 無法取得 {repo} 的事件: {e}")
+            continue
+        for event in events:
+            for subscription in subscription_store.match(repo, *event[:4]):
+                lines = outbox.setdefault(subscription.channel_id, [])
+                channel_repos.setdefault(subscription.channel_id, set()).add(repo)
+                line = format_subscription_event(repo, event)
+                if line not in lines:
+                    lines.append(line)
+        new_cursors.extend((repo, event_type, value) for event_type, value in cursors.items())
     
-    for pr in prs:
-        pr_number = pr['number']
-        pr_title = pr['title']
-        pr_url = pr['html_url']
-        author = pr['user']['login']
-        merged_at = pr['pull_request']['merged_at']
-        
-        # 格式化時間
-        merged_time = datetime.fromisoformat(merged_at.replace('Z', '+00:00'))
-        formatted_time = merged_time.strftime("%m/%d")
-        
-        changelog += f"• [#{pr_number}]({pr_url}) {pr_title}\n"
-        changelog += f"  👤 {author} | 📅 {formatted_time}\n\n"
+    undelivered = set()
+    for channel_id, lines in outbox.items():
+        try:
+            channel = await resolve_channel(channel_id)
+        except discord.HTTPException as e:
+            event_log.warning(f"⚠️ 無法取得訂閱的頻道 {channel_id}: {e}")
+            undelivered |= channel_repos[channel_id]
+            continue
+        if channel is None:
+            event_log.warning(f"⚠️ 找不到訂閱的頻道 {channel_id}")
+            continue
+        try:
+            for part in split_message("\n".join(lines)):
+                await channel.send(part)
+        except (discord.NotFound, discord.Forbidden) as e:
+            event_log.warning(f"⚠️ 頻道 {channel_id} 已不存在或沒有權限，略過: {e}")
+        except discord.HTTPException as e:
+            event_log.warning(f"⚠️ 無法發送事件到頻道 {channel_id}，下次重送: {e}")
+            undelivered |= channel_repos[channel_id]
+    if outbox:
+        event_log.info(f"📬 已路由 {sum(map(len, outbox.values()))} 則事件到 {len(outbox)} 個頻道")
     
-    changelog += f"💡 使用 `!changelog {CHECK_INTERVAL_DAYS}` 查看詳細內容"
-    return changelog
+    for repo, event_type, value in new_cursors:
+        if repo not in undelivered:
+            await asyncio.to_thread(subscription_store.set_cursor, repo, event_type, value)
 
-# 保留您原有的手動檢查任務（但排程系統會使用新的檢查邏輯）
-@tasks.loop(hours=24)
-async def check_new_prs_task():
-    """定期檢查新合併的 PR（保留原有功能）"""
-    global last_check_time
+poll_subscribed_events.before_loop(wait_for_leader_election)
+
+def add_subscription(channel_id, event_type, target=None, branch=None, conclusion=None, repo=None):
+    """驗證參數並新增訂閱，回傳要顯示的訊息"""
+    event_type = (event_type or "").lower()
+    if event_type not in SUBSCRIPTION_EVENT_TYPES:
+        return f"❌ 未知的事件類型，可用: {', '.join(SUBSCRIPTION_EVENT_TYPES)}"
+    repo = repo or f"{GITHUB_OWNER}/{GITHUB_REPO}"
+    if repo.count('/') != 1:
+        return "❌ repo 格式應為 `owner/name`"
+    if repo.lower() not in SUBSCRIPTION_REPOS:
+        return f"❌ 只能訂閱這些 repo: {', '.join(sorted(SUBSCRIPTION_REPOS))}（管理員可用 SUBSCRIPTION_REPOS 設定）"
+    conclusion = (conclusion or SUBSCRIPTION_WILDCARD).lower()
+    if event_type == 'pr' and conclusion != SUBSCRIPTION_WILDCARD:
+        return "❌ PR 訂閱不支援結果篩選"
+    if conclusion != SUBSCRIPTION_WILDCARD and conclusion not in WORKFLOW_CONCLUSIONS:
+        return f"❌ 未知的結果 `{conclusion}`，可用: {', '.join(WORKFLOW_CONCLUSIONS)}"
     
-    try:
-        # 檢查是否達到設定的間隔天數
-        time_since_last_check = datetime.now() - last_check_time
-        if time_since_last_check.days < CHECK_INTERVAL_DAYS:
-            next_check = last_check_time + timedelta(days=CHECK_INTERVAL_DAYS)
-            print(f"⏰ 下次手動檢查時間: {next_check.strftime('%Y-%m-%d %H:%M')}")
-            return
-        
-        print(f"🔍 進行手動每周檢查（間隔: {CHECK_INTERVAL_DAYS}天）...")
-        
-        since_date = last_check_time.strftime("%Y-%m-%d")
-        prs, error = get_merged_prs_since(since_date)
-        
-        if error:
-            print(f"❌ 手動檢查新 PR 失敗: {error}")
-            return
-        
-        if prs:
-            print(f"📝 發現 {len(prs)} 個新合併的 PR")
-            changelog_content = generate_changelog(prs)
-            
-            if changelog_content and CHANGELOG_CHANNEL_ID:
-                success = await send_changelog_to_channel(changelog_content)
-                if success:
-                    print("✅ 手動每周報告發送成功")
-        else:
-            print("📭 本周沒有新合併的 PR")
-        
-        last_check_time = datetime.now()
-        print(f"✅ 手動檢查完成，下次檢查在 {CHECK_INTERVAL_DAYS} 天後")
-        
-    except Exception as e:
-        print(f"❌ 手動定期檢查任務錯誤: {str(e)}")
+    subscription = subscription_store.add(
+        channel_id, repo, event_type, target or SUBSCRIPTION_WILDCARD, branch or SUBSCRIPTION_WILDCARD, conclusion
+    )
+    if subscription is None:
+        return "ℹ️ 此頻道已有相同的訂閱"
+    return f"✅ 已訂閱 {subscription.describe()}"
+
+def remove_subscription(channel_id, subscription_id):
+    """刪除此頻道的訂閱，回傳要顯示的訊息"""
+    if subscription_store.remove(subscription_id, channel_id):
+        return f"⏹️ 已取消訂閱 `#{subscription_id}`"
+    return f"❌ 此頻道沒有訂閱 `#{subscription_id}`"
+
+def build_subscriptions_message(channel_id):
+    """列出此頻道的訂閱"""
+    subscriptions = subscription_store.for_channel(channel_id)
+    if not subscriptions:
+        return "📭 此頻道沒有任何訂閱，使用 `!subscribe` 新增"
+    message = "📬 **此頻道的訂閱**\n"
+    message += "\n".join(subscription.describe() for subscription in subscriptions)
+    message += f"\n\n⏱️ 每 {EVENT_POLL_INTERVAL} 秒檢查一次新事件"
+    return message
 
 # 修改 on_ready 事件，同時啟動手動檢查和排程檢查
 @bot.event
 async def on_ready():
-    print(f"✅ 已登入為 {bot.user}")
-    print(f"🤖 Bot 已準備好接收指令！")
-    print(f"🌐 運行環境: {'Render' if not os.path.exists('.env') else '本地'}")
+    if 'ready' not in startup_timings:
+        startup_timings['ready'] = time.perf_counter() - PROCESS_START
+        log.info(f"⏱️ 啟動到 on_ready: {startup_timings['ready']:.2f} 秒")
+        if STARTUP_PROBE:
+            print("STARTUP_PROFILE " + json.dumps(startup_timings), flush=True)
+            await bot.close()
+            return
+    
+    log.info(f"✅ 已登入為 {bot.user}")
+    log.info(f"🤖 Bot 已準備好接收指令！")
+    log.info(f"🌐 運行環境: {'Render' if not os.path.exists('.env') else '本地'}")
     
     # 計算下次排程檢查時間
     next_schedule_check = get_next_monday()
-    print(f"⏰ 下次排程檢查時間: {next_schedule_check.strftime('%Y-%m-%d %H:%M UTC')}")
-    print(f"⏰ 台灣時間: {(next_schedule_check + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M')}")
+    log.info(f"⏰ 下次排程檢查時間: {next_schedule_check.strftime('%Y-%m-%d %H:%M UTC')}")
+    log.info(f"⏰ 台灣時間: {(next_schedule_check + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M')}")
     
-    if CHANGELOG_CHANNEL_ID:
-        print(f"📊 自動檢查已啟用，頻道: {CHANGELOG_CHANNEL_ID}")
+    # 所有實例都參與選舉；排程報告與看板更新只由領導者執行
+    if not renew_leader_lease.is_running():
+        renew_leader_lease.start()
+    
+    # 事件訂閱和排程一樣只在負責排程的分片輪詢，避免叢集中各 worker 重複發送
+    if is_scheduler_shard() and not poll_subscribed_events.is_running():
+        poll_subscribed_events.start()
+    
+    if not refresh_live_boards.is_running():
+        load_live_boards()
+        refresh_live_boards.start()
+        if live_boards:
+            log.info(f"📡 已載入 {len(live_boards)} 個即時看板")
+    
+    if SHARDED:
+        log.info(f"🧩 分片模式: 本程序負責分片 {sorted(bot.shards)} / 共 {bot.shard_count} 個"
+              + (f"（叢集 {CLUSTER_ID}）" if CLUSTER_ID else ""))
+    
+    if not is_scheduler_shard():
+        log.info(f"ℹ️  排程任務由分片 {SCHEDULER_SHARD_ID} 負責，本程序不啟動排程")
+    elif CHANGELOG_CHANNEL_ID:
+        log.info(f"📊 自動檢查已啟用，頻道: {CHANGELOG_CHANNEL_ID}")
+        
+        # on_ready 在重新連線後可能再次觸發，避免重複啟動
+        if check_new_prs_task.is_running():
+            return
         
         # 啟動手動檢查任務（保留原有功能）
         check_new_prs_task.start()
         
         # 啟動排程器線程
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
+        scheduler_thread = threading.Thread(target=run_scheduler, name="scheduler", daemon=True)
         scheduler_thread.start()
         
         # 啟動事件檢查任務
         check_scheduled_events.start()
         
-        print("✅ 雙重檢查系統已啟動（手動 + 排程）")
+        log.info("✅ 雙重檢查系統已啟動（手動 + 排程）")
     else:
-        print("ℹ️  自動檢查未啟用（未設定 CHANGELOG_CHANNEL_ID）")
+        log.info("ℹ️  自動檢查未啟用（未設定 CHANGELOG_CHANNEL_ID）")
+
+@bot.before_invoke
+async def bind_command_log_context(ctx):
+    """前綴指令執行前設定日誌上下文、扣除額度並開始 trace"""
+    bind_log_context(f"!{ctx.command.qualified_name}", ctx.author, ctx.guild)
+    admission_check(ctx)
+    ctx.trace_root = start_trace(f"!{ctx.command.qualified_name}")
+    command_log.info(f"📨 收到指令 !{ctx.command.qualified_name}")
+
+@bot.after_invoke
+async def finish_command_trace(ctx):
+    """前綴指令結束（包含失敗）時結束 trace"""
+    finish_span(getattr(ctx, 'trace_root', None), "command_failed" if ctx.command_failed else None)
+    if not ctx.command_failed:
+        mark_first_response(f"!{ctx.command.qualified_name}")
 
 # 保留您原有的所有指令
-@bot.command()
-async def check_settings(ctx):
-    """查看當前檢查設定"""
+def build_check_settings_message():
+    """產生檢查設定訊息"""
     next_manual_check = last_check_time + timedelta(days=CHECK_INTERVAL_DAYS)
     next_schedule_check = get_next_monday()
     
-    message = (
+    return (
         f"⚙️ **當前設定**\n"
         f"**手動檢查系統**\n"
         f"• 檢查頻率: 每 {CHECK_INTERVAL_DAYS} 天\n"
@@ -1029,38 +5304,92 @@ async def check_settings(ctx):
         f"• 台灣時間: {(next_schedule_check + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M')}\n\n"
         f"• 自動發送: {'✅ 已啟用' if CHANGELOG_CHANNEL_ID else '❌ 未啟用'}"
     )
-    
-    await ctx.send(message)
 
 @bot.command()
-@commands.has_permissions(administrator=True)
-async def force_check(ctx):
-    """強制立即執行檢查"""
+async def check_settings(ctx):
+    """查看當前檢查設定"""
+    await ctx.send(build_check_settings_message())
+
+def preview_new_prs():
+    """查詢上次檢查後合併的 PR（只回傳內容，不發送到頻道）"""
     global last_check_time
     
-    await ctx.send("🔄 強制執行檢查中...")
+    since_date = last_check_time.strftime("%Y-%m-%d")
+    info = {}
+    prs, error = get_merged_prs_since(since_date, info=info)
+    
+    if error:
+        return error
+    
+    last_check_time = datetime.now()
+    if prs:
+        return generate_changelog(prs, info)
+    return "📭 沒有找到新的 PR"
+
+async def perform_force_check():
+    """強制執行檢查並回傳結果訊息"""
+    global last_check_time
     
     since_date = last_check_time.strftime("%Y-%m-%d")
-    prs, error = get_merged_prs_since(since_date)
+    info = {}
+    prs, error = await call_with_deadline(get_merged_prs_since, since_date, None, info)
     
     if error:
-        await ctx.send(error)
-        return
+        return error
     
     if prs:
-        changelog_content = generate_changelog(prs)
+        changelog_content = generate_changelog(prs, info)
         if CHANGELOG_CHANNEL_ID:
             success = await send_changelog_to_channel(changelog_content)
             if success:
-                await ctx.send("✅ 強制檢查完成，報告已發送")
+                result = "✅ 強制檢查完成，報告已發送"
             else:
-                await ctx.send("✅ 強制檢查完成，但發送失敗")
+                result = "✅ 強制檢查完成，但發送失敗"
         else:
-            await ctx.send(f"✅ 強制檢查完成，找到 {len(prs)} 個PR\n{changelog_content}")
+            result = f"✅ 強制檢查完成，找到 {len(prs)} 個PR\n{changelog_content}"
     else:
-        await ctx.send("📭 沒有找到新的 PR")
+        result = "📭 沒有找到新的 PR"
     
     last_check_time = datetime.now()
+    return result
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def force_check(ctx):
+    """強制立即執行檢查"""
+    await ctx.send("🔄 強制執行檢查中...")
+    result = await perform_force_check()
+    await ctx.send(result)
+
+@serve_stale_on_outage
+def build_detailed_changelog(days):
+    """產生最近 N 天的詳細更新日誌"""
+    since_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    info = {}
+    prs, error = get_merged_prs_since(since_date, info=info)
+    
+    if error:
+        return error
+    
+    if not prs:
+        return f"📭 最近 {days} 天沒有合併的 PR"
+    
+    with trace_span("format changelog", prs=len(prs)):
+        detailed_changelog = f"🚀 **最近 {days} 天更新日誌**\n\n"
+        detailed_changelog += format_search_split_note(info)
+        for pr in prs:
+            pr_number = pr.number
+            pr_title = pr.title
+            pr_url = pr.html_url
+            author = pr.author
+            
+            formatted_time = pr.merged_at.strftime("%m/%d %H:%M")
+            
+            detailed_changelog += f"**#{pr_number}** - {pr_title}\n"
+            detailed_changelog += f"⏰ {formatted_time} | 👤 {author}\n"
+            detailed_changelog += f"🔗 [查看PR]({pr_url})\n\n"
+    
+    return detailed_changelog
 
 @bot.command()
 async def changelog(ctx, days: int = None):
@@ -1073,34 +5402,11 @@ async def changelog(ctx, days: int = None):
         return
     
     wait_msg = await ctx.send(f"🔄 正在生成最近 {days} 天的更新日誌...")
-    
-    since_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
-    prs, error = get_merged_prs_since(since_date)
-    
-    if error:
-        await wait_msg.edit(content=error)
-        return
-    
-    if not prs:
-        await wait_msg.edit(content=f"📭 最近 {days} 天沒有合併的 PR")
-        return
-    
-    detailed_changelog = f"🚀 **最近 {days} 天更新日誌**\n\n"
-    for pr in prs:
-        pr_number = pr['number']
-        pr_title = pr['title']
-        pr_url = pr['html_url']
-        merged_at = pr['pull_request']['merged_at']
-        author = pr['user']['login']
-        
-        merged_time = datetime.fromisoformat(merged_at.replace('Z', '+00:00'))
-        formatted_time = merged_time.strftime("%m/%d %H:%M")
-        
-        detailed_changelog += f"**#{pr_number}** - {pr_title}\n"
-        detailed_changelog += f"⏰ {formatted_time} | 👤 {author}\n"
-        detailed_changelog += f"🔗 [查看PR]({pr_url})\n\n"
-    
-    await wait_msg.edit(content=detailed_changelog)
+    detailed_changelog = await call_with_deadline(build_detailed_changelog, days)
+    parts = split_message(detailed_changelog)
+    await wait_msg.edit(content=parts[0])
+    for part in parts[1:]:
+        await ctx.send(part)
 
 @bot.command()
 async def hi(ctx):
@@ -1109,47 +5415,222 @@ async def hi(ctx):
 @bot.command()
 async def build_status(ctx):
     """查詢最近一次的 CI/CD 建置狀態"""
-    print(f"收到 build_status 指令來自 {ctx.author}")
     wait_msg = await ctx.send("🔄 正在查詢建置狀態...")
-    status_message = get_latest_build_status()
+    status_message = await call_with_deadline(get_latest_build_status)
     await wait_msg.edit(content=status_message)
-    print(f"已回覆建置狀態")
+    command_log.debug(f"已回覆建置狀態")
 
 @bot.command()
 async def last_commit(ctx):
     """查詢最近一次的 commit 訊息"""
-    print(f"📨 收到 last_commit 指令來自 {ctx.author}")
     wait_msg = await ctx.send("🔄 正在查詢最新 commit...")
-    commit_info = get_latest_commit()
+    commit_info = await call_with_deadline(get_latest_commit)
     await wait_msg.edit(content=commit_info)
-    print(f"✅ 已回覆 commit 資訊")
+    command_log.debug(f"✅ 已回覆 commit 資訊")
+
+@bot.command()
+async def commits(ctx, range_spec: str = None):
+    """顯示兩個 commit 之間的提交：!commits <起點>..<終點>"""
+    if not range_spec:
+        await ctx.send("❌ 請指定範圍，例如 `!commits v1.0..main` 或 `!commits abc1234..def5678`")
+        return
+    wait_msg = await ctx.send("🔄 正在查詢 commit 範圍...")
+    parts = split_message(await call_with_deadline(get_commit_range, range_spec))
+    await wait_msg.edit(content=parts[0])
+    for part in parts[1:]:
+        await ctx.send(part)
 
 @bot.command()
 async def pipeline_status(ctx, workflow_file=None):
     """查詢 GitHub Actions Pipeline 狀態"""
-    print(f"📊 收到 pipeline_status 指令來自 {ctx.author}")
     wait_msg = await ctx.send("🔄 正在查詢 GitHub Actions 狀態...")
     
     if workflow_file and workflow_file.lower() == 'list':
-        workflow_list = get_workflow_list()
+        workflow_list = await call_with_deadline(get_workflow_list)
         await wait_msg.edit(content=workflow_list)
+    elif workflow_file and workflow_file.lower() == 'all':
+        parts = split_message(await call_with_deadline(get_workflow_matrix))
+        await wait_msg.edit(content=parts[0])
+        for part in parts[1:]:
+            await ctx.send(part)
     else:
-        status_message = get_workflow_status(workflow_file)
+        status_message = await call_with_deadline(get_workflow_status, workflow_file)
         await wait_msg.edit(content=status_message)
 
 @bot.command()
 async def workflow_list(ctx):
     """顯示可用的 GitHub Actions Workflows"""
     wait_msg = await ctx.send("🔄 正在獲取 workflow 列表...")
-    workflow_list = get_workflow_list()
+    workflow_list = await call_with_deadline(get_workflow_list)
     await wait_msg.edit(content=workflow_list)
+
+@bot.command()
+async def pipeline_chart(ctx, workflow: str = None, days: int = 7):
+    """產生 pipeline 耗時、成功率與合併吞吐量圖表"""
+    # 允許只給天數：!pipeline_chart 14
+    if workflow and workflow.isdigit():
+        workflow, days = None, int(workflow)
+    if not 1 <= days <= CHART_MAX_DAYS:
+        await ctx.send(f"❌ 天數必須介於 1 到 {CHART_MAX_DAYS} 之間")
+        return
+    
+    wait_msg = await ctx.send("🔄 正在產生 pipeline 圖表...")
+    png, summary = await get_pipeline_chart(workflow, days)
+    if png is None:
+        await wait_msg.edit(content=summary)
+        return
+    await wait_msg.delete()
+    await ctx.send(summary, file=discord.File(io.BytesIO(png), filename="pipeline_chart.png"))
+
+@bot.command()
+async def export(ctx, kind: str = None, days: int = 30, fmt: str = "csv"):
+    """匯出歷史資料為壓縮附件：!export changelog|runs <天數> [csv|json|md]"""
+    wait_msg = await ctx.send("🔄 正在逐頁匯出資料...")
+    file, summary = await run_export(kind, days, fmt)
+    if file is None:
+        await wait_msg.edit(content=summary)
+        return
+    await wait_msg.delete()
+    await ctx.send(summary, file=file)
+
+@bot.command()
+@commands.has_permissions(manage_messages=True)
+async def live_board(ctx, action: str = "on"):
+    """在此頻道啟用或停用即時狀態看板：!live_board on|off"""
+    if action.lower() == "off":
+        removed = await disable_live_board(ctx.channel)
+        await ctx.send("⏹️ 已停用此頻道的即時看板" if removed else "ℹ️ 此頻道沒有啟用即時看板")
+        return
+    
+    try:
+        await enable_live_board(ctx.channel)
+    except Exception as e:
+        await ctx.send(f"❌ 建立即時看板時出錯: {e}")
+        return
+    await ctx.send(f"✅ 已啟用即時看板，內容有變化時每 {LIVE_BOARD_INTERVAL} 秒內自動更新")
+
+@bot.command()
+async def why_failed(ctx, run: str = None):
+    """擷取失敗 workflow run 的錯誤日誌摘要"""
+    wait_msg = await ctx.send("🔄 正在下載並分析失敗日誌...")
+    # 日誌下載與解壓是阻塞 I/O，放到背景執行緒避免卡住事件迴圈
+    excerpt = await call_with_deadline(get_failed_run_excerpt, run, budget=LOG_SCAN_BUDGET)
+    await wait_msg.edit(content=excerpt)
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def memory(ctx, action: str = None):
+    """查看記憶體使用（管理員指令）：!memory [start|stop|前N名]"""
+    if action == "start":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        await ctx.send("✅ tracemalloc 已啟用，稍後再執行 `!memory` 查看配置熱點")
+        return
+    if action == "stop":
+        tracemalloc.stop()
+        await ctx.send("⏹️ tracemalloc 已停止")
+        return
+    
+    top_n = int(action) if action and action.isdigit() else 10
+    await ctx.send(get_memory_report(min(top_n, 25)))
+
+@bot.command()
+async def shard_info(ctx):
+    """查看分片延遲與伺服器分布"""
+    stats = get_shard_stats()
+    
+    message = "🧩 **分片狀態**\n"
+    if SHARDED:
+        message += f"• 總分片數: {bot.shard_count}\n"
+        message += f"• 本程序分片: {', '.join(str(s) for s, _, _ in stats)}"
+        message += f"（叢集 {CLUSTER_ID}）\n" if CLUSTER_ID else "\n"
+        message += f"• 排程分片: {SCHEDULER_SHARD_ID}\n\n"
+    else:
+        message += "• 模式: 單一連線（未分片）\n\n"
+    
+    for shard_id, latency, guild_count in stats:
+        current = " 👈" if ctx.guild and ctx.guild.shard_id == shard_id else ""
+        message += f"`#{shard_id}` 📶 {latency * 1000:.0f} ms | 🏠 {guild_count} 個伺服器{current}\n"
+    
+    await ctx.send(message)
+    
+@bot.command()
+async def rate_limits(ctx):
+    """查看自己的請求額度與准入統計"""
+    await ctx.send(build_rate_limits_message(ctx.author, ctx.guild))
+
+@bot.command()
+async def button_latency(ctx):
+    """查看各按鈕的首次回應與完成延遲百分位"""
+    for part in split_message(build_button_latency_message()):
+        await ctx.send(part)
+
+@bot.command()
+async def leader_info(ctx):
+    """查看領導者租約與最近的排程工作"""
+    await ctx.send(await asyncio.to_thread(build_leader_info_message))
+
+@bot.command()
+@commands.has_permissions(manage_messages=True)
+async def subscribe(ctx, event_type: str = None, target: str = None, branch: str = None,
+                    conclusion: str = None, repo: str = None):
+    """訂閱事件到此頻道：!subscribe workflow|pr [workflow 或標籤] [分支] [結果] [owner/repo]"""
+    if not event_type:
+        await ctx.send("❌ 用法: `!subscribe workflow CI main failure` 或 `!subscribe pr release`（`*` 代表全部）")
+        return
+    await ctx.send(await asyncio.to_thread(add_subscription, ctx.channel.id, event_type, target, branch, conclusion, repo))
+
+@bot.command()
+@commands.has_permissions(manage_messages=True)
+async def unsubscribe(ctx, subscription_id: int):
+    """取消此頻道的訂閱：!unsubscribe <編號>"""
+    await ctx.send(await asyncio.to_thread(remove_subscription, ctx.channel.id, subscription_id))
+
+@bot.command()
+async def subscriptions(ctx):
+    """列出此頻道的事件訂閱"""
+    await ctx.send(await asyncio.to_thread(build_subscriptions_message, ctx.channel.id))
     
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def profile(ctx, seconds: int = 10):
+    """對所有執行緒做取樣分析（管理員指令）：!profile [秒數]"""
+    if not 1 <= seconds <= PROFILE_MAX_SECONDS:
+        await ctx.send(f"❌ 秒數必須介於 1 到 {PROFILE_MAX_SECONDS} 之間")
+        return
+    wait_msg = await ctx.send(f"🔬 正在取樣 {seconds} 秒...")
+    summary, attachment = await run_profile(seconds)
+    if attachment is None:
+        await wait_msg.edit(content=summary)
+        return
+    await wait_msg.delete()
+    await ctx.send(summary, file=attachment)
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def slow_traces(ctx, limit: int = 5):
+    """查看最近最慢的指令 trace（管理員指令）：!slow_traces [數量]"""
+    for part in split_message(format_slow_traces(max(1, min(limit, 10)))):
+        await ctx.send(part)
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def log_level(ctx, subsystem: str = None, level: str = None):
+    """查看或調整日誌等級（管理員指令）：!log_level [子系統 等級]"""
+    if subsystem is None or level is None:
+        await ctx.send(format_log_levels())
+        return
+    try:
+        set_log_level(subsystem.lower(), level)
+    except ValueError as e:
+        await ctx.send(f"❌ {e}")
+        return
+    await ctx.send(f"✅ `{subsystem}` 日誌等級已設為 {level.upper()}")
+
 @bot.command()
 async def panel(ctx):
     """開啟 DevOps 控制台面板"""
-    embed = create_main_embed()
-    view = ControlPanelView()
-    await ctx.send(embed=embed, view=view)
+    await ctx.send(embed=create_main_embed(), view=get_control_panel_view())
 
 @bot.command()
 @commands.has_permissions(administrator=True)
@@ -1158,8 +5639,497 @@ async def update_panel(ctx):
     await send_control_panel()
     await ctx.send("✅ 已更新控制面板", ephemeral=True)
 
+# ===== 斜線指令（app_commands）：自動 defer，結果以僅自己可見的訊息回覆 =====
+
+def split_message(content, limit=2000):
+    """依行切割訊息，每段不超過 Discord 的長度限制"""
+    if len(content) <= limit:
+        return [content]
+    
+    parts = []
+    current = ""
+    for line in content.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            parts.append(current)
+            current = ""
+        current += line
+    if current:
+        parts.append(current)
+    return parts
+
+async def send_followup_chunks(interaction, content):
+    """以 followup 分段送出長訊息（僅自己可見）"""
+    parts = split_message(content)
+    with trace_span("Discord followup", parts=len(parts)):
+        for part in parts:
+            await interaction.followup.send(part, ephemeral=True)
+
+@bot.tree.command(name="build_status", description="查詢最近一次的 CI/CD 建置狀態")
+async def slash_build_status(interaction: discord.Interaction):
+    await respond_with_deadline(interaction, get_latest_build_status)
+
+@bot.tree.command(name="last_commit", description="查詢最近一次的 commit 訊息")
+async def slash_last_commit(interaction: discord.Interaction):
+    await respond_with_deadline(interaction, get_latest_commit)
+
+@bot.tree.command(name="commits", description="顯示兩個 commit 之間的提交")
+@app_commands.describe(range_spec="範圍，例如 v1.0..main 或 abc1234..def5678")
+async def slash_commits(interaction: discord.Interaction, range_spec: str):
+    await respond_with_deadline(interaction, get_commit_range, range_spec)
+
+@bot.tree.command(name="pipeline_status", description="查詢 GitHub Actions Pipeline 狀態")
+@app_commands.describe(workflow_file="workflow 檔案名稱或顯示名稱，輸入 list 顯示列表、all 顯示狀態矩陣")
+async def slash_pipeline_status(interaction: discord.Interaction, workflow_file: str = None):
+    if workflow_file and workflow_file.lower() == 'list':
+        await respond_with_deadline(interaction, get_workflow_list)
+    elif workflow_file and workflow_file.lower() == 'all':
+        await respond_with_deadline(interaction, get_workflow_matrix)
+    else:
+        await respond_with_deadline(interaction, get_workflow_status, workflow_file)
+
+@bot.tree.command(name="workflow_list", description="顯示可用的 GitHub Actions Workflows")
+async def slash_workflow_list(interaction: discord.Interaction):
+    await respond_with_deadline(interaction, get_workflow_list)
+
+@bot.tree.command(name="why_failed", description="擷取失敗 workflow run 的錯誤日誌摘要")
+@app_commands.describe(run="run 編號（例如 #42）或 run ID，預設為最近一次失敗")
+async def slash_why_failed(interaction: discord.Interaction, run: str = None):
+    await respond_with_deadline(interaction, get_failed_run_excerpt, run, budget=LOG_SCAN_BUDGET)
+
+@bot.tree.command(name="pipeline_chart", description="產生 pipeline 耗時、成功率與合併吞吐量圖表")
+@app_commands.describe(workflow="workflow 檔案名稱或顯示名稱（預設全部）", days="天數（1-30）")
+async def slash_pipeline_chart(interaction: discord.Interaction, workflow: str = None, days: app_commands.Range[int, 1, 30] = 7):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    png, summary = await get_pipeline_chart(workflow, days)
+    if png is None:
+        await interaction.followup.send(summary, ephemeral=True)
+        return
+    file = discord.File(io.BytesIO(png), filename="pipeline_chart.png")
+    await interaction.followup.send(summary, file=file, ephemeral=True)
+
+@bot.tree.command(name="export", description="匯出歷史資料為壓縮附件")
+@app_commands.describe(kind="匯出內容", days="查詢天數", fmt="檔案格式")
+@app_commands.choices(
+    kind=[app_commands.Choice(name="合併的 PR", value="changelog"), app_commands.Choice(name="workflow runs", value="runs")],
+    fmt=[app_commands.Choice(name=fmt, value=fmt) for fmt in EXPORT_FORMATS],
+)
+async def slash_export(interaction: discord.Interaction, kind: str,
+                       days: app_commands.Range[int, 1, EXPORT_MAX_DAYS] = 30, fmt: str = "csv"):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    file, summary = await run_export(kind, days, fmt)
+    if file is None:
+        await interaction.followup.send(summary, ephemeral=True)
+        return
+    await interaction.followup.send(summary, file=file, ephemeral=True)
+
+@bot.tree.command(name="live_board", description="在此頻道啟用或停用即時狀態看板")
+@app_commands.default_permissions(manage_messages=True)
+@app_commands.checks.has_permissions(manage_messages=True)
+@app_commands.describe(enabled="啟用或停用")
+async def slash_live_board(interaction: discord.Interaction, enabled: bool = True):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    if not enabled:
+        removed = await disable_live_board(interaction.channel)
+        await interaction.followup.send("⏹️ 已停用此頻道的即時看板" if removed else "ℹ️ 此頻道沒有啟用即時看板", ephemeral=True)
+        return
+    try:
+        await enable_live_board(interaction.channel)
+    except Exception as e:
+        await interaction.followup.send(f"❌ 建立即時看板時出錯: {e}", ephemeral=True)
+        return
+    await interaction.followup.send("✅ 已啟用即時看板", ephemeral=True)
+
+@bot.tree.command(name="changelog", description="顯示近期更新日誌")
+@app_commands.describe(days="查詢天數（1-30）")
+async def slash_changelog(interaction: discord.Interaction, days: app_commands.Range[int, 1, 30] = CHECK_INTERVAL_DAYS):
+    await respond_with_deadline(interaction, build_detailed_changelog, days)
+
+@bot.tree.command(name="check_settings", description="查看當前檢查設定")
+async def slash_check_settings(interaction: discord.Interaction):
+    await interaction.response.send_message(build_check_settings_message(), ephemeral=True)
+
+@bot.tree.command(name="schedule_info", description="查看當前排程設定")
+async def slash_schedule_info(interaction: discord.Interaction):
+    await interaction.response.send_message(build_schedule_info_message(), ephemeral=True)
+
+@bot.tree.command(name="shard_info", description="查看分片延遲與伺服器分布")
+async def slash_shard_info(interaction: discord.Interaction):
+    stats = get_shard_stats()
+    message = "🧩 **分片狀態**\n" + "\n".join(
+        f"`#{shard_id}` 📶 {latency * 1000:.0f} ms | 🏠 {guild_count} 個伺服器"
+        for shard_id, latency, guild_count in stats
+    )
+    await interaction.response.send_message(message, ephemeral=True)
+
+@bot.tree.command(name="rate_limits", description="查看自己的請求額度與准入統計")
+async def slash_rate_limits(interaction: discord.Interaction):
+    await interaction.response.send_message(build_rate_limits_message(interaction.user, interaction.guild), ephemeral=True)
+
+@bot.tree.command(name="button_latency", description="查看各按鈕的首次回應與完成延遲百分位")
+async def slash_button_latency(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True)
+    await send_followup_chunks(interaction, build_button_latency_message())
+
+@bot.tree.command(name="leader_info", description="查看領導者租約與最近的排程工作")
+async def slash_leader_info(interaction: discord.Interaction):
+    message = await asyncio.to_thread(build_leader_info_message)
+    await interaction.response.send_message(message, ephemeral=True)
+
+@bot.tree.command(name="subscribe", description="訂閱 workflow 或 PR 事件到此頻道")
+@app_commands.default_permissions(manage_messages=True)
+@app_commands.checks.has_permissions(manage_messages=True)
+@app_commands.describe(event_type="事件類型", target="workflow 名稱/檔名或 PR 標籤（預設全部）",
+                       branch="分支（預設全部）", conclusion="只通知特定結果，例如 failure（僅 workflow）",
+                       repo="owner/name（預設本專案）")
+@app_commands.choices(event_type=[app_commands.Choice(name=label, value=value)
+                                  for value, label in SUBSCRIPTION_EVENT_TYPES.items()])
+async def slash_subscribe(interaction: discord.Interaction, event_type: str,
+                          target: str = None, branch: str = None, conclusion: str = None, repo: str = None):
+    message = await asyncio.to_thread(add_subscription, interaction.channel_id, event_type, target, branch, conclusion, repo)
+    await interaction.response.send_message(message, ephemeral=True)
+
+@bot.tree.command(name="unsubscribe", description="取消此頻道的事件訂閱")
+@app_commands.default_permissions(manage_messages=True)
+@app_commands.checks.has_permissions(manage_messages=True)
+@app_commands.describe(subscription_id="訂閱編號（見 /subscriptions）")
+async def slash_unsubscribe(interaction: discord.Interaction, subscription_id: int):
+    message = await asyncio.to_thread(remove_subscription, interaction.channel_id, subscription_id)
+    await interaction.response.send_message(message, ephemeral=True)
+
+@bot.tree.command(name="subscriptions", description="列出此頻道的事件訂閱")
+async def slash_subscriptions(interaction: discord.Interaction):
+    message = await asyncio.to_thread(build_subscriptions_message, interaction.channel_id)
+    await interaction.response.send_message(message, ephemeral=True)
+
+@bot.tree.command(name="force_check", description="強制立即執行檢查（管理員指令）")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+async def slash_force_check(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    result = await perform_force_check()
+    await send_followup_chunks(interaction, result)
+
+@bot.tree.command(name="test_schedule", description="測試排程系統（管理員指令）")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+async def slash_test_schedule(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    try:
+        await execute_scheduled_check()
+    except ScheduledCheckFailed as e:
+        await interaction.followup.send(f"❌ 排程檢查失敗: {e}", ephemeral=True)
+        return
+    await interaction.followup.send("✅ 排程檢查完成", ephemeral=True)
+
+@bot.tree.command(name="memory", description="查看記憶體使用（管理員指令）")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(top_n="tracemalloc 顯示前幾名")
+async def slash_memory(interaction: discord.Interaction, top_n: app_commands.Range[int, 1, 25] = 10):
+    await interaction.response.send_message(get_memory_report(top_n), ephemeral=True)
+
+@bot.tree.command(name="profile", description="對所有執行緒做取樣分析（管理員指令）")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(seconds="取樣秒數")
+async def slash_profile(interaction: discord.Interaction, seconds: app_commands.Range[int, 1, PROFILE_MAX_SECONDS] = 10):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    summary, attachment = await run_profile(seconds)
+    if attachment is None:
+        await interaction.followup.send(summary, ephemeral=True)
+    else:
+        await interaction.followup.send(summary, file=attachment, ephemeral=True)
+
+@bot.tree.command(name="slow_traces", description="查看最近最慢的指令 trace（管理員指令）")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(limit="顯示幾個 trace")
+async def slash_slow_traces(interaction: discord.Interaction, limit: app_commands.Range[int, 1, 10] = 5):
+    await interaction.response.defer(ephemeral=True)
+    await send_followup_chunks(interaction, format_slow_traces(limit))
+
+@bot.tree.command(name="log_level", description="查看或調整日誌等級（管理員指令）")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(subsystem="子系統（all 為全部）", level="DEBUG / INFO / WARNING / ERROR / reset")
+async def slash_log_level(interaction: discord.Interaction, subsystem: str = None, level: str = None):
+    if subsystem is None or level is None:
+        await interaction.response.send_message(format_log_levels(), ephemeral=True)
+        return
+    try:
+        set_log_level(subsystem.lower(), level)
+    except ValueError as e:
+        await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+        return
+    await interaction.response.send_message(f"✅ `{subsystem}` 日誌等級已設為 {level.upper()}", ephemeral=True)
+
+@bot.tree.command(name="panel", description="開啟 DevOps 控制台面板")
+async def slash_panel(interaction: discord.Interaction):
+    # 面板要讓頻道內所有人都能使用，所以不是僅自己可見
+    await interaction.response.send_message(embed=create_main_embed(), view=get_control_panel_view())
+
+@bot.tree.command(name="update_panel", description="更新控制面板（管理員指令）")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+async def slash_update_panel(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    await send_control_panel()
+    await interaction.followup.send("✅ 已更新控制面板", ephemeral=True)
+
+@bot.tree.error
+async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    # 沒有權限執行的指令不收費
+    admitted = interaction.extras.pop('admitted', None)
+    if admitted and isinstance(error, app_commands.CheckFailure):
+        refund(admitted, interaction.user, interaction.guild)
+    
+    if isinstance(error, app_commands.MissingPermissions):
+        message = f"❌ 缺少權限: {', '.join(error.missing_permissions)}"
+    else:
+        command_log.error(f"❌ 斜線指令錯誤: {error}")
+        message = f"❌ 執行指令時出錯: {error}"
+    
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+    finish_span(interaction.extras.get('trace'), type(error).__name__)
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    """斜線指令成功完成時結束 trace"""
+    finish_span(interaction.extras.get('trace'))
+    mark_first_response(f"/{command.qualified_name}")
+
+async def sync_app_commands():
+    """同步斜線指令（背景執行，不延遲閘道連線）"""
+    try:
+        if SLASH_GUILD_ID:
+            guild = discord.Object(id=int(SLASH_GUILD_ID))
+            bot.tree.copy_global_to(guild=guild)
+            synced = await bot.tree.sync(guild=guild)
+        else:
+            synced = await bot.tree.sync()
+        command_log.info(f"✅ 已同步 {len(synced)} 個斜線指令")
+    except Exception as e:
+        command_log.error(f"❌ 同步斜線指令時出錯: {e}")
+
+@bot.event
+async def setup_hook():
+    """登入後、連線閘道前執行：其他子系統都放到背景，讓閘道連線先開始"""
+    startup_timings['setup_hook'] = time.perf_counter() - PROCESS_START
+    # 主面板是常駐 view，註冊後不論哪則訊息（包括重啟前發送的）點擊都會分派到同一個實例
+    bot.add_view(get_control_panel_view())
+    refresh_health_snapshot.start()
+    # 閘道連線前先載入暖啟動快照，重新驗證在背景進行
+    pending = restore_warm_snapshot()
+    if pending:
+        asyncio.create_task(revalidate_warm_state(pending))
+    save_warm_snapshot_task.start()
+    atexit.register(save_warm_snapshot)
+    with contextlib.suppress(NotImplementedError):
+        # 平台休眠或重新部署時送 SIGTERM：正常關閉，讓 atexit 寫出最後的快照
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(bot.close()))
+    asyncio.create_task(sync_app_commands())
+    if not os.getenv("DISABLE_KEEP_ALIVE"):
+        # flask 在背景執行緒中才匯入
+        keep_alive()
+
+# ===== 叢集啟動器：把分片分組交給多個 worker 程序 =====
+
+def get_recommended_shard_count():
+    """向 Discord 查詢建議的分片數量"""
+    response = requests.get(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {TOKEN}"},
+        timeout=10,
+    )
+    response.raise_for_status()
+    return response.json()["shards"]
+
+def split_shards(shard_count, worker_count):
+    """把 0..shard_count-1 平均切成 worker_count 組連續的分片"""
+    worker_count = max(1, min(worker_count, shard_count))
+    base, extra = divmod(shard_count, worker_count)
+    groups = []
+    start = 0
+    for i in range(worker_count):
+        size = base + (1 if i < extra else 0)
+        groups.append(list(range(start, start + size)))
+        start += size
+    return groups
+
+# worker 重啟的退避：從 10 秒開始加倍，最多 5 分鐘；連續正常執行超過 10 分鐘後重新計算
+CLUSTER_RESTART_MAX_DELAY = 300
+CLUSTER_HEALTHY_UPTIME = 600
+
+def run_cluster(worker_count, shard_count=None):
+    """啟動多個 worker 程序，每個負責一組分片；worker 意外結束時自動重啟"""
+    if shard_count is None:
+        shard_count = max(get_recommended_shard_count(), worker_count)
+    
+    groups = split_shards(shard_count, worker_count)
+    cluster_log.info(f"🧩 叢集模式: {shard_count} 個分片，分給 {len(groups)} 個 worker")
+    
+    def spawn(cluster_id, shard_ids):
+        env = dict(os.environ)
+        env.update({
+            "SHARD_COUNT": str(shard_count),
+            "SHARD_IDS": ",".join(str(s) for s in shard_ids),
+            "CLUSTER_ID": str(cluster_id),
+            "DISABLE_KEEP_ALIVE": "1",  # 健康檢查伺服器只在啟動器上執行
+        })
+        cluster_log.info(f"🚀 啟動 worker {cluster_id}: 分片 {shard_ids}")
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+    
+    workers = {i: spawn(i, shard_ids) for i, shard_ids in enumerate(groups)}
+    stopping = False
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for proc in workers.values():
+            if proc.poll() is None:
+                proc.terminate()
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    keep_alive()
+    
+    # 每個 worker 各自記錄啟動時間與預定重啟時間，等待重啟時不會擋住其他 worker 的監控
+    started_at = dict.fromkeys(workers, time.monotonic())
+    restart_at = {}
+    restart_delay = {}
+    while not stopping:
+        time.sleep(5)
+        now = time.monotonic()
+        for cluster_id, proc in list(workers.items()):
+            if stopping:
+                break
+            if cluster_id in restart_at:
+                if now >= restart_at[cluster_id]:
+                    del restart_at[cluster_id]
+                    workers[cluster_id] = spawn(cluster_id, groups[cluster_id])
+                    started_at[cluster_id] = now
+                continue
+            code = proc.poll()
+            if code is None:
+                continue
+            if now - started_at[cluster_id] >= CLUSTER_HEALTHY_UPTIME:
+                restart_delay.pop(cluster_id, None)
+            delay = min(restart_delay.get(cluster_id, 5) * 2, CLUSTER_RESTART_MAX_DELAY)
+            restart_delay[cluster_id] = delay
+            restart_at[cluster_id] = now + delay
+            cluster_log.warning(f"⚠️ worker {cluster_id} 結束（代碼 {code}），{delay} 秒後重啟")
+    
+    # 收到停止訊號的同時剛好重啟的 worker 也要結束，否則 wait 會一直卡住
+    for proc in workers.values():
+        if proc.poll() is None:
+            proc.terminate()
+    for proc in workers.values():
+        proc.wait()
+
+# ===== 啟動效能分析：python bot.py --profile-startup =====
+
+def parse_importtime(stderr_text):
+    """解析 -X importtime 輸出，回傳 (模組, 自身微秒, 累計微秒, 層級) 列表"""
+    entries = []
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+def profile_startup(top_n=15):
+    """以 -X importtime 啟動子程序，回報匯入熱點與到 on_ready 的時間"""
+    wall_start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--startup-probe"],
+        capture_output=True, text=True, env=dict(os.environ, DISABLE_KEEP_ALIVE="1"),
+        timeout=120,
+    )
+    wall_total = time.perf_counter() - wall_start
+    
+    imports = parse_importtime(result.stderr)
+    top_level = [entry for entry in imports if entry[3] == 0]
+    total_import_us = sum(entry[2] for entry in top_level)
+    
+    print("📦 匯入時間（累計前幾名，只列頂層模組）")
+    for name, self_us, cumulative_us, _ in sorted(top_level, key=lambda e: e[2], reverse=True)[:top_n]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (自身 {self_us / 1000:6.1f} ms)  {name}")
+    print(f"  合計: {total_import_us / 1000:.1f} ms（{len(imports)} 個模組）")
+    
+    timings = None
+    for line in result.stdout.splitlines():
+        if line.startswith("STARTUP_PROFILE "):
+            timings = json.loads(line[len("STARTUP_PROFILE "):])
+    
+    print("\n⏱️ 啟動階段（自程序開始計算）")
+    if timings is None:
+        print("  ❌ 子程序沒有到達 on_ready，請確認 DISCORD_TOKEN")
+        print(result.stdout[-1000:])
+        return 1
+    for stage in ("module_loaded", "setup_hook", "ready"):
+        if stage in timings:
+            print(f"  {stage:14s} {timings[stage]:.3f} 秒")
+    print(f"  含直譯器啟動的總時間: {wall_total:.3f} 秒")
+    return 0
+
 # 啟動 Bot
 if __name__ == "__main__":
-    print("🚀 啟動 Discord Bot（排程版）...")
-    print("💡 提示：Bot 需要保持運行才能執行排程任務")
-    bot.run(TOKEN)
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="DevOps Discord Bot")
+    parser.add_argument("--cluster", type=int, metavar="WORKERS",
+                        help="叢集模式：啟動指定數量的 worker 程序分擔分片")
+    parser.add_argument("--shard-count", type=int,
+                        help="叢集模式的總分片數（預設使用 Discord 建議值）")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="量測匯入時間與啟動到 on_ready 的時間後結束")
+    parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--bench-charts", type=int, metavar="USERS",
+                        help="以指定人數同時要求圖表，量測繪圖吞吐量後結束")
+    parser.add_argument("--bench-tracing", action="store_true",
+                        help="量測追蹤的額外成本後結束")
+    parser.add_argument("--bench-records", action="store_true",
+                        help="量測 GitHub 回應解碼吞吐量與每筆紀錄的記憶體後結束")
+    parser.add_argument("--bench-cache", action="store_true",
+                        help="以多個程序同時查詢，比較各快取後端實際發出的計算次數後結束")
+    args = parser.parse_args()
+    
+    startup_timings['module_loaded'] = time.perf_counter() - PROCESS_START
+    
+    if args.profile_startup:
+        sys.exit(profile_startup())
+    elif args.bench_charts:
+        start_chart_pool()
+        start_log_listener()
+        asyncio.run(benchmark_charts(args.bench_charts))
+    elif args.bench_tracing:
+        benchmark_tracing()
+    elif args.bench_records:
+        benchmark_records()
+    elif args.bench_cache:
+        benchmark_cache()
+    elif args.cluster:
+        start_log_listener()
+        run_cluster(args.cluster, args.shard_count)
+    else:
+        STARTUP_PROBE = args.startup_probe
+        log.info("🚀 啟動 Discord Bot（排程版）...")
+        log.info("💡 提示：Bot 需要保持運行才能執行排程任務")
+        if charts_available() and CHART_WORKERS > 0:
+            # 在任何執行緒啟動前 fork 圖表 worker
+            start_chart_pool()
+        start_log_listener()
+        start_trace_writer()
+        # 日誌已導向佇列，不讓 discord.py 另外安裝自己的 handler
+        bot.run(TOKEN, log_handler=None)
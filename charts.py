@@ -0,0 +1,70 @@
+"""Pipeline 圖表繪製
+
+這個模組在圖表程序池的 worker 中執行，只依賴 matplotlib，
+不匯入 discord 或 bot.py，讓 worker 保持輕量。
+"""
+import io
+import os
+
+def warmup():
+    """讓程序池在啟動時先建立 worker（不載入 matplotlib）"""
+    return os.getpid()
+
+def render_pipeline_chart(series):
+    """把 pipeline 統計資料畫成 PNG，回傳位元組
+
+    series 欄位：
+    - title: 圖表標題
+    - days: 日期標籤列表（MM-DD）
+    - durations: 每天的 run 耗時列表（分鐘）
+    - success_rates: 每天的成功率（0-100，沒有 run 時為 None）
+    - merged_prs: 每天合併的 PR 數量
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    days = series["days"]
+    positions = list(range(len(days)))
+
+    fig, (ax_duration, ax_success, ax_merged) = plt.subplots(
+        3, 1, figsize=(8, 7), sharex=True, constrained_layout=True
+    )
+    fig.suptitle(series["title"])
+
+    # 耗時：每個 run 一個點，再畫每日中位數
+    for x, values in zip(positions, series["durations"]):
+        if values:
+            ax_duration.scatter([x] * len(values), values, s=12, alpha=0.5, color="#3498DB")
+    medians = [sorted(v)[len(v) // 2] if v else None for v in series["durations"]]
+    median_points = [(x, m) for x, m in zip(positions, medians) if m is not None]
+    if median_points:
+        ax_duration.plot(*zip(*median_points), color="#2C3E50", marker="o", label="median")
+        ax_duration.legend(loc="upper left")
+    ax_duration.set_ylabel("duration (min)")
+    ax_duration.grid(alpha=0.3)
+
+    # 成功率
+    rates = [r if r is not None else 0 for r in series["success_rates"]]
+    colors = [
+        "#BDC3C7" if r is None else "#27AE60" if r >= 80 else "#F39C12" if r >= 50 else "#E74C3C"
+        for r in series["success_rates"]
+    ]
+    ax_success.bar(positions, rates, color=colors)
+    ax_success.set_ylim(0, 100)
+    ax_success.set_ylabel("success (%)")
+    ax_success.grid(axis="y", alpha=0.3)
+
+    # 合併吞吐量
+    ax_merged.bar(positions, series["merged_prs"], color="#8E44AD")
+    ax_merged.set_ylabel("merged PRs")
+    ax_merged.grid(axis="y", alpha=0.3)
+
+    step = max(1, len(days) // 10)
+    ax_merged.set_xticks(positions[::step])
+    ax_merged.set_xticklabels(days[::step], rotation=45, ha="right")
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=100)
+    plt.close(fig)
+    return buffer.getvalue()
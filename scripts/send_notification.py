@@ -3,6 +3,9 @@ import os
 import sys
 from discord.ext import commands
 
+# 這是 #一般 頻道的 ID
+DEFAULT_CHANNEL_ID = 1413105016750870631
+
 def main():
     # 從環境變數獲取 Token
     token = os.getenv('DISCORD_TOKEN')
@@ -10,6 +13,11 @@ def main():
         print("❌ 錯誤：DISCORD_TOKEN 環境變數未設定")
         sys.exit(1)
     
+    # 通知頻道：NOTIFY_CHANNEL_IDS 以逗號分隔，未設定時使用 #一般 頻道
+    channel_ids = [int(c) for c in os.getenv('NOTIFY_CHANNEL_IDS', '').split(',') if c.strip()]
+    if not channel_ids:
+        channel_ids = [DEFAULT_CHANNEL_ID]
+    
     # 設定意圖
     intents = discord.Intents.default()
     intents.message_content = True
@@ -36,12 +44,24 @@ def main():
                 print(f"   {status} #{channel.name} (ID: {channel.id})")
                 print(f"       瀏覽權限: {can_view}, 發訊權限: {can_send}")
         
-        print("\n🔍 嘗試獲取特定頻道...")
-        # 使用正確的頻道 ID（從輸出中複製）
-        target_channel_id = 1413105016750870631  # 這是 #一般 頻道的 ID
-        channel = bot.get_channel(target_channel_id)
+        # 根據命令行參數決定訊息內容
+        status = sys.argv[1] if len(sys.argv) > 1 else "unknown"
         
-        if channel:
+        if status == "success":
+            message = "🎉 CI/CD 測試成功！所有檢查通過。"
+        elif status == "failure":
+            message = "❌ CI/CD 測試失敗！請檢查錯誤。"
+        else:
+            message = "🤖 CI/CD 流程執行完成。"
+        
+        print("\n🔍 嘗試獲取通知頻道...")
+        for target_channel_id in channel_ids:
+            channel = bot.get_channel(target_channel_id)
+            
+            if not channel:
+                print(f"❌ 無法找到頻道 ID: {target_channel_id}")
+                continue
+            
             print(f"✅ 找到頻道: #{channel.name}")
             
             # 檢查權限
@@ -53,25 +73,11 @@ def main():
             elif not permissions.send_messages:
                 print("❌ Bot 沒有在此頻道發訊息的權限")
             else:
-                print("✅ 權限檢查通過，準備發送訊息...")
-                
-                # 根據命令行參數發送不同訊息
-                status = sys.argv[1] if len(sys.argv) > 1 else "unknown"
-                
-                if status == "success":
-                    message = "🎉 CI/CD 測試成功！所有檢查通過。"
-                elif status == "failure":
-                    message = "❌ CI/CD 測試失敗！請檢查錯誤。"
-                else:
-                    message = "🤖 CI/CD 流程執行完成。"
-                
                 try:
                     await channel.send(message)
-                    print(f"✅ 已發送訊息：{message}")
+                    print(f"✅ 已發送訊息到 #{channel.name}：{message}")
                 except Exception as e:
                     print(f"❌ 發送訊息時出錯：{e}")
-        else:
-            print(f"❌ 無法找到頻道 ID: {target_channel_id}")
         
         await bot.close()
     
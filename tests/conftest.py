@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+# bot.py 在匯入時讀取環境變數；狀態與快取資料庫放到暫存目錄，不碰工作目錄
+_state_dir = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ.setdefault("GH_TOKEN", "test-token")
+os.environ.setdefault("STATE_DB_PATH", os.path.join(_state_dir, "bot_state.db"))
+os.environ.setdefault("CACHE_PATH", os.path.join(_state_dir, "cache.db"))
+os.environ.setdefault("DISABLE_KEEP_ALIVE", "1")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeRedis:
+    """以 dict 實作的 Redis 替身，只支援 RedisCacheBackend 用到的指令
+
+    到期時間以 time.time() 計算，測試可以用 monkeypatch 控制時鐘；
+    eval 只實作釋放鎖用的「持有者相同才刪除」腳本
+    """
+
+    def __init__(self):
+        self._data = {}  # key -> (值, 到期時間或 None)
+
+    @staticmethod
+    def _encode(value):
+        return value.encode("utf-8") if isinstance(value, str) else bytes(value)
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and self.get(key) is not None:
+            return None
+        ttl = ex if ex is not None else (px / 1000 if px is not None else None)
+        self._data[key] = (self._encode(value), time.time() + ttl if ttl is not None else None)
+        return True
+
+    def delete(self, *keys):
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def eval(self, script, numkeys, *keys_and_args):
+        (key,), (holder,) = keys_and_args[:numkeys], keys_and_args[numkeys:]
+        if self.get(key) == self._encode(holder):
+            return self.delete(key)
+        return 0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手動推進的 time.time()"""
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
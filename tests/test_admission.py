@@ -0,0 +1,80 @@
+import types
+from collections import OrderedDict
+
+import pytest
+
+import bot
+
+
+def test_bucket_starts_full_and_refills_up_to_capacity():
+    bucket = bot.TokenBucket(10, 1.0)
+    assert bucket.tokens == 10
+    bucket.tokens = 2
+    bucket.refill(bucket.updated + 3)
+    assert bucket.tokens == 5
+    bucket.refill(bucket.updated + 100)
+    assert bucket.tokens == 10
+
+
+def test_wait_time():
+    bucket = bot.TokenBucket(10, 0.5)
+    assert bucket.wait_time(4) == 0
+    bucket.tokens = 1
+    assert bucket.wait_time(4) == pytest.approx(6)
+
+
+def test_cost_above_capacity_waits_for_a_full_bucket():
+    bucket = bot.TokenBucket(3, 1.0)
+    bucket.tokens = 0
+    assert bucket.wait_time(100) == pytest.approx(3)
+
+
+def test_parse_rate_limit():
+    assert bot.parse_rate_limit("10/60") == (10.0, pytest.approx(10 / 60))
+    assert bot.parse_rate_limit("30") == (30.0, 0.5)
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    monkeypatch.setattr(bot, "_admission_buckets", OrderedDict())
+    monkeypatch.setattr(bot, "admission_stats", {'admitted': 0, 'rejected': 0, 'by_scope': {}, 'by_command': {}})
+    monkeypatch.setattr(bot, "_admission_limits", {'user': (5, 0.001), 'guild': (8, 0.001), 'global': (100, 0.001)})
+    monkeypatch.setitem(bot.COMMAND_COSTS, "expensive", 3)
+    monkeypatch.setitem(bot.COMMAND_COSTS, "free", 0)
+
+
+def user(user_id):
+    return types.SimpleNamespace(id=user_id)
+
+
+GUILD = types.SimpleNamespace(id=42)
+
+
+def test_admit_charges_all_scopes_and_rejects_when_one_is_short(admission):
+    assert bot.admit("expensive", user(1), GUILD) is None
+    assert "個人" in bot.admit("expensive", user(1), GUILD)
+    # 另一個使用者還有個人額度，但伺服器只剩 5
+    assert bot.admit("expensive", user(2), GUILD) is None
+    assert "伺服器" in bot.admit("expensive", user(3), GUILD)
+    assert bot.admission_stats['admitted'] == 2
+    assert bot.admission_stats['by_scope'] == {'user': 1, 'guild': 1}
+
+
+def test_rejected_request_does_not_consume_tokens(admission):
+    bot.admit("expensive", user(1), GUILD)
+    bot.admit("expensive", user(1), GUILD)
+    assert bot._admission_buckets[('user', 1)].tokens == pytest.approx(2, abs=0.01)
+    assert bot._admission_buckets[('guild', 42)].tokens == pytest.approx(5, abs=0.01)
+
+
+def test_free_commands_are_never_limited(admission):
+    for _ in range(20):
+        assert bot.admit("free", user(1), GUILD) is None
+    assert not bot._admission_buckets
+
+
+def test_refund_restores_tokens(admission):
+    bot.admit("expensive", user(1), None)
+    bot.refund("expensive", user(1), None)
+    assert bot._admission_buckets[('user', 1)].tokens == pytest.approx(5, abs=0.01)
+    assert bot.admission_stats['admitted'] == 0
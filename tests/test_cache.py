@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+import bot
+from conftest import FakeRedis
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backends(request, tmp_path):
+    """回傳 (後端, 共用同一份儲存的另一個實例)；memory 只在程序內共用，兩者是同一個物件"""
+    if request.param == "memory":
+        backend = bot.MemoryCacheBackend()
+        return backend, backend
+    if request.param == "sqlite":
+        path = str(tmp_path / "cache.db")
+        backend, peer = bot.SQLiteCacheBackend(path), bot.SQLiteCacheBackend(path)
+    else:
+        client = FakeRedis()
+        backend = bot.RedisCacheBackend("redis://fake", client=client)
+        peer = bot.RedisCacheBackend("redis://fake", client=client)
+    peer.holder = "peer"
+    return backend, peer
+
+
+def counting(value):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return value
+
+    return compute, calls
+
+
+def test_miss_then_hit(backends, clock):
+    backend, _ = backends
+    compute, calls = counting(b"value")
+    assert backend.get_or_compute("k", 10, compute) == (b"value", False)
+    assert backend.get_or_compute("k", 10, compute) == (b"value", True)
+    assert len(calls) == 1
+    assert backend.stats["hits"] == 1 and backend.stats["misses"] == 1
+
+
+def test_entry_expires_after_ttl(backends, clock):
+    backend, _ = backends
+    compute, calls = counting(b"value")
+    backend.get_or_compute("k", 10, compute)
+    clock[0] += 9
+    assert backend.get_or_compute("k", 10, compute) == (b"value", True)
+    clock[0] += 2
+    assert backend.get("k") is None
+    assert backend.get_or_compute("k", 10, compute) == (b"value", False)
+    assert len(calls) == 2
+
+
+def test_none_is_not_cached(backends, clock):
+    backend, _ = backends
+    compute, calls = counting(None)
+    assert backend.get_or_compute("k", 10, compute) == (None, False)
+    assert backend.get_or_compute("k", 10, compute) == (None, False)
+    assert len(calls) == 2
+
+
+def test_waiter_uses_value_written_by_lease_holder(backends, clock):
+    backend, peer = backends
+    assert peer._acquire("k")
+    assert not backend._acquire("k")
+
+    def finish():
+        time.sleep(0.2)
+        peer.set("k", b"from peer", 10)
+        peer._release("k")
+
+    thread = threading.Thread(target=finish)
+    thread.start()
+    compute, calls = counting(b"computed")
+    try:
+        assert backend.get_or_compute("k", 10, compute) == (b"from peer", True)
+    finally:
+        thread.join()
+    assert calls == []
+    assert backend.stats["waits"] == 1
+
+
+def test_waiter_computes_after_lock_timeout(backends, clock, monkeypatch):
+    backend, peer = backends
+    monkeypatch.setattr(bot, "CACHE_LOCK_TIMEOUT", 0.2)
+    assert peer._acquire("k")
+    compute, calls = counting(b"computed")
+    assert backend.get_or_compute("k", 10, compute) == (b"computed", False)
+    assert len(calls) == 1
+
+
+def test_lease_is_released_after_compute(backends, clock):
+    backend, peer = backends
+    backend.get_or_compute("k", 10, lambda: b"value")
+    assert peer._acquire("k")
+
+
+def test_expired_lease_can_be_taken_over(backends, clock):
+    backend, peer = backends
+    if backend is peer:
+        pytest.skip("程序內的計算權沒有租約，持有者結束時一定會釋放")
+    assert peer._acquire("k")
+    assert not backend._acquire("k")
+    clock[0] += bot.CACHE_LOCK_TTL + 1
+    assert backend._acquire("k")
+
+
+def test_release_does_not_drop_a_lock_taken_over_by_another_holder(backends, clock):
+    backend, peer = backends
+    if backend is peer:
+        pytest.skip("程序內的計算權沒有租約")
+    assert backend._acquire("k")
+    clock[0] += bot.CACHE_LOCK_TTL + 1
+    assert peer._acquire("k")
+    backend._release("k")
+    assert not backend._acquire("k")
@@ -0,0 +1,65 @@
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def coordinators(tmp_path):
+    path = str(tmp_path / "state.db")
+    return bot.JobCoordinator(path, "a"), bot.JobCoordinator(path, "b")
+
+
+def test_only_one_instance_claims_a_window(coordinators):
+    a, b = coordinators
+    assert a.claim_job("weekly", "2024-W01")
+    assert not b.claim_job("weekly", "2024-W01")
+    assert not a.claim_job("weekly", "2024-W01")
+    assert b.claim_job("weekly", "2024-W02")
+
+
+def test_finished_window_is_not_run_again(coordinators, clock):
+    a, b = coordinators
+    a.claim_job("weekly", "2024-W01")
+    a.finish_job("weekly", "2024-W01", True)
+    clock[0] += bot.JOB_STALE_AFTER + 1
+    assert not b.claim_job("weekly", "2024-W01")
+    job_id, run_window, holder, _, status = a.recent_jobs()[0]
+    assert (job_id, run_window, holder, status) == ("weekly", "2024-W01", "a", "done")
+
+
+def test_failed_window_can_be_retried(coordinators):
+    a, b = coordinators
+    a.claim_job("weekly", "2024-W01")
+    a.finish_job("weekly", "2024-W01", False)
+    assert b.claim_job("weekly", "2024-W01")
+
+
+def test_stale_running_claim_is_taken_over(coordinators, clock):
+    a, b = coordinators
+    a.claim_job("weekly", "2024-W01")
+    clock[0] += bot.JOB_STALE_AFTER - 1
+    assert not b.claim_job("weekly", "2024-W01")
+    clock[0] += 2
+    assert b.claim_job("weekly", "2024-W01")
+    # 原本的持有者晚一步完成，不能蓋掉接手者的紀錄
+    a.finish_job("weekly", "2024-W01", False)
+    assert not a.claim_job("weekly", "2024-W01")
+
+
+def test_lease_is_exclusive_until_it_expires(coordinators, clock):
+    a, b = coordinators
+    assert a.acquire_lease("leader:all", 30)
+    assert a.acquire_lease("leader:all", 30)
+    assert not b.acquire_lease("leader:all", 30)
+    clock[0] += 31
+    assert b.acquire_lease("leader:all", 30)
+    assert b.lease_holder("leader:all")[0] == "b"
+
+
+def test_released_lease_is_free_immediately(coordinators):
+    a, b = coordinators
+    a.acquire_lease("leader:all", 30)
+    a.is_leader = True
+    a.release_lease("leader:all")
+    assert not a.is_leader
+    assert b.acquire_lease("leader:all", 30)
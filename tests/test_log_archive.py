@@ -0,0 +1,136 @@
+import io
+import zipfile
+
+import pytest
+
+import bot
+
+
+class Unseekable(io.RawIOBase):
+    """只能寫入的串流：zipfile 寫到這裡時會改用 data descriptor 記錄大小"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+
+LOGS = {
+    "1_build.txt": (
+        "2024-01-01T00:00:00.0000000Z Run npm ci\n"
+        "2024-01-01T00:00:01.0000000Z added 120 packages\n"
+        "2024-01-01T00:00:02.0000000Z ##[error]Process completed with exit code 1.\n"
+        "2024-01-01T00:00:03.0000000Z cleanup\n"
+    ),
+    "2_test.txt": "collecting tests\nFAILED tests/test_api.py::test_login\n",
+    "build/1_Set up job.txt": "Set up job\nnothing to see here\n",
+}
+
+
+def build_archive(logs=LOGS, compression=zipfile.ZIP_DEFLATED, stream=False, force_zip64=False):
+    target = Unseekable() if stream else io.BytesIO()
+    with zipfile.ZipFile(target, "w", compression=compression) as archive:
+        for name, text in logs.items():
+            with archive.open(name, "w", force_zip64=force_zip64) as entry:
+                entry.write(text.encode("utf-8"))
+    return bytes(target.buffer) if stream else target.getvalue()
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def scan(data, chunk_size=4096, **kwargs):
+    collector = bot._LogExcerptCollector()
+    entries, bytes_read = bot.scan_log_archive(chunked(data, chunk_size), collector, **kwargs)
+    return collector, entries, bytes_read
+
+
+def error_lines(collector):
+    return [(block["entry"], line) for block in collector.blocks for line in block["lines"]
+            if bot.LOG_ERROR_RE.search(line)]
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["sizes-in-header", "data-descriptor"])
+@pytest.mark.parametrize("chunk_size", [7, 4096])
+def test_scans_every_entry(stream, chunk_size):
+    data = build_archive(stream=stream)
+    if stream:
+        assert zipfile.ZipFile(io.BytesIO(data)).infolist()[0].flag_bits & 0x08
+
+    collector, entries, bytes_read = scan(data, chunk_size)
+
+    assert entries == 3
+    assert collector.lines_scanned == 8
+    assert error_lines(collector) == [
+        ("1_build.txt", "##[error]Process completed with exit code 1."),
+        ("2_test.txt", "FAILED tests/test_api.py::test_login"),
+    ]
+    assert bytes_read <= len(data)
+
+
+def test_error_block_keeps_context_without_timestamps():
+    collector, _, _ = scan(build_archive())
+    assert collector.blocks[0]["lines"] == [
+        "Run npm ci",
+        "added 120 packages",
+        "##[error]Process completed with exit code 1.",
+        "cleanup",
+    ]
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["sizes-in-header", "data-descriptor"])
+def test_zip64_entries(stream):
+    collector, entries, _ = scan(build_archive(stream=stream, force_zip64=True), chunk_size=11)
+    assert entries == 3
+    assert len(error_lines(collector)) == 2
+
+
+def test_stored_entries_without_descriptor():
+    collector, entries, _ = scan(build_archive(compression=zipfile.ZIP_STORED), chunk_size=5)
+    assert entries == 3
+    assert len(error_lines(collector)) == 2
+
+
+def test_stored_entry_with_descriptor_stops_scanning():
+    # 未壓縮又沒有大小的項目無法找到結尾，只能停止，不應該拋出例外
+    collector, entries, _ = scan(build_archive(compression=zipfile.ZIP_STORED, stream=True))
+    assert entries == 0
+    assert collector.blocks == []
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["sizes-in-header", "data-descriptor"])
+def test_skipped_jobs_are_not_scanned(stream):
+    # "1_build.txt" 與 "build/1_Set up job.txt" 都屬於 build job
+    collector, entries, _ = scan(build_archive(stream=stream), skip_jobs=["Build"])
+    assert entries == 1
+    assert [entry for entry, _ in error_lines(collector)] == ["2_test.txt"]
+
+
+def test_large_entry_is_inflated_in_bounded_chunks():
+    filler = "step output line\n" * 200_000
+    logs = {"1_build.txt": filler + "Error: out of memory\n"}
+    collector, entries, _ = scan(build_archive(logs, stream=True), chunk_size=bot.LOG_DOWNLOAD_CHUNK)
+    assert entries == 1
+    assert collector.lines_scanned == 200_001
+    assert error_lines(collector) == [("1_build.txt", "Error: out of memory")]
+
+
+def test_stops_reading_once_enough_blocks_are_found():
+    logs = {f"{i}_job{i}.txt": f"line\nError: failure number {i}\n" + "tail\n" * 5000 for i in range(10)}
+    data = build_archive(logs)
+    collector, entries, bytes_read = scan(data, chunk_size=1024)
+    assert len(collector.blocks) == bot.LOG_MAX_BLOCKS
+    assert entries == bot.LOG_MAX_BLOCKS
+    assert bytes_read < len(data)
+
+
+def test_truncated_archive_raises_eof():
+    data = build_archive()
+    with pytest.raises(EOFError):
+        scan(data[:40])
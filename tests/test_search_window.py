@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import bot
+
+
+def assert_contiguous(windows, start, end):
+    assert windows[0][0] == start
+    assert windows[-1][1] == end
+    for (_, previous_end), (next_start, _) in zip(windows, windows[1:]):
+        assert next_start == previous_end + timedelta(seconds=1)
+    assert all(window_start <= window_end for window_start, window_end in windows)
+
+
+@pytest.mark.parametrize("total, parts", [(1001, 2), (1800, 2), (1801, 3), (4500, 5), (9000, 10)])
+def test_splits_into_enough_windows(total, parts):
+    start = datetime(2024, 1, 1)
+    end = datetime(2024, 1, 31, 23, 59, 59)
+    windows = bot.split_search_window(start, end, total)
+    assert len(windows) == parts
+    assert_contiguous(windows, start, end)
+
+
+def test_windows_have_roughly_equal_length():
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=10, seconds=-1)
+    windows = bot.split_search_window(start, end, 4500)
+    lengths = [(window_end - window_start).total_seconds() + 1 for window_start, window_end in windows]
+    assert max(lengths) - min(lengths) <= 1
+    assert sum(lengths) == 10 * 86400
+
+
+def test_one_second_window_cannot_be_split():
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    assert bot.split_search_window(start, start, 5000) == [(start, start)]
+
+
+def test_short_window_never_produces_empty_windows():
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    end = start + timedelta(seconds=2)
+    windows = bot.split_search_window(start, end, 50000)
+    assert len(windows) == 3
+    assert_contiguous(windows, start, end)
@@ -0,0 +1,61 @@
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def store(tmp_path):
+    return bot.SubscriptionStore(str(tmp_path / "state.db"))
+
+
+def ids(subscriptions):
+    return sorted(subscription.id for subscription in subscriptions)
+
+
+def test_exact_and_wildcard_subscriptions_match(store):
+    exact = store.add(1, "Owner/Repo", "workflow", "CI", "main", "failure")
+    any_branch = store.add(2, "owner/repo", "workflow", "ci", "*", "*")
+    everything = store.add(3, "owner/repo", "workflow", "*", "*", "*")
+    store.add(4, "owner/repo", "workflow", "deploy", "*", "*")
+    store.add(5, "owner/other", "workflow", "*", "*", "*")
+
+    matched = store.match("owner/repo", "workflow", ("CI", "ci.yml"), "main", "failure")
+    assert ids(matched) == ids([exact, any_branch, everything])
+
+    matched = store.match("OWNER/REPO", "workflow", ("CI",), "develop", "success")
+    assert ids(matched) == ids([any_branch, everything])
+
+
+def test_subscription_matching_several_targets_is_returned_once(store):
+    subscription = store.add(1, "owner/repo", "pr", "release", "*", "*")
+    matched = store.match("owner/repo", "pr", ("release", "Release", "docs"), "main", "*")
+    assert ids(matched) == [subscription.id]
+
+
+def test_event_type_must_match(store):
+    store.add(1, "owner/repo", "pr", "*", "*", "*")
+    assert store.match("owner/repo", "workflow", ("CI",), "main", "success") == []
+
+
+def test_duplicate_is_rejected_case_insensitively(store):
+    assert store.add(1, "owner/repo", "workflow", "CI", "main", "*") is not None
+    assert store.add(1, "owner/repo", "workflow", "CI", "main", "*") is None
+
+
+def test_remove_only_from_own_channel(store):
+    subscription = store.add(1, "owner/repo", "workflow", "CI", "*", "*")
+    assert not store.remove(subscription.id, 2)
+    assert store.remove(subscription.id, 1)
+    assert store.match("owner/repo", "workflow", ("CI",), "main", "success") == []
+    assert store.index == {}
+
+
+def test_refresh_picks_up_changes_from_another_instance(tmp_path):
+    path = str(tmp_path / "state.db")
+    reader, writer = bot.SubscriptionStore(path), bot.SubscriptionStore(path)
+    reader.refresh()
+    subscription = writer.add(1, "owner/repo", "workflow", "*", "*", "*")
+    assert reader.match("owner/repo", "workflow", ("CI",), "main", "success") == []
+    reader.refresh()
+    assert ids(reader.match("owner/repo", "workflow", ("CI",), "main", "success")) == [subscription.id]
+    assert reader.event_types_by_repo() == {"owner/repo": {"workflow"}}